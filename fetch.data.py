@@ -69,71 +69,76 @@ def fetch_historical_data_in_chunks(smartApi, token, start_date, end_date, inter
 
     return all_data
 
-# Example: Fetch token for "NIFTY"
-stock_name = "WIPRO"
-token = get_symbol_token_by_name(stock_name)
-
-if not token:
-    logger.error(f"Stock name '{stock_name}' not found or token could not be fetched.")
-    exit()
-
-# Initialize SmartAPI
-smartApi = SmartConnect(api_key=API_KEY)
-
-# Generate TOTP (if 2FA is enabled)
-try:
-    totp = pyotp.TOTP(TOTP_TOKEN).now()
-except Exception as e:
-    logger.error("Invalid Token: The provided token is not valid.")
-    raise e
-
-# Authenticate
-data = smartApi.generateSession(CLIENT_ID, SECRET_KEY, totp)
-
-if data['status'] == False:
-    logger.error("Authentication Failed:", data)
-else:
-    logger.info("✅ Successfully Authenticated")
-    authToken = data['data']['jwtToken']
-    refreshToken = data['data']['refreshToken']
-
-    # Define date range for more than one year
-    start_date = datetime(2025, 11, 10)  # Start date
-    end_date = datetime(2025, 11, 22)  # End date
-
-    # Fetch historical data in chunks
-    try:
-        historical_data = fetch_historical_data_in_chunks(smartApi, token, start_date, end_date)
-
-        if historical_data:
-            logger.info("✅ Historical Data Fetched Successfully")
-
-            # Define the directory and file path
-            directory = "/Users/priyanshu/Desktop/Project icAP"
-            csv_file = os.path.join(directory, f"{stock_name}_historical_data.csv")
-
-            # Create the directory if it doesn't exist
-            os.makedirs(directory, exist_ok=True)
+def main():
+    # Example: Fetch token for "NIFTY"
+    stock_name = "WIPRO"
+    token = get_symbol_token_by_name(stock_name)
 
-            # Write data to CSV
-            with open(csv_file, mode="w", newline="") as file:
-                writer = csv.writer(file)
-                # Write header
-                writer.writerow(["Timestamp", "Open", "High", "Low", "Close", "Volume"])
-                # Write each candle (1-minute data)
-                for candle in historical_data:
-                    writer.writerow(candle)
+    if not token:
+        logger.error(f"Stock name '{stock_name}' not found or token could not be fetched.")
+        return
 
-            logger.info(f"✅ Historical Data Saved to {csv_file}")
-        else:
-            logger.error("❌ No data fetched.")
-
-    except Exception as e:
-        logger.exception(f"Historic API failed: {e}")
+    # Initialize SmartAPI
+    smartApi = SmartConnect(api_key=API_KEY)
 
-    # Logout
+    # Generate TOTP (if 2FA is enabled)
     try:
-        logout = smartApi.terminateSession(CLIENT_ID)
-        logger.info("✅ Logout Successful")
+        totp = pyotp.TOTP(TOTP_TOKEN).now()
     except Exception as e:
-        logger.exception(f"Logout failed: {e}")
\ No newline at end of file
+        logger.error("Invalid Token: The provided token is not valid.")
+        raise e
+
+    # Authenticate
+    data = smartApi.generateSession(CLIENT_ID, SECRET_KEY, totp)
+
+    if data['status'] == False:
+        logger.error("Authentication Failed:", data)
+    else:
+        logger.info("✅ Successfully Authenticated")
+        authToken = data['data']['jwtToken']
+        refreshToken = data['data']['refreshToken']
+
+        # Define date range for more than one year
+        start_date = datetime(2025, 11, 10)  # Start date
+        end_date = datetime(2025, 11, 22)  # End date
+
+        # Fetch historical data in chunks
+        try:
+            historical_data = fetch_historical_data_in_chunks(smartApi, token, start_date, end_date)
+
+            if historical_data:
+                logger.info("✅ Historical Data Fetched Successfully")
+
+                # Define the directory and file path
+                directory = "/Users/priyanshu/Desktop/Project icAP"
+                csv_file = os.path.join(directory, f"{stock_name}_historical_data.csv")
+
+                # Create the directory if it doesn't exist
+                os.makedirs(directory, exist_ok=True)
+
+                # Write data to CSV
+                with open(csv_file, mode="w", newline="") as file:
+                    writer = csv.writer(file)
+                    # Write header
+                    writer.writerow(["Timestamp", "Open", "High", "Low", "Close", "Volume"])
+                    # Write each candle (1-minute data)
+                    for candle in historical_data:
+                        writer.writerow(candle)
+
+                logger.info(f"✅ Historical Data Saved to {csv_file}")
+            else:
+                logger.error("❌ No data fetched.")
+
+        except Exception as e:
+            logger.exception(f"Historic API failed: {e}")
+
+        # Logout
+        try:
+            logout = smartApi.terminateSession(CLIENT_ID)
+            logger.info("✅ Logout Successful")
+        except Exception as e:
+            logger.exception(f"Logout failed: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Keep a local DuckDB copy of Stock/StockPrice for heavy analytical queries
+
+Usage:
+  python3 scripts/analytics-mirror.py sync                      # incremental
+  python3 scripts/analytics-mirror.py sync --since 2024-06-01   # re-copy from a date
+  python3 scripts/analytics-mirror.py sync --full
+  python3 scripts/analytics-mirror.py status
+  python3 scripts/analytics-mirror.py query "SELECT COUNT(*) FROM \\"StockPrice\\""
+
+The mirror lives in .cache/analytics.duckdb (override with ANALYTICS_DB).
+Run `sync` from cron after the fetch jobs; queries then scan the columnar
+copy instead of the production database. Requires the `duckdb` package.
+"""
+
+import argparse
+import sys
+from datetime import datetime
+
+from istocks.config import connect
+from istocks.mirror import RESYNC_DAYS, mirror_status, open_mirror, query, sync
+
+
+def run_sync(args):
+    conn = connect()
+    duck = open_mirror(args.path)
+    try:
+        sync(conn, duck, args.full, args.since, args.resync_days)
+    finally:
+        duck.close()
+        conn.close()
+
+
+def status(args):
+    duck = open_mirror(args.path, read_only=True)
+    try:
+        rows = mirror_status(duck)
+    finally:
+        duck.close()
+    print(f"{'symbol':<14} {'candles':>12} {'first':<17} {'last':<17} {'synced':<17}")
+    for symbol, candles, first, last, synced in rows:
+        print(f"{symbol:<14} {candles:>12,} {first:%Y-%m-%d %H:%M} {last:%Y-%m-%d %H:%M} {synced:%Y-%m-%d %H:%M}")
+
+
+def run_query(args):
+    frame = query(args.sql, path=args.path)
+    if args.csv:
+        frame.to_csv(args.csv, index=False)
+        print(f"✅ {len(frame)} rows → {args.csv}")
+    else:
+        frame.to_string(sys.stdout, index=False, max_rows=args.max_rows)
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", help="DuckDB file (default: ANALYTICS_DB or .cache/analytics.duckdb)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("sync", help="Copy new and recently changed candles into the mirror")
+    p.add_argument("--full", action="store_true", help="Drop the mirrored prices and copy everything")
+    p.add_argument("--since", type=datetime.fromisoformat, help="Also re-copy every candle from this date")
+    p.add_argument("--resync-days", type=int, default=RESYNC_DAYS,
+                   help="Trailing days re-copied on every sync (indicator updates, live candles)")
+    p.set_defaults(func=run_sync)
+
+    p = sub.add_parser("status", help="Mirrored candles and watermarks per stock")
+    p.set_defaults(func=status)
+
+    p = sub.add_parser("query", help="Run SQL against the mirror")
+    p.add_argument("sql")
+    p.add_argument("--csv", help="Write the result to a CSV file instead of printing it")
+    p.add_argument("--max-rows", type=int, default=200)
+    p.set_defaults(func=run_query)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
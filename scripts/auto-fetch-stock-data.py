@@ -5,17 +5,16 @@ Runs during market hours to fetch latest data
 Updated for Azure PostgreSQL
 """
 
-import requests
 import psycopg2
-from psycopg2.extras import execute_batch
-from SmartApi.smartConnect import SmartConnect
-import pyotp
 from logzero import logger
 from datetime import datetime, timedelta
 import time
 import os
 from dotenv import load_dotenv
 
+# requests, SmartApi, pyotp and the NumPy-based istocks modules are imported
+# where they are used, so a run with nothing new to fetch starts quickly
+
 # Load environment variables from project root
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 env_path = os.path.join(project_root, '.env.local')
@@ -44,11 +43,17 @@ STOCK_NAME = "WIPRO"
 STOCK_SYMBOL = "WIPRO"
 STOCK_ID = "cmi2cmbzn0000ne9p2v0g98ry"  # Your existing stock ID
 
+# Re-fetch the trailing window (istocks.live.TRAILING_MINUTES) until this long
+# after the close
+LIVE_SETTLE_MINUTES = 15
+
 # Angel One Scrip Master URL
 SCRIP_MASTER_URL = "https://margincalculator.angelone.in/OpenAPI_File/files/OpenAPIScripMaster.json"
 
 def get_symbol_token(name, exchange="NSE"):
     """Fetch token for a stock by name"""
+    import requests
+
     try:
         response = requests.get(SCRIP_MASTER_URL)
         data = response.json()
@@ -133,61 +138,77 @@ def fetch_data_in_chunks(smartApi, token, start_date, end_date, interval="ONE_MI
     return all_data
 
 def save_to_database(data):
-    """Save fetched data to PostgreSQL database"""
+    """Save fetched data to PostgreSQL, writing only new or changed candles"""
     if not data:
         logger.warning("No data to save")
-        return 0
+        return 0, 0
+    
+    from istocks.live import ensure_tables, upsert_tail
+    from istocks.prices import candle_rows
     
     try:
         conn = psycopg2.connect(DATABASE_URL)
-        cur = conn.cursor()
+        ensure_tables(conn)
         
-        # Prepare data for insertion
-        records = []
-        for candle in data:
-            # candle format: [timestamp, open, high, low, close, volume]
-            timestamp = datetime.strptime(candle[0], "%Y-%m-%dT%H:%M:%S%z")
-            
-            # Generate unique ID
-            record_id = f"price_{STOCK_ID}_{timestamp.strftime('%Y%m%d%H%M%S')}"
-            
-            records.append((
-                record_id,
-                STOCK_ID,
-                timestamp,
-                float(candle[1]),  # open
-                float(candle[2]),  # high
-                float(candle[3]),  # low
-                float(candle[4]),  # close
-                int(candle[5]),    # volume
-            ))
-        
-        # Insert data (ON CONFLICT DO NOTHING to avoid duplicates)
-        insert_query = """
-            INSERT INTO "StockPrice" 
-            (id, "stockId", timestamp, open, high, low, close, volume)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (id) DO NOTHING
-        """
-        
-        execute_batch(cur, insert_query, records, page_size=100)
+        # Re-fetched candles are compared with the stored ones; only new or
+        # changed rows are validated and written (rejects go to quarantine)
+        records = candle_rows(STOCK_ID, data)
+        inserted_count, updated_count = upsert_tail(conn, STOCK_ID, records, source="auto-fetch")
         conn.commit()
-        
-        inserted_count = cur.rowcount
-        cur.close()
         conn.close()
         
-        logger.info(f"✅ Inserted {inserted_count} new records into database")
-        return inserted_count
+        logger.info(f"✅ Inserted {inserted_count} new and updated {updated_count} changed records")
+        return inserted_count, updated_count
         
     except Exception as e:
         logger.error(f"❌ Database error: {str(e)}")
-        return 0
+        return 0, 0
+
+def run_alert_rules():
+    """Evaluate scripts/alert-rules.json (or ALERT_RULES) after an ingest cycle"""
+    from istocks.alerts import DEFAULT_RULES, run_alerts
+    
+    if not os.path.exists(os.getenv("ALERT_RULES") or DEFAULT_RULES):
+        return
+    try:
+        conn = psycopg2.connect(DATABASE_URL)
+        try:
+            run_alerts(conn)
+        finally:
+            conn.close()
+    except Exception as e:
+        logger.error(f"❌ Alert evaluation failed: {str(e)}")
 
 def main():
     """Main function to fetch and save data"""
     logger.info("🚀 Starting auto-fetch stock data script")
     
+    # Get last fetched date
+    last_date = get_last_fetched_date()
+    logger.info(f"📅 Last data in database: {last_date}")
+    
+    # Calculate fetch range
+    start_date = last_date + timedelta(minutes=1)  # Start from next minute
+    end_date = datetime.now()
+    
+    # Nothing trades after 3:30 PM, so end at the latest weekday close
+    # (today's close during market hours)
+    today = datetime.now()
+    market_close = today.replace(hour=15, minute=30, second=0, microsecond=0)
+    if today.weekday() < 5:  # Monday to Friday
+        end_date = market_close
+    else:
+        end_date = market_close - timedelta(days=today.weekday() - 4)
+    
+    # Candles fetched while still forming are corrected by re-fetching a short
+    # trailing window until the session has settled
+    settled = datetime.now() >= end_date + timedelta(minutes=LIVE_SETTLE_MINUTES)
+    if start_date >= end_date and settled:
+        logger.info("✅ Already up to date, nothing to fetch")
+        return
+    from istocks.live import TRAILING_MINUTES
+    start_date = min(start_date, last_date - timedelta(minutes=TRAILING_MINUTES - 1))
+    
     # Get token
     token = get_symbol_token(STOCK_NAME)
     if not token:
@@ -197,6 +218,9 @@ def main():
     logger.info(f"✅ Token for {STOCK_NAME}: {token}")
     
     # Authenticate with Angel One
+    import pyotp
+    from SmartApi.smartConnect import SmartConnect
+    
     try:
         smartApi = SmartConnect(api_key=API_KEY)
         totp = pyotp.TOTP(TOTP_TOKEN).now()
@@ -213,21 +237,6 @@ def main():
         logger.error(f"❌ Authentication error: {str(e)}")
         return
     
-    # Get last fetched date
-    last_date = get_last_fetched_date()
-    logger.info(f"📅 Last data in database: {last_date}")
-    
-    # Calculate fetch range
-    start_date = last_date + timedelta(minutes=1)  # Start from next minute
-    end_date = datetime.now()
-    
-    # If today is a trading day and market hasn't closed, set end to 3:30 PM today
-    today = datetime.now()
-    if today.weekday() < 5:  # Monday to Friday
-        market_close = today.replace(hour=15, minute=30, second=0, microsecond=0)
-        if today < market_close:
-            end_date = market_close
-    
     logger.info(f"📊 Fetching data from {start_date} to {end_date}")
     
     # Fetch data
@@ -238,8 +247,21 @@ def main():
             logger.info(f"✅ Fetched {len(historical_data)} total records")
             
             # Save to database
-            inserted = save_to_database(historical_data)
-            logger.info(f"✅ Successfully saved {inserted} new records")
+            inserted, updated = save_to_database(historical_data)
+            logger.info(f"✅ Successfully saved {inserted} new and {updated} corrected records")
+            
+            # Splice the new candles onto the cached chart series
+            if inserted or updated:
+                from istocks.chart_series import refresh_chart_series
+                
+                conn = psycopg2.connect(DATABASE_URL)
+                try:
+                    refresh_chart_series(conn, [STOCK_SYMBOL])
+                finally:
+                    conn.close()
+                
+                # Evaluate alert rules on the new candles of all stocks
+                run_alert_rules()
         else:
             logger.warning("⚠️  No new data fetched")
         
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Backtest indicator strategies over stored StockPrice history
+
+Usage:
+  python3 scripts/backtest.py rsi                                   # default grid, all stocks
+  python3 scripts/backtest.py rsi --param lower=20,25,30 --param upper=70,75,80 WIPRO VEDL
+  python3 scripts/backtest.py adx --from 2020-01-01 --intraday --output adx.csv
+
+Strategies: rsi, stoch, bollinger, macd, adx, sma. Every (symbol, parameter
+set) pair is reported with total/annual return, Sharpe, max drawdown, trades,
+hit rate and exposure; the best rows by Sharpe are printed.
+"""
+
+import argparse
+import csv
+from datetime import datetime
+
+from istocks.backtest import METRICS, STRATEGIES, run_backtests
+from istocks.config import connect
+
+
+def parse_param(text):
+    name, _, values = text.partition("=")
+    if not values:
+        raise argparse.ArgumentTypeError(f"expected name=v1,v2,... got {text!r}")
+    return name, [float(v) for v in values.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("strategy", choices=sorted(STRATEGIES))
+    parser.add_argument("symbols", nargs="*", help="Symbols (default: all stocks)")
+    parser.add_argument("--param", action="append", type=parse_param, default=[],
+                        help="Parameter values, e.g. lower=20,25,30 (others keep their defaults)")
+    parser.add_argument("--from", dest="start", type=datetime.fromisoformat)
+    parser.add_argument("--to", dest="end", type=datetime.fromisoformat)
+    parser.add_argument("--fee-bps", type=float, default=3.0, help="Fees per side in basis points")
+    parser.add_argument("--slippage-bps", type=float, default=2.0, help="Slippage per side in basis points")
+    parser.add_argument("--intraday", action="store_true", help="Flatten at every session close")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--top", type=int, default=20, help="Rows to print")
+    parser.add_argument("--output", help="Write every result row to this CSV file")
+    args = parser.parse_args()
+
+    params = {**STRATEGIES[args.strategy].defaults, **dict(args.param)}
+    conn = connect()
+    try:
+        rows = run_backtests(conn, args.strategy, params, [s.upper() for s in args.symbols] or None,
+                             args.start, args.end, args.workers, args.fee_bps, args.slippage_bps, args.intraday)
+    finally:
+        conn.close()
+
+    if args.output and rows:
+        with open(args.output, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+    rows.sort(key=lambda row: row["sharpe"], reverse=True)
+    names = list(params)
+    print(f"{'symbol':<12} " + " ".join(f"{n:>9}" for n in names) + " " + " ".join(f"{m:>13}" for m in METRICS))
+    for row in rows[:args.top]:
+        print(f"{row['symbol']:<12} " + " ".join(f"{row[n]:>9g}" for n in names) + " " +
+              " ".join(f"{row[m]:>13.4f}" for m in METRICS))
+
+
+if __name__ == "__main__":
+    main()
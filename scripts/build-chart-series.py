@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Build or incrementally refresh the downsampled ChartSeries cache
+
+Usage:
+  python3 scripts/build-chart-series.py                    # all stocks
+  python3 scripts/build-chart-series.py WIPRO VEDL         # selected symbols
+  python3 scripts/build-chart-series.py --rebuild WIPRO    # ignore cached series
+
+Refreshes run automatically after calculate-indicators.py and auto-fetch.
+"""
+
+import argparse
+
+from logzero import logger
+
+from istocks.chart_series import refresh_chart_series
+from istocks.config import connect
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("symbols", nargs="*")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute series from scratch")
+    args = parser.parse_args()
+
+    conn = connect()
+    try:
+        written = refresh_chart_series(conn, args.symbols or None, args.rebuild)
+        logger.info(f"🏁 {written} chart series written")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Materialize per-symbol ML feature columns as memory-mapped .npy files
+
+Usage:
+  python3 scripts/build-features.py                 # every stock, append new rows
+  python3 scripts/build-features.py WIPRO VEDL --rebuild
+  python3 scripts/build-features.py --list WIPRO    # columns and row count
+
+Files go to exports/features/<SYMBOL>/ (override with FEATURE_STORE or
+--root). Runs after the indicator job only read candles newer than the last
+stored row; training code reads the columns with istocks.features.open_features
+without touching the database.
+"""
+
+import argparse
+
+from istocks.config import connect
+from istocks.features import open_features, read_manifest, store_root, update_features
+
+
+def list_features(args):
+    import os
+
+    for symbol in args.symbols:
+        manifest = read_manifest(os.path.join(args.root or store_root(), symbol))
+        if manifest is None:
+            print(f"{symbol}: no feature store")
+            continue
+        print(f"{symbol}: {manifest['rows']:,} rows, {manifest['first']} → {manifest['last']}")
+        features = open_features(symbol, root=args.root)
+        for name, dtype in manifest["columns"].items():
+            print(f"  {name:<22} {dtype:<14} {features[name].nbytes / 1e6:>9.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("symbols", nargs="*", help="Symbols to build (default: every stock)")
+    parser.add_argument("--rebuild", action="store_true", help="Drop stored features and rebuild from all candles")
+    parser.add_argument("--root", help="Feature store directory (default: FEATURE_STORE or exports/features)")
+    parser.add_argument("--list", action="store_true", help="Show stored columns instead of building")
+    args = parser.parse_args()
+    args.symbols = [s.upper() for s in args.symbols]
+
+    if args.list:
+        list_features(args)
+        return
+
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT symbol, id FROM "Stock"
+                WHERE %s::text[] IS NULL OR symbol = ANY(%s::text[])
+                ORDER BY symbol
+            """, (args.symbols or None, args.symbols or None))
+            stocks = cur.fetchall()
+        total = 0
+        for symbol, stock_id in stocks:
+            total += update_features(conn, symbol, stock_id, args.rebuild, args.root)
+    finally:
+        conn.close()
+    print(f"✅ {total:,} new feature rows for {len(stocks)} stocks")
+
+
+if __name__ == "__main__":
+    main()
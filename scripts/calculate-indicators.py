@@ -1,4 +1,5 @@
 
+import argparse
 import os
 import pandas as pd
 import ta
@@ -7,6 +8,13 @@ from psycopg2.extras import execute_batch
 from dotenv import load_dotenv
 import time
 
+from istocks.chart_series import refresh_chart_series
+from istocks.insights import generate_insights
+from istocks.latest import refresh_latest
+from istocks.live import clear_dirty, dirty_marks, ensure_tables
+from istocks.sql_indicators import ensure_functions, indicator_engines, update_indicators_sql
+from istocks.streaming import INDICATOR_COLUMNS, reset_state
+
 # Load environment variables
 load_dotenv('.env')
 
@@ -18,160 +26,284 @@ if DATABASE_URL and ("istocks.postgres.database.azure.com" in DATABASE_URL or "p
 elif not DATABASE_URL:
     DATABASE_URL = "postgresql://priyanshu@localhost:5432/stock_analysis"
 
-def calculate_indicators_for_stock(symbol):
+def load_prices(conn, symbol):
+    """Fetch all price data for the stock"""
+    query = """
+        SELECT sp.id, sp."stockId", sp.timestamp, sp.open, sp.high, sp.low, sp.close, sp.volume
+        FROM "StockPrice" sp
+        JOIN "Stock" s ON sp."stockId" = s.id
+        WHERE s.symbol = %s
+        ORDER BY sp.timestamp ASC
+    """
+    return pd.read_sql_query(query, conn, params=(symbol,))
+
+
+def compute_indicators(df):
+    """Add every indicator column to `df` using the 'ta' library"""
+    # 1. RSI
+    df['rsi'] = ta.momentum.rsi(df['close'], window=14)
+
+    # 2. MACD
+    macd = ta.trend.MACD(df['close'])
+    df['macd'] = macd.macd()
+    df['macdSignal'] = macd.macd_signal()
+    df['macdHistogram'] = macd.macd_diff()
+
+    # 3. SMA
+    df['sma20'] = ta.trend.sma_indicator(df['close'], window=20)
+    df['sma50'] = ta.trend.sma_indicator(df['close'], window=50)
+    df['sma200'] = ta.trend.sma_indicator(df['close'], window=200)
+
+    # 4. EMA
+    df['ema12'] = ta.trend.ema_indicator(df['close'], window=12)
+    df['ema26'] = ta.trend.ema_indicator(df['close'], window=26)
+
+    # 5. Bollinger Bands
+    bb = ta.volatility.BollingerBands(df['close'], window=20, window_dev=2)
+    df['bbUpper'] = bb.bollinger_hband()
+    df['bbMiddle'] = bb.bollinger_mavg()
+    df['bbLower'] = bb.bollinger_lband()
+
+    # 6. ATR
+    df['atr'] = ta.volatility.average_true_range(df['high'], df['low'], df['close'], window=14)
+
+    # 7. ADX
+    df['adx'] = ta.trend.adx(df['high'], df['low'], df['close'], window=14)
+    df['plusDI'] = ta.trend.adx_pos(df['high'], df['low'], df['close'], window=14)
+    df['minusDI'] = ta.trend.adx_neg(df['high'], df['low'], df['close'], window=14)
+
+    # 8. Stochastic
+    df['stochK'] = ta.momentum.stoch(df['high'], df['low'], df['close'], window=14, smooth_window=3)
+    df['stochD'] = ta.momentum.stoch_signal(df['high'], df['low'], df['close'], window=14, smooth_window=3)
+
+    # 9. CCI
+    df['cci'] = ta.trend.cci(df['high'], df['low'], df['close'], window=20)
+
+    # 10. Williams %R (Corrected parameter: lbp instead of window)
+    df['williamsR'] = ta.momentum.williams_r(df['high'], df['low'], df['close'], lbp=14)
+
+    # 11. ROC
+    df['roc'] = ta.momentum.roc(df['close'], window=10)
+
+    # 12. OBV
+    df['obv'] = ta.volume.on_balance_volume(df['close'], df['volume'])
+
+    # 13. VWAP
+    df['vwap'] = ta.volume.volume_weighted_average_price(df['high'], df['low'], df['close'], df['volume'], window=14)
+
+    # 14. Accumulation/Distribution line
+    df['adLine'] = ta.volume.acc_dist_index(df['high'], df['low'], df['close'], df['volume'])
+    return df
+
+
+def write_indicators(conn, df, columns, since=None):
+    """UPDATE `columns` of the rows in `df` (from `since` on); returns the number of rows sent"""
+    assignments = ",\n                ".join(f'"{c}" = %s' for c in columns)
+    update_query = f"""
+        UPDATE "StockPrice"
+        SET
+                {assignments}
+        WHERE id = %s
+    """
+
+    # Indicators need the whole history, but values before the earliest
+    # changed candle are unchanged and need not be rewritten
+    changed = df if since is None else df[df['timestamp'] >= since]
+
+    # Helper to handle NaN
+    def val(v):
+        return float(v) if pd.notnull(v) else None
+
+    records = [tuple(val(row[c]) for c in columns) + (row['id'],)
+               for _, row in changed[list(columns) + ['id']].iterrows()]
+
+    # Execute batch update
+    cur = conn.cursor()
+    execute_batch(cur, update_query, records, page_size=1000)
+    cur.close()
+    return len(records)
+
+
+def calculate_indicators_for_stock(symbol, since=None, engines=None):
+    """
+    Recalculate indicators over the full history; only rows from `since` are
+    written. `engines` maps each indicator to "python" or "sql" (see
+    istocks.sql_indicators); indicators on the SQL engine never leave the database.
+    """
     print(f"\nProcessing {symbol}...")
-    
+    engines = engines or indicator_engines()
+    python_columns = [c for c in INDICATOR_COLUMNS if engines[c] == "python"]
+    sql_columns = [c for c in INDICATOR_COLUMNS if engines[c] == "sql"]
+
     try:
         conn = psycopg2.connect(DATABASE_URL)
-        
-        # Fetch all price data for the stock
-        query = """
-            SELECT sp.id, sp.timestamp, sp.open, sp.high, sp.low, sp.close, sp.volume
-            FROM "StockPrice" sp
-            JOIN "Stock" s ON sp."stockId" = s.id
-            WHERE s.symbol = %s
-            ORDER BY sp.timestamp ASC
-        """
-        
-        df = pd.read_sql_query(query, conn, params=(symbol,))
-        
+
+        if python_columns:
+            df = load_prices(conn, symbol)
+
+            if df.empty:
+                print(f"⚠️ No data found for {symbol}")
+                return
+
+            print(f"✅ Loaded {len(df)} records")
+            compute_indicators(df)
+
+            print("⏳ Updating database...")
+            written = write_indicators(conn, df, python_columns, since)
+            print(f"✅ Successfully updated {len(python_columns)} indicators for {written} records")
+
+        if sql_columns:
+            with conn.cursor() as cur:
+                cur.execute('SELECT id FROM "Stock" WHERE symbol = %s', (symbol,))
+                row = cur.fetchone()
+            if row is None:
+                print(f"⚠️ No data found for {symbol}")
+                return
+            print(f"⏳ Computing {len(sql_columns)} indicators in the database...")
+            changed = update_indicators_sql(conn, row[0], since, sql_columns)
+            print(f"✅ Successfully updated {changed} changed records")
+
+        conn.commit()
+        conn.close()
+        return True
+
+    except Exception as e:
+        print(f"❌ Error processing {symbol}: {e}")
+        return False
+
+
+def benchmark(symbol):
+    """
+    Time both engines on every indicator of `symbol` and compare their values.
+    All writes are rolled back.
+    """
+    from istocks.sql_indicators import build_query
+
+    print(f"\n📊 Benchmarking {symbol}...")
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        started = time.perf_counter()
+        df = load_prices(conn, symbol)
         if df.empty:
             print(f"⚠️ No data found for {symbol}")
+            return None
+        loaded = time.perf_counter()
+        compute_indicators(df)
+        computed = time.perf_counter()
+        write_indicators(conn, df, INDICATOR_COLUMNS)
+        written = time.perf_counter()
+        conn.rollback()
+        python_seconds = written - started
+        print(f"python  {python_seconds:8.2f}s  (load {loaded - started:.2f}s, compute {computed - loaded:.2f}s, "
+              f"write {written - computed:.2f}s) for {len(df)} rows")
+
+        stock_id = df['stockId'].iloc[0]
+        cleared = ", ".join(f'"{c}" = NULL' for c in INDICATOR_COLUMNS)
+        with conn.cursor() as cur:
+            # The SQL engine skips rows whose stored values already match, so clear them first
+            cur.execute(f'UPDATE "StockPrice" SET {cleared} WHERE "stockId" = %s', (stock_id,))
+        started = time.perf_counter()
+        update_indicators_sql(conn, stock_id, None, INDICATOR_COLUMNS)
+        sql_seconds = time.perf_counter() - started
+        conn.rollback()
+        print(f"sql     {sql_seconds:8.2f}s")
+
+        # Per indicator: computation only, nothing written or sent back
+        print(f"{'indicator':<14} {'sql s':>7} {'max diff':>10}")
+        sql_values = pd.read_sql_query(f"{build_query(list(INDICATOR_COLUMNS))} ORDER BY timestamp", conn,
+                                       params={"stock": stock_id})
+        for column in INDICATOR_COLUMNS:
+            started = time.perf_counter()
+            with conn.cursor() as cur:
+                cur.execute(f'SELECT COUNT("{column}") FROM ({build_query([column])}) q', {"stock": stock_id})
+            seconds = time.perf_counter() - started
+            difference = (pd.to_numeric(sql_values[column]) - df[column]).abs().max()
+            print(f"{column:<14} {seconds:7.2f} {difference:10.3g}")
+    finally:
+        conn.rollback()
+        conn.close()
+
+    faster = "sql" if sql_seconds < python_seconds else "python"
+    print(f"➡️  {faster} is {max(python_seconds, sql_seconds) / min(python_seconds, sql_seconds):.1f}x faster "
+          f"on {symbol}: INDICATOR_ENGINE={faster}")
+    return faster
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recalculate stored technical indicators")
+    parser.add_argument("symbols", nargs="*",
+                        help="Stocks to recalculate (default: WIPRO ADANIPOWER VEDL, or every marked stock with --dirty)")
+    parser.add_argument("--dirty", action="store_true",
+                        help="Only stocks marked by the live updater, writing rows from the earliest change")
+    parser.add_argument("--engine", help='Engine per indicator, e.g. "sql" or "sql,cci=python" '
+                                         '(default: INDICATOR_ENGINE, else python)')
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Time the Python and SQL engines on the symbols without changing data")
+    args = parser.parse_args()
+    stocks = [s.upper() for s in args.symbols]
+    if not stocks and not args.dirty:
+        stocks = ['WIPRO', 'ADANIPOWER', 'VEDL']
+    engines = indicator_engines(args.engine)
+
+    if "sql" in engines.values() or args.benchmark:
+        conn = psycopg2.connect(DATABASE_URL)
+        try:
+            ensure_functions(conn)
+        finally:
+            conn.close()
+    if args.benchmark:
+        for stock in stocks:
+            benchmark(stock)
+        return
+
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        ensure_tables(conn)
+        if stocks:
+            with conn.cursor() as cur:
+                cur.execute('SELECT symbol, id FROM "Stock" WHERE symbol = ANY(%s)', (stocks,))
+                ids = dict(cur.fetchall())
+            marks = dirty_marks(conn, list(ids.values()))
+        else:
+            # --dirty without symbols: every stock the live updater marked
+            marks = dirty_marks(conn)
+            with conn.cursor() as cur:
+                cur.execute('SELECT symbol, id FROM "Stock" WHERE id = ANY(%s) ORDER BY symbol', (list(marks),))
+                ids = dict(cur.fetchall())
+            stocks = list(ids)
+    finally:
+        conn.close()
+    if args.dirty:
+        stocks = [s for s in stocks if ids.get(s) in marks]
+        if not stocks:
+            print("✅ No stocks with changed candles")
             return
-            
-        print(f"✅ Loaded {len(df)} records")
-        
-        # Calculate Indicators using 'ta' library
-        
-        # 1. RSI
-        df['rsi'] = ta.momentum.rsi(df['close'], window=14)
-        
-        # 2. MACD
-        macd = ta.trend.MACD(df['close'])
-        df['macd'] = macd.macd()
-        df['macdSignal'] = macd.macd_signal()
-        df['macdHistogram'] = macd.macd_diff()
-            
-        # 3. SMA
-        df['sma20'] = ta.trend.sma_indicator(df['close'], window=20)
-        df['sma50'] = ta.trend.sma_indicator(df['close'], window=50)
-        df['sma200'] = ta.trend.sma_indicator(df['close'], window=200)
-        
-        # 4. EMA
-        df['ema12'] = ta.trend.ema_indicator(df['close'], window=12)
-        df['ema26'] = ta.trend.ema_indicator(df['close'], window=26)
-        
-        # 5. Bollinger Bands
-        bb = ta.volatility.BollingerBands(df['close'], window=20, window_dev=2)
-        df['bbUpper'] = bb.bollinger_hband()
-        df['bbMiddle'] = bb.bollinger_mavg()
-        df['bbLower'] = bb.bollinger_lband()
-            
-        # 6. ATR
-        df['atr'] = ta.volatility.average_true_range(df['high'], df['low'], df['close'], window=14)
-        
-        # 7. ADX
-        df['adx'] = ta.trend.adx(df['high'], df['low'], df['close'], window=14)
-        df['plusDI'] = ta.trend.adx_pos(df['high'], df['low'], df['close'], window=14)
-        df['minusDI'] = ta.trend.adx_neg(df['high'], df['low'], df['close'], window=14)
-            
-        # 8. Stochastic
-        df['stochK'] = ta.momentum.stoch(df['high'], df['low'], df['close'], window=14, smooth_window=3)
-        df['stochD'] = ta.momentum.stoch_signal(df['high'], df['low'], df['close'], window=14, smooth_window=3)
-            
-        # 9. CCI
-        df['cci'] = ta.trend.cci(df['high'], df['low'], df['close'], window=20)
-        
-        # 10. Williams %R (Corrected parameter: lbp instead of window)
-        df['williamsR'] = ta.momentum.williams_r(df['high'], df['low'], df['close'], lbp=14)
-        
-        # 11. ROC
-        df['roc'] = ta.momentum.roc(df['close'], window=10)
-        
-        # 12. OBV
-        df['obv'] = ta.volume.on_balance_volume(df['close'], df['volume'])
-        
-        # 13. VWAP
-        df['vwap'] = ta.volume.volume_weighted_average_price(df['high'], df['low'], df['close'], df['volume'], window=14)
-        
-        # Prepare update data
-        print("⏳ Updating database...")
-        
-        update_query = """
-            UPDATE "StockPrice"
-            SET 
-                rsi = %s,
-                macd = %s,
-                "macdSignal" = %s,
-                "macdHistogram" = %s,
-                sma20 = %s,
-                sma50 = %s,
-                sma200 = %s,
-                ema12 = %s,
-                ema26 = %s,
-                "bbUpper" = %s,
-                "bbMiddle" = %s,
-                "bbLower" = %s,
-                atr = %s,
-                adx = %s,
-                "plusDI" = %s,
-                "minusDI" = %s,
-                "stochK" = %s,
-                "stochD" = %s,
-                cci = %s,
-                "williamsR" = %s,
-                roc = %s,
-                obv = %s,
-                vwap = %s
-            WHERE id = %s
-        """
-        
-        records = []
-        for index, row in df.iterrows():
-            # Helper to handle NaN
-            def val(v):
-                return float(v) if pd.notnull(v) else None
-                
-            records.append((
-                val(row.get('rsi')),
-                val(row.get('macd')),
-                val(row.get('macdSignal')),
-                val(row.get('macdHistogram')),
-                val(row.get('sma20')),
-                val(row.get('sma50')),
-                val(row.get('sma200')),
-                val(row.get('ema12')),
-                val(row.get('ema26')),
-                val(row.get('bbUpper')),
-                val(row.get('bbMiddle')),
-                val(row.get('bbLower')),
-                val(row.get('atr')),
-                val(row.get('adx')),
-                val(row.get('plusDI')),
-                val(row.get('minusDI')),
-                val(row.get('stochK')),
-                val(row.get('stochD')),
-                val(row.get('cci')),
-                val(row.get('williamsR')),
-                val(row.get('roc')),
-                val(row.get('obv')),
-                val(row.get('vwap')),
-                row['id']
-            ))
-            
-        # Execute batch update
-        cur = conn.cursor()
-        execute_batch(cur, update_query, records, page_size=1000)
+
+    done = []
+    for stock in stocks:
+        mark = marks.get(ids.get(stock))
+        if calculate_indicators_for_stock(stock, mark[0] if args.dirty and mark else None, engines):
+            done.append(stock)
+
+    # Refresh StockLatest, StockInsight and the chart cache from the freshly written data
+    print("\n⏳ Generating insights and chart series...")
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        for stock in done:
+            if ids.get(stock) in marks:
+                clear_dirty(conn, ids[stock], marks[ids[stock]][1])
+            # The live updater's streaming state is rebuilt from the new values
+            if stock in ids:
+                reset_state(conn, ids[stock])
         conn.commit()
-        cur.close()
-        conn.close()
-        
-        print(f"✅ Successfully updated indicators for {len(records)} records")
-        
+        refresh_latest(conn, [ids[s] for s in done if s in ids])
+        generate_insights(conn, stocks)
+        refresh_chart_series(conn, stocks)
     except Exception as e:
-        print(f"❌ Error processing {symbol}: {e}")
+        print(f"❌ Error generating insights: {e}")
+    finally:
+        conn.close()
+
 
 if __name__ == "__main__":
-    stocks = ['WIPRO', 'ADANIPOWER', 'VEDL']
-    for stock in stocks:
-        calculate_indicators_for_stock(stock)
+    main()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Store cross-symbol correlation, covariance and beta matrices
+
+Usage:
+  python3 scripts/compute-correlations.py                    # all stocks, all windows
+  python3 scripts/compute-correlations.py --window 1m VEDL ADANIPOWER WIPRO
+  python3 scripts/compute-correlations.py --refresh          # ignore stored results
+
+Windows (1m on minute bars; 3m, 6m, 1y on daily closes) end at the latest
+candle. Results go to "CorrelationMatrix" keyed by frequency, range and
+symbol set, so re-running without new candles only reads them back.
+"""
+
+import argparse
+
+from istocks.config import connect
+from istocks.correlation import WINDOWS, generate_correlations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("symbols", nargs="*", help="Symbols (default: all stocks)")
+    parser.add_argument("--window", action="append", choices=list(WINDOWS), help="Repeat for several windows")
+    parser.add_argument("--refresh", action="store_true", help="Recompute even if a stored result exists")
+    args = parser.parse_args()
+
+    conn = connect()
+    try:
+        generate_correlations(conn, [s.upper() for s in args.symbols] or None, args.window, args.refresh)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
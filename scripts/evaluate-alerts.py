@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Evaluate alert rules on the latest candles of every stock
+
+Usage:
+  python3 scripts/evaluate-alerts.py                          # rules from scripts/alert-rules.json
+  python3 scripts/evaluate-alerts.py --rules my-rules.json --sinks log,webhook:http://localhost:9000/alerts
+  python3 scripts/evaluate-alerts.py --dry-run WIPRO VEDL     # show what fires, record nothing
+  python3 scripts/evaluate-alerts.py --check                  # only validate the rules file
+
+auto-fetch-stock-data.py runs this after every ingest cycle. New alerts are
+recorded in AlertEvent and sent to the sinks (ALERT_SINKS, default
+"log,file:.cache/alerts.jsonl"); alerts already recorded are not repeated.
+"""
+
+import argparse
+
+from istocks.alerts import load_rules, make_sinks, run_alerts
+from istocks.config import connect
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("symbols", nargs="*", help="Only these symbols (default: all)")
+    parser.add_argument("--rules", help="Rules JSON (default: ALERT_RULES or scripts/alert-rules.json)")
+    parser.add_argument("--sinks", help='Comma-separated sinks: "log", "file:PATH", "webhook:URL"')
+    parser.add_argument("--dry-run", action="store_true", help="Print firing rules without recording them")
+    parser.add_argument("--check", action="store_true", help="Validate the rules and exit")
+    args = parser.parse_args()
+
+    rules = load_rules(args.rules)
+    if args.check:
+        for rule in rules:
+            print(f"✅ {rule.name}: {rule.when}")
+        return
+
+    conn = connect()
+    try:
+        alerts = run_alerts(conn, rules, make_sinks(args.sinks),
+                            [s.upper() for s in args.symbols] or None, args.dry_run)
+    finally:
+        conn.close()
+    if args.dry_run:
+        for alert in alerts:
+            print(f"{alert['rule']:<24} {alert['symbol']:<14} {alert['timestamp']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Export StockPrice per symbol and month as compressed CSV with a manifest
+
+Usage:
+  python3 scripts/export-prices.py                       # all stocks
+  python3 scripts/export-prices.py WIPRO VEDL --workers 8
+  python3 scripts/export-prices.py --compression gzip --out /tmp/export
+  python3 scripts/export-prices.py --force               # re-export everything
+
+Timestamps are written as ISO-8601 (2025-11-14T15:29:00+05:30). Re-running
+resumes: months already listed in manifest.json are skipped, except the
+newest month of each symbol which may still be growing.
+"""
+
+import argparse
+
+from istocks.exporter import DEFAULT_ROOT, Exporter
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("symbols", nargs="*")
+    parser.add_argument("--out", default=DEFAULT_ROOT, help="Export directory (default: exports/prices)")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel COPY streams")
+    parser.add_argument("--compression", choices=("zstd", "gzip"),
+                        help="Default: zstd if the zstandard package is installed, else gzip")
+    parser.add_argument("--force", action="store_true", help="Ignore the manifest and export every month")
+    args = parser.parse_args()
+
+    exporter = Exporter(args.out, workers=args.workers, compression=args.compression)
+    exporter.run(args.symbols or None, force=args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,8 +11,12 @@ from psycopg2.extras import execute_batch
 from SmartApi.smartConnect import SmartConnect
 import pyotp
 from logzero import logger
-from datetime import datetime, timedelta
+from datetime import datetime
 import os
+import time
+
+from istocks.candle_cache import CachedCandleClient, chunk_windows
+from istocks.history import history_starts
 
 # Angel One credentials
 API_KEY = "836MHyks"
@@ -108,14 +112,9 @@ def save_to_database(candles, conn):
 def fetch_historical_data_in_chunks(smartApi, token, start_date, end_date, conn, interval="ONE_MINUTE"):
     """Fetch historical data in chunks and save to database"""
     total_inserted = 0
-    current_start_date = start_date
-
-    while current_start_date < end_date:
-        # Calculate the end date for the current chunk (30 days)
-        current_end_date = current_start_date + timedelta(days=30)
-        if current_end_date > end_date:
-            current_end_date = end_date
 
+    # 30-day chunks on a fixed grid so re-runs are served from the candle cache
+    for current_start_date, current_end_date in chunk_windows(start_date, end_date, days=30):
         # Format dates for the API
         from_date_str = current_start_date.strftime("%Y-%m-%d %H:%M")
         to_date_str = current_end_date.strftime("%Y-%m-%d %H:%M")
@@ -146,12 +145,9 @@ def fetch_historical_data_in_chunks(smartApi, token, start_date, end_date, conn,
         except Exception as e:
             logger.error(f"❌ Error fetching data from {from_date_str} to {to_date_str}: {e}")
 
-        # Move to the next chunk
-        current_start_date = current_end_date
-        
-        # Small delay to respect API rate limits
-        import time
-        time.sleep(0.5)
+        # Small delay to respect API rate limits (cached windows cost no API call)
+        if not smartApi.last_hit:
+            time.sleep(0.5)
 
     return total_inserted
 
@@ -188,6 +184,9 @@ def main():
     else:
         logger.info("✅ Successfully Authenticated with Angel One")
 
+    # Closed-session windows are served from disk on re-runs
+    smartApi = CachedCandleClient(smartApi)
+
     # Connect to database
     try:
         conn = psycopg2.connect(**DB_CONFIG)
@@ -196,13 +195,16 @@ def main():
         logger.error(f"❌ Database connection failed: {e}")
         return
 
-    # Define date range - Angel One provided data from Sept 2016 onwards
-    # Adjust these dates based on what Angel One API actually provides
-    start_date = datetime(2016, 9, 22, 9, 15)   # Start from when data is available
+    # Start where Angel One's history for the symbol begins (binary-searched
+    # once and stored in "HistoryStart")
+    start_date = history_starts(conn, smartApi, {stock_name: token}, [stock_name]).get(stock_name)
     end_date = datetime(2025, 10, 16, 15, 30)   # Up to Oct 16, 2025
+    if start_date is None:
+        logger.error(f"❌ No history available for {stock_name}")
+        conn.close()
+        return
     
     logger.info(f"📅 Fetching data from {start_date} to {end_date}")
-    logger.info(f"⚠️  Based on previous run, data is available from Sept 2016 onwards")
 
     # Fetch historical data in chunks and save to database
     try:
@@ -216,6 +218,8 @@ def main():
     except Exception as e:
         logger.exception(f"❌ Error during data fetch: {e}")
 
+    smartApi.log_stats()
+
     # Close database connection
     conn.close()
     logger.info("✅ Database connection closed")
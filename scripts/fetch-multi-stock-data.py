@@ -6,7 +6,6 @@ Supports 10 years of 1-minute candle data with technical indicators
 
 import requests
 import psycopg2
-from psycopg2.extras import execute_batch
 from SmartApi.smartConnect import SmartConnect
 import pyotp
 from logzero import logger
@@ -15,6 +14,11 @@ import time
 import os
 from dotenv import load_dotenv
 
+from istocks.candle_cache import CachedCandleClient, cache_mode, chunk_windows
+from istocks.latest import update_latest
+from istocks.live import ensure_tables
+from istocks.prices import bulk_insert, candle_rows
+
 # Load environment variables
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 env_path = os.path.join(project_root, '.env.local')
@@ -140,14 +144,9 @@ def get_stock_id(symbol):
 def fetch_data_in_chunks(smartApi, token, start_date, end_date, interval="ONE_MINUTE"):
     """Fetch historical data in 30-day chunks"""
     all_data = []
-    current_start = start_date
     
-    while current_start < end_date:
-        # Fetch 30 days at a time
-        current_end = current_start + timedelta(days=30)
-        if current_end > end_date:
-            current_end = end_date
-        
+    # Fetch 30 days at a time, on a fixed grid so re-runs hit the candle cache
+    for current_start, current_end in chunk_windows(start_date, end_date, days=30):
         from_date_str = current_start.strftime("%Y-%m-%d %H:%M")
         to_date_str = current_end.strftime("%Y-%m-%d %H:%M")
         
@@ -170,13 +169,12 @@ def fetch_data_in_chunks(smartApi, token, start_date, end_date, interval="ONE_MI
             else:
                 logger.warning(f"  ⚠️  No data for this period")
             
-            # Sleep to avoid rate limits
-            time.sleep(0.5)
+            # Sleep to avoid rate limits (cached windows cost no API call)
+            if not smartApi.last_hit:
+                time.sleep(0.5)
             
         except Exception as e:
             logger.error(f"  ❌ Error: {str(e)}")
-        
-        current_start = current_end
     
     return all_data
 
@@ -189,47 +187,13 @@ def save_to_database(stock_id, symbol, data):
     
     try:
         conn = psycopg2.connect(DATABASE_URL)
-        cur = conn.cursor()
-        
-        # Prepare data for insertion
-        records = []
-        for candle in data:
-            # candle format: [timestamp, open, high, low, close, volume]
-            timestamp_str = candle[0]
-            
-            # Parse timestamp (format: "2025-11-14T09:15:00+05:30")
-            timestamp = datetime.strptime(timestamp_str, "%Y-%m-%dT%H:%M:%S%z")
-            
-            # Remove timezone to store as naive datetime (IST)
-            timestamp = timestamp.replace(tzinfo=None)
-            
-            # Generate unique ID
-            record_id = f"price_{stock_id}_{timestamp.strftime('%Y%m%d%H%M%S')}"
-            
-            records.append((
-                record_id,
-                stock_id,
-                timestamp,
-                float(candle[1]),  # open
-                float(candle[2]),  # high
-                float(candle[3]),  # low
-                float(candle[4]),  # close
-                int(candle[5]),    # volume
-            ))
         
-        # Insert data (ON CONFLICT DO NOTHING to avoid duplicates)
-        insert_query = """
-            INSERT INTO "StockPrice" 
-            (id, "stockId", timestamp, open, high, low, close, volume, "createdAt")
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, NOW())
-            ON CONFLICT (id) DO NOTHING
-        """
-        
-        execute_batch(cur, insert_query, records, page_size=1000)
+        # COPY through a staging table, merged one monthly partition at a time
+        records = candle_rows(stock_id, data)
+        inserted_count = bulk_insert(conn, records, source="fetch-multi-stock-data")
+        if inserted_count:
+            update_latest(conn, [stock_id])
         conn.commit()
-        
-        inserted_count = cur.rowcount
-        cur.close()
         conn.close()
         
         logger.info(f"✅ Inserted {inserted_count} new records for {symbol}")
@@ -294,23 +258,37 @@ def main():
     logger.info("🚀 Starting multi-stock data fetch")
     logger.info(f"📊 Stocks to fetch: {', '.join([s['symbol'] for s in STOCKS_CONFIG])}")
     
-    # Authenticate with Angel One
-    try:
-        smartApi = SmartConnect(api_key=API_KEY)
-        totp = pyotp.TOTP(TOTP_TOKEN).now()
-        
-        data = smartApi.generateSession(CLIENT_ID, SECRET_KEY, totp)
-        
-        if not data.get('status', False):
-            logger.error(f"❌ Authentication failed: {data}")
+    # Authenticate with Angel One (not needed when replaying from the candle cache)
+    offline = cache_mode() == "offline"
+    if offline:
+        logger.info("📦 Offline mode: serving candles from the on-disk cache only")
+        smartApi = CachedCandleClient(None)
+    else:
+        try:
+            smartApi = SmartConnect(api_key=API_KEY)
+            totp = pyotp.TOTP(TOTP_TOKEN).now()
+            
+            data = smartApi.generateSession(CLIENT_ID, SECRET_KEY, totp)
+            
+            if not data.get('status', False):
+                logger.error(f"❌ Authentication failed: {data}")
+                return
+            
+            logger.info("✅ Successfully authenticated with Angel One")
+            
+        except Exception as e:
+            logger.error(f"❌ Authentication error: {str(e)}")
             return
         
-        logger.info("✅ Successfully authenticated with Angel One")
-        
-    except Exception as e:
-        logger.error(f"❌ Authentication error: {str(e)}")
-        return
+        # Closed-session windows are served from disk on re-runs
+        smartApi = CachedCandleClient(smartApi)
     
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        ensure_tables(conn)
+    finally:
+        conn.close()
+
     # Fetch data for each stock
     start_time = datetime.now()
     success_count = 0
@@ -319,12 +297,15 @@ def main():
         if fetch_and_save_stock(smartApi, stock_config, years=10):
             success_count += 1
     
+    smartApi.log_stats()
+    
     # Logout
-    try:
-        smartApi.terminateSession(CLIENT_ID)
-        logger.info("✅ Logged out successfully")
-    except Exception as e:
-        logger.warning(f"⚠️  Logout warning: {str(e)}")
+    if not offline:
+        try:
+            smartApi.terminateSession(CLIENT_ID)
+            logger.info("✅ Logged out successfully")
+        except Exception as e:
+            logger.warning(f"⚠️  Logout warning: {str(e)}")
     
     # Summary
     end_time = datetime.now()
@@ -8,6 +8,9 @@ import pyotp
 import psycopg2
 from dotenv import load_dotenv
 
+from istocks.live import ensure_tables, upsert_tail
+from istocks.prices import candle_rows
+
 # Load environment variables
 load_dotenv('.env')
 
@@ -23,6 +26,7 @@ WIPRO_TOKEN = "3787"  # Wipro token
 def fetch_wipro_update():
     # Initialize Database
     conn = psycopg2.connect(DATABASE_URL)
+    ensure_tables(conn)
     cur = conn.cursor()
     
     # Initialize Angel One
@@ -69,26 +73,10 @@ def fetch_wipro_update():
                 records = response['data']
                 print(f"   Fetched {len(records)} records ({current_dt.date()} to {next_dt.date()})")
                 
-                # Save to DB
-                for record in records:
-                    timestamp = datetime.strptime(record[0], "%Y-%m-%dT%H:%M:%S%z")
-                    
-                    cur.execute("""
-                        INSERT INTO "StockPrice" (
-                            id, "stockId", timestamp, open, high, low, close, volume, "createdAt"
-                        ) VALUES (
-                            gen_random_uuid()::text, %s, %s, %s, %s, %s, %s, %s, NOW()
-                        )
-                        ON CONFLICT ("stockId", timestamp) DO UPDATE SET
-                            open = EXCLUDED.open,
-                            high = EXCLUDED.high,
-                            low = EXCLUDED.low,
-                            close = EXCLUDED.close,
-                            volume = EXCLUDED.volume
-                    """, (
-                        stock_id, timestamp, 
-                        float(record[1]), float(record[2]), float(record[3]), float(record[4]), int(record[5])
-                    ))
+                # Save to DB: only candles that are new or changed are written
+                inserted, updated = upsert_tail(conn, stock_id, candle_rows(stock_id, records),
+                                                source="wipro-update")
+                print(f"   {inserted} new, {updated} changed")
                 
                 conn.commit()
                 total_fetched += len(records)
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Queue-driven historical fetch workers
+
+Usage:
+  python3 scripts/fetch-worker.py enqueue --symbols-file ind_nifty500list.csv --years 10
+  python3 scripts/fetch-worker.py enqueue WIPRO VEDL --from 2024-01-01 --probe
+  python3 scripts/fetch-worker.py probe WIPRO VEDL
+  python3 scripts/fetch-worker.py work [--processes 4] [--max-per-credential 3] [--wait]
+  python3 scripts/fetch-worker.py status
+  python3 scripts/fetch-worker.py retry [SYMBOL ...]
+
+`enqueue` splits each symbol's range into 30-day (symbol, window) jobs in the
+"FetchJob" table, starting each symbol at its earliest available candle when
+that is known (`probe` or `enqueue --probe` binary-search it). `work` claims
+jobs one at a time, fetches the window from Angel One, writes the candles
+through the validated bulk insert path and marks the job done in the same
+transaction. Start as many workers as you like, on
+this host or others pointing at the same database.
+
+Every configured Angel One account (ANGELONE_* plus numbered ANGELONE_*_2,
+_3, ... sets) gets its own session and request budget in each worker; jobs
+go to whichever account can make its next request soonest, so throughput
+grows with the number of accounts. `status` shows jobs and rows per account.
+"""
+
+import argparse
+import csv
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from multiprocessing import Process
+
+from logzero import logger
+
+from istocks import work_queue
+from istocks.config import connect
+
+RATE_LIMIT_PENALTY = 10.0   # seconds an account rests after an access-rate error
+
+
+def read_symbols(path):
+    """Symbols from a plain list or a CSV with a "Symbol" column (NSE index files)"""
+    with open(path, newline="") as f:
+        first = f.readline()
+        f.seek(0)
+        if "symbol" in first.lower() and "," in first:
+            return [row.get("Symbol") or row.get("symbol") for row in csv.DictReader(f)]
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def read_args_symbols(args):
+    symbols = [s.upper() for s in args.symbols]
+    if args.symbols_file:
+        symbols += [s.strip().upper() for s in read_symbols(args.symbols_file) if s]
+    if not symbols:
+        raise SystemExit("No symbols given")
+    return symbols
+
+
+def probe_starts(conn, symbols, exchange, interval, refresh=False):
+    """Earliest available candle per symbol, probing Angel One for unknown ones"""
+    from istocks.angel import load_credentials, login, logout, symbol_tokens
+    from istocks.candle_cache import CachedCandleClient
+    from istocks.history import history_starts
+
+    credentials = load_credentials()
+    smart_api = CachedCandleClient(login(credentials))
+    try:
+        return history_starts(conn, smart_api, symbol_tokens(exchange), symbols,
+                              exchange, interval, refresh=refresh)
+    finally:
+        logout(smart_api, credentials)
+
+
+def enqueue(args):
+    from istocks.history import cached_starts
+
+    symbols = read_args_symbols(args)
+    end = datetime.strptime(args.to, "%Y-%m-%d") if args.to else datetime.now()
+    start = datetime.strptime(args.start, "%Y-%m-%d") if args.start else end - timedelta(days=365 * args.years)
+    start = start.replace(hour=9, minute=15, second=0, microsecond=0)
+
+    conn = connect()
+    try:
+        # Start each symbol where its history begins; skip symbols without any
+        if args.probe:
+            starts = probe_starts(conn, symbols, args.exchange, args.interval)
+        else:
+            starts = cached_starts(conn, symbols, args.exchange, args.interval)
+        empty = [s for s in symbols if s in starts and starts[s] is None]
+        if empty:
+            logger.warning(f"⚠️  No history available for {', '.join(empty)}, not queued")
+        symbols = [s for s in symbols if s not in empty]
+        added = work_queue.enqueue(conn, symbols, start, end, exchange=args.exchange,
+                                   interval=args.interval, priority=args.priority, starts=starts)
+    finally:
+        conn.close()
+    logger.info(f"✅ Queued {added} new jobs for {len(symbols)} symbols ({start:%Y-%m-%d} → {end:%Y-%m-%d})")
+
+
+def probe(args):
+    symbols = read_args_symbols(args)
+    conn = connect()
+    try:
+        starts = probe_starts(conn, symbols, args.exchange, args.interval, refresh=args.refresh)
+    finally:
+        conn.close()
+    for symbol in symbols:
+        earliest = starts.get(symbol)
+        print(f"{symbol:<14} {earliest:%Y-%m-%d %H:%M}" if earliest else f"{symbol:<14} -")
+
+
+def work_loop(max_per_credential, wait, poll_seconds, min_interval, accounts=None):
+    # Heavy imports stay out of the queue maintenance commands
+    from istocks.angel import AccountPool, load_credential_pool, symbol_tokens
+    from istocks.candle_cache import CachedCandleClient
+    from istocks.importer import ensure_stock
+    from istocks.latest import update_latest
+    from istocks.live import ensure_tables
+    from istocks.prices import bulk_insert, candle_rows
+
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    pool = AccountPool(load_credential_pool(accounts), min_interval, wrap=CachedCandleClient)
+    tokens = {}
+    stock_ids = {}
+    done = 0
+
+    conn = connect()
+    ensure_tables(conn)
+    try:
+        while len(pool):
+            # The account whose budget frees up first takes the next job
+            job = account = None
+            for account in pool.next():
+                job = work_queue.claim(conn, worker_id, account.client_id, max_per_credential)
+                if job is not None:
+                    break
+            if job is None:
+                if not wait and not work_queue.has_work(conn):
+                    break
+                time.sleep(poll_seconds)
+                continue
+
+            label = f"{job['symbol']} {job['fromTime']:%Y-%m-%d} → {job['toTime']:%Y-%m-%d} [{account.client_id}]"
+            started = None
+            try:
+                if job["exchange"] not in tokens:
+                    tokens[job["exchange"]] = symbol_tokens(job["exchange"])
+                token = tokens[job["exchange"]].get(job["symbol"])
+                if token is None:
+                    raise ValueError(f"{job['symbol']} not in the {job['exchange']} scrip master")
+                if job["symbol"] not in stock_ids:
+                    stock_ids[job["symbol"]] = ensure_stock(conn, job["symbol"], exchange=job["exchange"])
+
+                client = account.client
+                account.wait()
+                started = time.monotonic()
+                response = client.getCandleData({
+                    "exchange": job["exchange"],
+                    "symboltoken": token,
+                    "interval": job["interval"],
+                    "fromdate": job["fromTime"].strftime("%Y-%m-%d %H:%M"),
+                    "todate": job["toTime"].strftime("%Y-%m-%d %H:%M"),
+                })
+                if not response.get("status"):
+                    raise RuntimeError(f"{response.get('errorcode')} {response.get('message')}")
+                # Cache hits are free and do not use the account's budget
+                account.record(started, len(response.get("data") or []), free=client.last_hit)
+
+                if not work_queue.heartbeat(conn, job, worker_id):
+                    logger.warning(f"⚠️  Lost lease on {label}, skipping")
+                    continue
+                rows = candle_rows(stock_ids[job["symbol"]], response.get("data") or [])
+                inserted = bulk_insert(conn, rows, source="fetch-worker")
+                if inserted:
+                    update_latest(conn, [stock_ids[job["symbol"]]])
+                work_queue.complete(conn, job, worker_id, inserted)
+                conn.commit()
+                done += 1
+                logger.info(f"  ✅ {label}: {len(rows)} candles, {inserted} new")
+
+            except Exception as e:
+                logger.error(f"  ❌ {label} (attempt {job['attempts']}): {e}")
+                if started is not None:
+                    throttled = "access rate" in str(e).lower()
+                    account.record(started, error=True, penalty=RATE_LIMIT_PENALTY if throttled else 0.0)
+                work_queue.fail(conn, job, worker_id, e)
+    finally:
+        conn.close()
+        pool.log_stats()
+        pool.close()
+
+    logger.info(f"🏁 Worker {worker_id} finished {done} jobs")
+
+
+def work(args):
+    conn = connect()
+    try:
+        work_queue.ensure_table(conn)
+    finally:
+        conn.close()
+
+    loop_args = (args.max_per_credential, args.wait, args.poll_seconds, args.min_interval, args.accounts)
+    if args.processes == 1:
+        work_loop(*loop_args)
+        return
+    processes = [Process(target=work_loop, args=loop_args) for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+def status(args):
+    conn = connect()
+    try:
+        work_queue.ensure_table(conn)
+        rows = work_queue.queue_status(conn)
+    finally:
+        conn.close()
+    if not rows:
+        print("Queue is empty")
+        return
+    print(f"{'status':<10} {'credential':<14} {'jobs':>8} {'rows':>12}")
+    for state, credential, jobs, inserted in rows:
+        print(f"{state:<10} {credential:<14} {jobs:>8} {inserted:>12}")
+
+
+def retry(args):
+    conn = connect()
+    try:
+        count = work_queue.retry_failed(conn, [s.upper() for s in args.symbols] or None)
+    finally:
+        conn.close()
+    logger.info(f"🔁 Re-queued {count} failed jobs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("enqueue", help="Queue (symbol, window) jobs")
+    p.add_argument("symbols", nargs="*", default=[])
+    p.add_argument("--symbols-file", help="Text file with one symbol per line, or a CSV with a Symbol column")
+    p.add_argument("--from", dest="start", help="Start date YYYY-MM-DD (default: --years back)")
+    p.add_argument("--to", help="End date YYYY-MM-DD (default: now)")
+    p.add_argument("--years", type=int, default=10)
+    p.add_argument("--exchange", default="NSE")
+    p.add_argument("--interval", default="ONE_MINUTE")
+    p.add_argument("--priority", type=int, default=0, help="Higher runs first")
+    p.add_argument("--probe", action="store_true",
+                   help="Find where unprobed symbols' history starts first (logs in to Angel One)")
+    p.set_defaults(func=enqueue)
+
+    p = sub.add_parser("probe", help="Binary-search and store the earliest available candle per symbol")
+    p.add_argument("symbols", nargs="*", default=[])
+    p.add_argument("--symbols-file")
+    p.add_argument("--exchange", default="NSE")
+    p.add_argument("--interval", default="ONE_MINUTE")
+    p.add_argument("--refresh", action="store_true", help="Probe again even if a recent result is stored")
+    p.set_defaults(func=probe)
+
+    p = sub.add_parser("work", help="Claim and run jobs until the queue is drained")
+    p.add_argument("--processes", type=int, default=1, help="Worker processes to start on this host")
+    p.add_argument("--max-per-credential", type=int, default=3,
+                   help="Jobs running at once per Angel One account, across all hosts")
+    p.add_argument("--min-interval", type=float, default=1.0,
+                   help="Minimum seconds between API requests per worker and account")
+    p.add_argument("--accounts", nargs="+", metavar="CLIENT_ID",
+                   help="Only use these Angel One accounts (default: every configured account)")
+    p.add_argument("--poll-seconds", type=float, default=5.0)
+    p.add_argument("--wait", action="store_true", help="Keep polling for new jobs instead of exiting")
+    p.set_defaults(func=work)
+
+    p = sub.add_parser("status", help="Job counts by status and credential")
+    p.set_defaults(func=status)
+
+    p = sub.add_parser("retry", help="Re-queue failed jobs")
+    p.add_argument("symbols", nargs="*", default=[])
+    p.set_defaults(func=retry)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Generate precomputed StockInsight rows for every stock and chart timeframe
+
+Usage:
+  python3 scripts/generate-insights.py            # all stocks
+  python3 scripts/generate-insights.py WIPRO VEDL # selected symbols
+
+Runs automatically at the end of calculate-indicators.py.
+"""
+
+import sys
+
+from istocks.config import connect
+from istocks.insights import generate_insights
+
+
+def main():
+    conn = connect()
+    try:
+        generate_insights(conn, sys.argv[1:] or None)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Stream price dumps into StockPrice through the bulk COPY path
+
+Usage:
+  python3 scripts/import-prices.py exports/prices --jobs 8
+  python3 scripts/import-prices.py wipro_1min_data.json --symbol WIPRO
+  python3 scripts/import-prices.py exports/stock_prices.csv
+  python3 scripts/import-prices.py stock_analysis_backup.sql --naive-tz utc
+
+Accepts JSON arrays, CSV (ISO or JavaScript date strings), Parquet and plain
+pg_dump files, optionally .gz/.zst compressed, and whole directories. Files
+without a stockId/symbol column need --symbol. Timestamps without an offset
+are taken as IST unless --naive-tz utc is given (dumps of databases written
+through Prisma store UTC). A file whose first batch of naive timestamps
+mostly falls outside trading sessions, but fits them in the other zone, is
+refused with a hint to switch --naive-tz.
+"""
+
+import argparse
+from datetime import timezone
+
+from istocks.importer import BATCH_SIZE, IST, run_import
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="Files or directories to import")
+    parser.add_argument("--symbol", help="Stock symbol for files without stockId/symbol columns")
+    parser.add_argument("--jobs", type=int, default=4, help="Files imported in parallel")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--naive-tz", choices=("ist", "utc"), default="ist",
+                        help="Time zone of timestamps without an offset")
+    parser.add_argument("--no-validate", action="store_true", help="Skip the ingest validation checks")
+    args = parser.parse_args()
+
+    run_import(
+        args.paths,
+        symbol=args.symbol,
+        jobs=args.jobs,
+        naive_tz=timezone.utc if args.naive_tz == "utc" else IST,
+        batch_size=args.batch_size,
+        validate=not args.no_validate,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -16,7 +16,12 @@ pip3 install --user --break-system-packages \
     smartapi-python \
     pyotp \
     logzero \
-    python-dotenv
+    python-dotenv \
+    numpy \
+    pandas \
+    ta \
+    zstandard \
+    duckdb
 
 echo "✅ Dependencies installed successfully!"
 echo ""
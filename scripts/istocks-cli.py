@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+"""
+Single entry point for the Python data pipeline
+
+Usage:
+  python3 scripts/istocks-cli.py status
+  python3 scripts/istocks-cli.py gaps --days 7
+  python3 scripts/istocks-cli.py fetch
+  python3 scripts/istocks-cli.py backfill work --processes 4
+  npm run istocks -- export --workers 8
+
+See `python3 scripts/istocks-cli.py --help` for every command. Each command's
+dependencies are only imported when that command runs.
+"""
+
+from istocks.cli import main
+
+if __name__ == "__main__":
+    main()
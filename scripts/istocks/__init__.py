@@ -0,0 +1,7 @@
+"""
+Shared building blocks for the iStocks Python data pipeline.
+
+The hyphenated scripts in ``scripts/`` are thin entry points; the reusable
+pieces (database access, storage maintenance, analytics jobs) live here so
+that every script talks to PostgreSQL the same way.
+"""
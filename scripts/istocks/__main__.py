@@ -0,0 +1,5 @@
+"""Allow `python3 -m istocks ...` from the scripts/ directory"""
+
+from .cli import main
+
+main()
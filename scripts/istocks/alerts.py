@@ -0,0 +1,390 @@
+"""
+Declarative alert rules evaluated over all stocks at once
+
+Rules are JSON objects with a name and a condition over the stored candle
+and indicator columns:
+
+    {"name": "rsi-oversold", "when": "crosses_below(rsi, 30)"}
+    {"name": "bb-breakout", "when": "close > bbUpper and volume > 2 * avgVolume"}
+
+Conditions use Python expression syntax restricted to column names,
+numbers, arithmetic, comparisons, and/or/not and the functions prev(x),
+crosses_above(a, b), crosses_below(a, b), abs(x). `avgVolume` is the mean
+volume of the AVERAGE_BARS candles before the current one.
+
+Each rule is compiled once into a function over column arrays holding one
+value per stock, so a run costs one snapshot query plus a few NumPy
+operations per rule regardless of the number of stocks. Rules fire on the
+candle where their condition becomes true (`"edge": false` fires on every
+candle it holds). Fired alerts are recorded in "AlertEvent", unique per
+rule, stock and candle, and only alerts recorded for the first time are
+passed to the sinks, so repeated runs over the same candle stay quiet.
+"""
+
+import ast
+import io
+import json
+import os
+import time
+import urllib.request
+from dataclasses import dataclass
+
+import numpy as np
+from logzero import logger
+
+from .config import PROJECT_ROOT, load_env
+from .replay import SHADOW_PREFIX
+
+AVERAGE_BARS = 20
+SNAPSHOT_BARS = AVERAGE_BARS + 2    # current, previous and the one before, plus averages
+DEFAULT_RULES = os.path.join(PROJECT_ROOT, "scripts", "alert-rules.json")
+DEFAULT_SINKS = "log,file:.cache/alerts.jsonl"
+
+SNAPSHOT_COLUMNS = (
+    "open", "high", "low", "close", "volume",
+    "rsi", "macd", "macdSignal", "macdHistogram", "sma20", "sma50", "sma200",
+    "ema12", "ema26", "bbUpper", "bbMiddle", "bbLower", "atr", "adx", "plusDI",
+    "minusDI", "stochK", "stochD", "cci", "williamsR", "roc", "obv", "vwap", "adLine",
+)
+DERIVED_COLUMNS = ("avgVolume",)
+
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS "AlertEvent" (
+        id BIGSERIAL PRIMARY KEY,
+        rule TEXT NOT NULL,
+        "stockId" TEXT NOT NULL,
+        timestamp TIMESTAMP(3) NOT NULL,
+        close DOUBLE PRECISION,
+        "createdAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        CONSTRAINT "AlertEvent_rule_stockId_timestamp_key" UNIQUE (rule, "stockId", timestamp),
+        CONSTRAINT "AlertEvent_stockId_fkey" FOREIGN KEY ("stockId")
+            REFERENCES "Stock"(id) ON DELETE CASCADE ON UPDATE CASCADE
+    )
+"""
+
+
+def ensure_table(conn):
+    with conn.cursor() as cur:
+        cur.execute(CREATE_TABLE)
+    conn.commit()
+
+
+# -- snapshot -------------------------------------------------------------------
+
+@dataclass
+class Snapshot:
+    """Last SNAPSHOT_BARS candles of every stock as (bars, stocks) arrays, newest first"""
+    stock_ids: np.ndarray
+    symbols: np.ndarray
+    timestamps: np.ndarray      # (bars, stocks) datetime64, NaT where a stock has fewer bars
+    columns: dict               # name -> (bars, stocks) float64, NaN where missing
+
+    def frame(self, offset):
+        """Column values `offset` candles back, plus derived columns"""
+        values = {name: array[offset] for name, array in self.columns.items()}
+        volume = self.columns["volume"][offset + 1:offset + 1 + AVERAGE_BARS]
+        with np.errstate(invalid="ignore"):
+            values["avgVolume"] = (np.nanmean(volume, axis=0) if len(volume)
+                                   else np.full(len(self.stock_ids), np.nan))
+        return values
+
+
+def load_snapshot(conn, symbols=None, bars=SNAPSHOT_BARS):
+    """Read the latest `bars` candles of every stock but replay shadows (or of `symbols`)"""
+    import pandas as pd
+
+    quoted = ", ".join(f'p."{c}"' for c in SNAPSHOT_COLUMNS)
+    with conn.cursor() as cur:
+        query = cur.mogrify(f"""
+            SELECT s.id, s.symbol, p.timestamp, {quoted}
+            FROM "Stock" s
+            CROSS JOIN LATERAL (
+                SELECT * FROM "StockPrice" p
+                WHERE p."stockId" = s.id
+                ORDER BY p.timestamp DESC
+                LIMIT %s
+            ) p
+            WHERE (%s::text[] IS NULL AND s.symbol NOT LIKE %s) OR s.symbol = ANY(%s::text[])
+        """, (bars, symbols, SHADOW_PREFIX + "%", symbols)).decode()
+        buffer = io.StringIO()
+        cur.copy_expert(f"COPY ({query}) TO STDOUT WITH CSV HEADER", buffer)
+    buffer.seek(0)
+    df = pd.read_csv(buffer, parse_dates=["timestamp"])
+
+    stock_ids, index = np.unique(df["id"].to_numpy(dtype=str), return_inverse=True)
+    symbols_by_id = dict(zip(df["id"], df["symbol"]))
+    # rank 0 = newest candle of each stock
+    rank = df.groupby("id")["timestamp"].rank(method="first", ascending=False).to_numpy(dtype=int) - 1
+    shape = (bars, len(stock_ids))
+    timestamps = np.full(shape, np.datetime64("NaT"), dtype="datetime64[ns]")
+    timestamps[rank, index] = df["timestamp"].to_numpy()
+    columns = {}
+    for name in SNAPSHOT_COLUMNS:
+        array = np.full(shape, np.nan)
+        array[rank, index] = df[name].to_numpy(dtype=float)
+        columns[name] = array
+    return Snapshot(stock_ids, np.array([symbols_by_id[i] for i in stock_ids], dtype=object),
+                    timestamps, columns)
+
+
+# -- rule compiler --------------------------------------------------------------
+
+_COMPARE = {
+    ast.Gt: np.greater, ast.GtE: np.greater_equal, ast.Lt: np.less,
+    ast.LtE: np.less_equal, ast.Eq: np.equal, ast.NotEq: np.not_equal,
+}
+_ARITHMETIC = {
+    ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide,
+}
+
+
+class RuleError(ValueError):
+    pass
+
+
+def _compile(node, names):
+    """Compile an expression node into fn(frames, offset) -> array or number"""
+    if isinstance(node, ast.Expression):
+        return _compile(node.body, names)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        value = float(node.value)
+        return lambda frames, offset: value
+    if isinstance(node, ast.Name):
+        if node.id not in names:
+            raise RuleError(f"unknown column {node.id!r}")
+        name = node.id
+        return lambda frames, offset: frames(offset)[name]
+    if isinstance(node, ast.UnaryOp):
+        operand = _compile(node.operand, names)
+        if isinstance(node.op, ast.Not):
+            return lambda frames, offset: np.logical_not(operand(frames, offset))
+        if isinstance(node.op, ast.USub):
+            return lambda frames, offset: np.negative(operand(frames, offset))
+    if isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC:
+        op = _ARITHMETIC[type(node.op)]
+        left, right = _compile(node.left, names), _compile(node.right, names)
+        return lambda frames, offset: op(left(frames, offset), right(frames, offset))
+    if isinstance(node, ast.BoolOp):
+        op = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        parts = [_compile(value, names) for value in node.values]
+
+        def combined(frames, offset):
+            result = parts[0](frames, offset)
+            for part in parts[1:]:
+                result = op(result, part(frames, offset))
+            return result
+        return combined
+    if isinstance(node, ast.Compare):
+        terms = [_compile(node.left, names)] + [_compile(c, names) for c in node.comparators]
+        ops = [_COMPARE[type(op)] for op in node.ops if type(op) in _COMPARE]
+        if len(ops) != len(node.ops):
+            raise RuleError("unsupported comparison")
+
+        def compared(frames, offset):
+            values = [term(frames, offset) for term in terms]
+            result = True
+            for op, left, right in zip(ops, values, values[1:]):
+                result = np.logical_and(result, op(left, right))
+            return result
+        return compared
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+        args = [_compile(arg, names) for arg in node.args]
+        name = node.func.id
+        if name == "prev" and len(args) == 1:
+            return lambda frames, offset: args[0](frames, offset + 1)
+        if name == "abs" and len(args) == 1:
+            return lambda frames, offset: np.abs(args[0](frames, offset))
+        if name in ("crosses_above", "crosses_below") and len(args) == 2:
+            now, before = (np.greater, np.less_equal) if name == "crosses_above" else (np.less, np.greater_equal)
+            a, b = args
+            return lambda frames, offset: np.logical_and(
+                now(a(frames, offset), b(frames, offset)),
+                before(a(frames, offset + 1), b(frames, offset + 1)))
+    raise RuleError(f"unsupported expression {ast.dump(node)[:60]}")
+
+
+def _depth(node):
+    """Candles back a condition looks (prev() and crosses_* add one)"""
+    deepest = 0
+    for child in ast.iter_child_nodes(node):
+        deepest = max(deepest, _depth(child))
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and \
+            node.func.id in ("prev", "crosses_above", "crosses_below"):
+        deepest += 1
+    return deepest
+
+
+def compile_condition(text, names):
+    """
+    Compile a condition over `names` into (fn(frames, offset), depth).
+
+    `frames(offset)` must return {name: array} for the candle `offset` back;
+    `depth` is the largest offset the condition reads.
+    """
+    try:
+        tree = ast.parse(text, mode="eval")
+    except SyntaxError as e:
+        raise RuleError(e.msg) from None
+    return _compile(tree, names), _depth(tree)
+
+
+@dataclass
+class Rule:
+    name: str
+    when: str
+    edge: bool = True
+
+    def __post_init__(self):
+        try:
+            self._evaluate, depth = compile_condition(self.when, set(SNAPSHOT_COLUMNS) | set(DERIVED_COLUMNS))
+        except RuleError as e:
+            raise RuleError(f"{self.name}: {e}") from None
+        self.depth = depth + (1 if self.edge else 0)
+
+    def evaluate(self, frames, offset=0):
+        """Boolean array over stocks (NaN comparisons are False)"""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result = np.asarray(self._evaluate(frames, offset), dtype=bool)
+            if self.edge:
+                result = result & ~np.asarray(self._evaluate(frames, offset + 1), dtype=bool)
+        return result
+
+
+def load_rules(path=None):
+    """Rules from a JSON list (ALERT_RULES or scripts/alert-rules.json)"""
+    load_env()
+    path = path or os.getenv("ALERT_RULES") or DEFAULT_RULES
+    with open(path) as f:
+        specs = json.load(f)
+    rules = [Rule(spec["name"], spec["when"], spec.get("edge", True)) for spec in specs]
+    if len({rule.name for rule in rules}) != len(rules):
+        raise RuleError(f"duplicate rule names in {path}")
+    return rules
+
+
+# -- evaluation -----------------------------------------------------------------
+
+def evaluate(rules, snapshot):
+    """[(rule, stock index)] firing on each stock's latest candle"""
+    cache = {}
+
+    def frames(offset):
+        if offset not in cache:
+            cache[offset] = snapshot.frame(offset)
+        return cache[offset]
+
+    fired = []
+    for rule in rules:
+        if rule.depth >= len(snapshot.timestamps):
+            raise RuleError(f"{rule.name}: looks back further than the snapshot")
+        for index in np.flatnonzero(rule.evaluate(frames)):
+            fired.append((rule, index))
+    return fired
+
+
+def record_alerts(conn, snapshot, fired):
+    """Store fired alerts in "AlertEvent"; returns the ones not recorded before"""
+    from psycopg2.extras import execute_values
+
+    if not fired:
+        return []
+    rows = [(rule.name, snapshot.stock_ids[i], snapshot.timestamps[0, i].astype("datetime64[ms]").item(),
+             float(snapshot.columns["close"][0, i])) for rule, i in fired]
+    with conn.cursor() as cur:
+        inserted = execute_values(cur, """
+            INSERT INTO "AlertEvent" (rule, "stockId", timestamp, close)
+            VALUES %s
+            ON CONFLICT (rule, "stockId", timestamp) DO NOTHING
+            RETURNING rule, "stockId", timestamp, close
+        """, rows, fetch=True)
+    symbols = dict(zip(snapshot.stock_ids, snapshot.symbols))
+    return [{"rule": rule, "symbol": symbols[stock_id], "stockId": stock_id,
+             "timestamp": timestamp.isoformat(sep=" "), "close": close}
+            for rule, stock_id, timestamp, close in inserted]
+
+
+# -- sinks ----------------------------------------------------------------------
+
+class LogSink:
+    def send(self, alerts):
+        for alert in alerts:
+            logger.info(f"🔔 {alert['rule']}: {alert['symbol']} at {alert['timestamp']} (close {alert['close']})")
+
+
+class FileSink:
+    """Append alerts as JSON lines"""
+
+    def __init__(self, path):
+        self.path = path if os.path.isabs(path) else os.path.join(PROJECT_ROOT, path)
+
+    def send(self, alerts):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a") as f:
+            for alert in alerts:
+                f.write(json.dumps(alert) + "\n")
+
+
+class WebhookSink:
+    """POST {"alerts": [...]} as JSON, e.g. to a local test receiver"""
+
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, alerts):
+        request = urllib.request.Request(
+            self.url, data=json.dumps({"alerts": alerts}).encode(),
+            headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+def make_sinks(spec=None):
+    """Sinks from "log,file:PATH,webhook:URL" (ALERT_SINKS, default log + .cache/alerts.jsonl)"""
+    load_env()
+    spec = spec or os.getenv("ALERT_SINKS") or DEFAULT_SINKS
+    sinks = []
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        kind, _, target = part.partition(":")
+        if kind == "log":
+            sinks.append(LogSink())
+        elif kind == "file":
+            sinks.append(FileSink(target))
+        elif kind == "webhook":
+            sinks.append(WebhookSink(target))
+        else:
+            raise ValueError(f"unknown alert sink {part!r}")
+    return sinks
+
+
+def run_alerts(conn, rules=None, sinks=None, symbols=None, dry_run=False):
+    """
+    Evaluate `rules` on the latest candles and deliver new alerts.
+
+    Returns the delivered alerts (with `dry_run`, everything that fired,
+    without recording or delivering).
+    """
+    rules = load_rules() if rules is None else rules
+    if not rules:
+        return []
+    ensure_table(conn)
+    started = time.perf_counter()
+    snapshot = load_snapshot(conn, symbols, max(SNAPSHOT_BARS, max(r.depth for r in rules) + 1))
+    loaded = time.perf_counter()
+    fired = evaluate(rules, snapshot)
+    evaluated = time.perf_counter()
+    logger.info(f"🔔 {len(rules)} rules x {len(snapshot.stock_ids)} stocks: {len(fired)} firing "
+                f"(snapshot {loaded - started:.3f}s, rules {(evaluated - loaded) * 1000:.1f}ms)")
+    if dry_run:
+        return [{"rule": rule.name, "symbol": snapshot.symbols[i],
+                 "timestamp": str(snapshot.timestamps[0, i])} for rule, i in fired]
+
+    alerts = record_alerts(conn, snapshot, fired)
+    conn.commit()
+    for sink in make_sinks() if sinks is None else sinks:
+        try:
+            if alerts:
+                sink.send(alerts)
+        except Exception as e:
+            logger.error(f"❌ Alert sink {type(sink).__name__} failed: {e}")
+    return alerts
@@ -0,0 +1,165 @@
+"""
+Angel One SmartAPI helpers shared by the fetch workers
+
+Credentials come from the same ANGELONE_* variables as fetch-multi-stock-data.py,
+set in .env or the environment; there are no built-in defaults. Further accounts are numbered: ANGELONE_API_KEY_2, ANGELONE_CLIENT_ID_2,
+ANGELONE_SECRET_KEY_2, ANGELONE_TOTP_TOKEN_2, then _3 and so on.
+SmartApi, pyotp and requests are imported when first needed so that
+queue maintenance commands do not pay for them.
+"""
+
+import os
+import time
+from collections import namedtuple
+
+from logzero import logger
+
+from .config import load_env
+
+SCRIP_MASTER_URL = "https://margincalculator.angelone.in/OpenAPI_File/files/OpenAPIScripMaster.json"
+
+Credentials = namedtuple("Credentials", "api_key client_id secret_key totp_token")
+
+
+def _credentials(suffix=""):
+    names = [f"ANGELONE_{field.upper()}{suffix}" for field in Credentials._fields]
+    missing = [name for name in names if not os.getenv(name)]
+    if missing:
+        raise RuntimeError(f"Angel One credentials not configured: set {', '.join(missing)} "
+                           f"in .env or the environment")
+    return Credentials(*(os.getenv(name) for name in names))
+
+
+def load_credentials():
+    """The primary account; raises RuntimeError when an ANGELONE_* variable is unset"""
+    load_env()
+    return _credentials()
+
+
+def load_credential_pool(client_ids=None):
+    """The primary account plus every numbered ANGELONE_*_<n> set, optionally filtered"""
+    pool = [load_credentials()]
+    n = 2
+    while os.getenv(f"ANGELONE_API_KEY_{n}"):
+        pool.append(_credentials(f"_{n}"))
+        n += 1
+    if client_ids:
+        pool = [c for c in pool if c.client_id in client_ids]
+    return pool
+
+
+def login(credentials):
+    """Open a SmartConnect session; raises RuntimeError when authentication fails"""
+    import pyotp
+    from SmartApi.smartConnect import SmartConnect
+
+    smart_api = SmartConnect(api_key=credentials.api_key)
+    data = smart_api.generateSession(credentials.client_id, credentials.secret_key,
+                                     pyotp.TOTP(credentials.totp_token).now())
+    if not data.get("status", False):
+        raise RuntimeError(f"Authentication failed for {credentials.client_id}: {data}")
+    logger.info(f"✅ Authenticated with Angel One as {credentials.client_id}")
+    return smart_api
+
+
+def logout(smart_api, credentials):
+    try:
+        smart_api.terminateSession(credentials.client_id)
+    except Exception as e:
+        logger.warning(f"⚠️  Logout warning: {str(e)}")
+
+
+def symbol_tokens(exchange="NSE"):
+    """{symbol name: token} for one exchange from the scrip master (one download)"""
+    import requests
+
+    response = requests.get(SCRIP_MASTER_URL, timeout=60)
+    response.raise_for_status()
+    tokens = {}
+    for item in response.json():
+        if item["exch_seg"] != exchange:
+            continue
+        # "name" is the bare symbol; prefer the "-EQ" series when a name repeats
+        name = item["name"].upper()
+        if name not in tokens or item["symbol"].endswith("-EQ"):
+            tokens[name] = item["token"]
+    return tokens
+
+
+class Account:
+    """One account's session (opened on first use) and request budget"""
+
+    def __init__(self, credentials, min_interval, wrap=None):
+        self.credentials = credentials
+        self.client_id = credentials.client_id
+        self.min_interval = min_interval
+        self.wrap = wrap
+        self.next_at = 0.0          # time.monotonic() of the next allowed request
+        self.disabled = False
+        self.requests = 0
+        self.errors = 0
+        self.candles = 0
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            try:
+                session = login(self.credentials)
+            except Exception:
+                self.disabled = True
+                raise
+            self._client = self.wrap(session) if self.wrap else session
+        return self._client
+
+    def wait(self):
+        delay = self.next_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def record(self, started, candles=0, error=False, free=False, penalty=0.0):
+        """Account one request; `free` (cache hit) requests do not use the budget"""
+        if error:
+            self.errors += 1
+        else:
+            self.candles += candles
+        if not free:
+            self.requests += 1
+            self.next_at = max(self.next_at, started + self.min_interval) + penalty
+
+    def close(self):
+        if self._client is not None:
+            logout(self._client, self.credentials)
+            self._client = None
+
+
+class AccountPool:
+    """
+    Several accounts used side by side, each at its own request rate.
+
+    `next()` returns usable accounts by when their budget next allows a
+    request, so work spreads over all accounts and total throughput grows
+    with the number of accounts.
+    """
+
+    def __init__(self, credentials, min_interval=1.0, wrap=None):
+        if not credentials:
+            raise ValueError("No Angel One credentials configured")
+        self.accounts = [Account(c, min_interval, wrap) for c in credentials]
+
+    def __len__(self):
+        return sum(not a.disabled for a in self.accounts)
+
+    def next(self):
+        return sorted((a for a in self.accounts if not a.disabled), key=lambda a: a.next_at)
+
+    def log_stats(self):
+        for a in self.accounts:
+            if a._client is not None and hasattr(a._client, "log_stats"):
+                a._client.log_stats()
+            state = " (disabled)" if a.disabled else ""
+            logger.info(f"📊 {a.client_id}{state}: {a.requests} requests, {a.candles} candles, {a.errors} errors")
+
+    def close(self):
+        for a in self.accounts:
+            a.close()
@@ -0,0 +1,241 @@
+"""
+Vectorized backtests over the indicator columns stored in "StockPrice"
+
+A strategy turns indicator arrays into entry and exit masks for a whole
+parameter grid at once: every array has shape (bars, parameter sets), so a
+grid is evaluated with broadcasting instead of a per-bar or per-parameter
+loop. Positions follow from the masks with a forward fill, and PnL, drawdown,
+trade count and hit rate are reduced with cumulative sums and bincount.
+
+Signals are taken on a bar's close and filled on the next bar; every change
+of position pays `fee_bps + slippage_bps` per unit traded.
+"""
+
+import itertools
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from logzero import logger
+
+from .candles import get_candles
+from .config import connect
+
+Strategy = namedtuple("Strategy", "columns signals defaults")
+
+BARS_PER_YEAR = 375 * 252
+PARAMS_PER_BLOCK = 8    # parameter sets evaluated together; bounds memory on long histories
+METRICS = ("total_return", "annual_return", "sharpe", "max_drawdown", "trades", "hit_rate", "exposure")
+
+
+# -- strategies ---------------------------------------------------------------
+# Each takes {column: (bars, 1) array} and {param: (1, sets) array} and returns
+# boolean (bars, sets) entry and exit masks for a long position.
+
+def _rsi_reversion(c, p):
+    return c["rsi"] < p["lower"], c["rsi"] > p["upper"]
+
+
+def _stoch_reversion(c, p):
+    return c["stochK"] < p["lower"], c["stochK"] > p["upper"]
+
+
+def _bollinger_reversion(c, p):
+    # Enter below the lower band, exit once price is back `exit` of the way to the middle
+    target = c["bbLower"] + p["exit"] * (c["bbMiddle"] - c["bbLower"])
+    return c["close"] < c["bbLower"], c["close"] > target
+
+
+def _macd_cross(c, p):
+    spread = c["macdHistogram"]
+    return spread > p["threshold"], spread < -p["threshold"]
+
+
+def _adx_trend(c, p):
+    trending = (c["adx"] > p["adx"]) & (c["plusDI"] > c["minusDI"])
+    return trending, (c["adx"] < p["adx"] - p["hysteresis"]) | (c["plusDI"] < c["minusDI"])
+
+
+def _sma_trend(c, p):
+    # fast/slow pick among the stored 20/50/200 averages
+    averages = {20: c["sma20"], 50: c["sma50"], 200: c["sma200"]}
+    fast = np.select([p["fast"] == n for n in averages], list(averages.values()), np.nan)
+    slow = np.select([p["slow"] == n for n in averages], list(averages.values()), np.nan)
+    return fast > slow, fast < slow
+
+
+STRATEGIES = {
+    "rsi": Strategy(("rsi",), _rsi_reversion, {"lower": [25, 30], "upper": [70, 75]}),
+    "stoch": Strategy(("stochK",), _stoch_reversion, {"lower": [20], "upper": [80]}),
+    "bollinger": Strategy(("bbLower", "bbMiddle"), _bollinger_reversion, {"exit": [0.5, 1.0]}),
+    "macd": Strategy(("macdHistogram",), _macd_cross, {"threshold": [0.0]}),
+    "adx": Strategy(("adx", "plusDI", "minusDI"), _adx_trend, {"adx": [20, 25, 30], "hysteresis": [5]}),
+    "sma": Strategy(("sma20", "sma50", "sma200"), _sma_trend, {"fast": [20, 50], "slow": [50, 200]}),
+}
+
+
+def parameter_grid(params):
+    """Cartesian product of {name: values} as {name: array of sets}"""
+    names = list(params)
+    combos = list(itertools.product(*(params[name] for name in names)))
+    return {name: np.array([combo[i] for combo in combos], dtype=np.float64) for i, name in enumerate(names)}
+
+
+# -- data ---------------------------------------------------------------------
+
+def load_columns(conn, stock_id, columns, start=None, end=None):
+    """timestamp (datetime64[m]), close and `columns` for one stock as arrays (NULL -> NaN)"""
+    names = ("close",) + tuple(c for c in columns if c != "close")
+    return get_candles(None, start, end, "1m", names, conn=conn, stock_id=stock_id)
+
+
+# -- simulation -----------------------------------------------------------------
+
+def positions_from_signals(entries, exits):
+    """
+    Long/flat position per bar from entry and exit masks.
+
+    The latest event wins: a bar with an entry sets 1, an exit sets 0, and the
+    position is carried forward between events (exit takes precedence).
+    """
+    rows = np.arange(len(entries))[:, None]
+    event = entries | exits
+    last_event = np.where(event, rows, -1)
+    np.maximum.accumulate(last_event, axis=0, out=last_event)
+    cols = np.arange(entries.shape[1])
+    held = entries & ~exits
+    return np.where(last_event >= 0, held[np.maximum(last_event, 0), cols], False).astype(np.float64)
+
+
+def simulate(close, timestamps, entries, exits, fee_bps=3.0, slippage_bps=2.0, intraday=False):
+    """
+    Evaluate a (bars, sets) block of signals; returns {metric: (sets,) array}.
+
+    With `intraday`, positions are closed on each session's last bar and the
+    overnight move is never held.
+    """
+    position = positions_from_signals(entries, exits)
+    if intraday:
+        days = timestamps.astype("datetime64[D]")
+        last_bar = np.append(days[1:] != days[:-1], True)
+        position[last_bar] = 0.0
+
+    # Decided on bar t, held over bar t + 1
+    held = np.zeros_like(position)
+    held[1:] = position[:-1]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        bar_return = np.zeros(len(close))
+        bar_return[1:] = close[1:] / close[:-1] - 1.0
+    bar_return[~np.isfinite(bar_return)] = 0.0
+
+    turnover = np.abs(np.diff(held, axis=0, prepend=0.0))
+    cost = turnover * (fee_bps + slippage_bps) / 10_000
+    net = held * bar_return[:, None] - cost
+    log_net = np.log1p(net)
+
+    equity = np.cumsum(log_net, axis=0)
+    peak = np.maximum.accumulate(np.maximum(equity, 0.0), axis=0)
+    max_drawdown = 1.0 - np.exp((equity - peak).min(axis=0))
+
+    years = max(len(close) / BARS_PER_YEAR, 1e-9)
+    total = np.expm1(equity[-1])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sharpe = net.mean(axis=0) / net.std(axis=0) * np.sqrt(BARS_PER_YEAR)
+    annual = np.expm1(equity[-1] / years)
+
+    # Trades: runs of held == 1; pnl per trade summed with bincount
+    starts = (held > 0) & (np.diff(held, axis=0, prepend=0.0) > 0)
+    trade_ids = np.cumsum(starts, axis=0)
+    trades = trade_ids[-1].astype(np.int64)
+    offsets = np.concatenate(([0], np.cumsum(trades)[:-1]))
+    in_trade = (held > 0) | (cost > 0)
+    global_id = (trade_ids - 1 + offsets)[in_trade]
+    valid = trade_ids[in_trade] > 0
+    trade_pnl = np.bincount(global_id[valid], weights=log_net[in_trade][valid], minlength=trades.sum())
+    trade_column = np.repeat(np.arange(len(trades)), trades)
+    wins = np.bincount(trade_column, weights=trade_pnl > 0, minlength=len(trades))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        hit_rate = np.where(trades > 0, wins / trades, np.nan)
+
+    return {
+        "total_return": total,
+        "annual_return": annual,
+        "sharpe": np.nan_to_num(sharpe),
+        "max_drawdown": max_drawdown,
+        "trades": trades,
+        "hit_rate": hit_rate,
+        "exposure": held.mean(axis=0),
+    }
+
+
+def backtest(data, strategy, grid, fee_bps=3.0, slippage_bps=2.0, intraday=False):
+    """Run a strategy over a loaded history for every parameter set in `grid`"""
+    spec = STRATEGIES[strategy] if isinstance(strategy, str) else strategy
+    sets = len(next(iter(grid.values())))
+    columns = {name: data[name][:, None] for name in ("close",) + tuple(spec.columns)}
+    results = {metric: np.empty(sets) for metric in METRICS}
+
+    for lo in range(0, sets, PARAMS_PER_BLOCK):
+        block = {name: values[None, lo:lo + PARAMS_PER_BLOCK] for name, values in grid.items()}
+        with np.errstate(invalid="ignore"):
+            entries, exits = spec.signals(columns, block)
+        width = next(iter(block.values())).shape[1]
+        entries = np.broadcast_to(entries, (len(data["close"]), width))
+        exits = np.broadcast_to(exits, (len(data["close"]), width))
+        block_result = simulate(data["close"], data["timestamp"], entries, exits,
+                                fee_bps, slippage_bps, intraday)
+        for metric in METRICS:
+            results[metric][lo:lo + width] = block_result[metric]
+    return results
+
+
+def _backtest_stock(stock_id, symbol, strategy, grid, start, end, costs):
+    conn = connect()
+    try:
+        data = load_columns(conn, stock_id, STRATEGIES[strategy].columns, start, end)
+    finally:
+        conn.close()
+    if len(data["close"]) < 2:
+        return symbol, None
+    return symbol, backtest(data, strategy, grid, **costs)
+
+
+def run_backtests(conn, strategy, params=None, symbols=None, start=None, end=None, workers=4,
+                  fee_bps=3.0, slippage_bps=2.0, intraday=False):
+    """
+    Backtest a strategy grid across symbols, one process per symbol at a time.
+
+    Returns a list of dicts (symbol, parameters, metrics) for every
+    (symbol, parameter set) pair.
+    """
+    grid = parameter_grid(params or STRATEGIES[strategy].defaults)
+    sets = len(next(iter(grid.values())))
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT id, symbol FROM "Stock"
+            WHERE %s::text[] IS NULL OR symbol = ANY(%s::text[])
+            ORDER BY symbol
+        """, (symbols, symbols))
+        stocks = cur.fetchall()
+
+    logger.info(f"🧪 {strategy}: {sets} parameter sets x {len(stocks)} symbols on {workers} workers")
+    costs = {"fee_bps": fee_bps, "slippage_bps": slippage_bps, "intraday": intraday}
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(_backtest_stock, stock_id, symbol, strategy, grid, start, end, costs)
+            for stock_id, symbol in stocks
+        ]
+        for future in as_completed(futures):
+            symbol, results = future.result()
+            if results is None:
+                logger.warning(f"⚠️  {symbol}: not enough data")
+                continue
+            for i in range(sets):
+                rows.append({
+                    "symbol": symbol,
+                    **{name: values[i].item() for name, values in grid.items()},
+                    **{metric: results[metric][i].item() for metric in METRICS},
+                })
+    return rows
@@ -0,0 +1,139 @@
+"""
+On-disk cache for Angel One getCandleData responses
+
+Candles of a closed session never change, so responses whose window ends
+before the current session are stored gzip-compressed under
+
+    .cache/candles/<exchange>/<token>/<interval>/<from>_<to>.json.gz
+
+and served from disk on every later request for the same window. Windows that
+reach into the current session always go to the network.
+
+CachedCandleClient wraps a logged-in SmartConnect and forwards everything
+except getCandleData, so fetch scripts only change where the client is built.
+The CANDLE_CACHE environment variable selects the mode:
+
+    on (default)   read and write the cache
+    off            bypass it
+    offline        never call the API; misses return an empty error response
+"""
+
+import gzip
+import json
+import os
+from datetime import datetime, time, timedelta, timezone
+
+from logzero import logger
+
+from .config import PROJECT_ROOT, load_env
+
+IST = timezone(timedelta(hours=5, minutes=30))
+DEFAULT_ROOT = os.path.join(PROJECT_ROOT, ".cache", "candles")
+MODES = ("on", "off", "offline")
+
+SESSION_OPEN = time(9, 15)
+# Angel One occasionally revises the last candles shortly after the close
+SESSION_SETTLED = time(15, 45)
+GRID_ANCHOR = datetime(2000, 1, 1)
+
+
+def cache_mode():
+    load_env()
+    mode = os.getenv("CANDLE_CACHE", "on").lower()
+    if mode not in MODES:
+        raise ValueError(f"CANDLE_CACHE must be one of {', '.join(MODES)}, got {mode!r}")
+    return mode
+
+
+def closed_until(now=None):
+    """Latest naive IST time up to which every candle is final"""
+    now = (now or datetime.now(IST)).astimezone(IST).replace(tzinfo=None)
+    if now.weekday() < 5 and now.time() < SESSION_SETTLED:
+        return datetime.combine(now.date(), SESSION_OPEN)
+    return now
+
+
+def chunk_windows(start, end, days=30):
+    """
+    Split [start, end] into request windows of at most `days` days.
+
+    Boundaries sit on a fixed grid of `days`-day steps so that runs started at
+    different times ask for the same windows and hit the cache; only the first
+    and last window depend on the requested range.
+    """
+    step = timedelta(days=days)
+    boundary = GRID_ANCHOR + ((start - GRID_ANCHOR) // step + 1) * step
+    current = start
+    while current < end:
+        window_end = min(boundary, end)
+        yield current, window_end
+        current = window_end
+        boundary += step
+
+
+def is_closed_window(todate, now=None):
+    """True when a window ending at `todate` ("YYYY-MM-DD HH:MM", IST) cannot change any more"""
+    return datetime.strptime(todate, "%Y-%m-%d %H:%M") <= closed_until(now)
+
+
+class CachedCandleClient:
+    def __init__(self, client, root=DEFAULT_ROOT, mode=None):
+        self.client = client
+        self.root = root
+        self.mode = mode or cache_mode()
+        self.hits = 0
+        self.misses = 0
+        self.last_hit = False
+
+    def __getattr__(self, name):
+        # Everything but getCandleData goes straight to the wrapped SmartConnect
+        return getattr(self.client, name)
+
+    def cache_path(self, params):
+        window = f"{params['fromdate']}_{params['todate']}".replace(" ", "T").replace(":", "")
+        return os.path.join(
+            self.root, params.get("exchange", "NSE"), str(params["symboltoken"]),
+            params["interval"], f"{window}.json.gz",
+        )
+
+    def _read(self, path):
+        try:
+            with gzip.open(path, "rt") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, path, response):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".part"
+        with gzip.open(tmp, "wt") as f:
+            json.dump(response, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    def getCandleData(self, params):
+        self.last_hit = False
+        if self.mode == "off":
+            return self.client.getCandleData(params)
+
+        path = self.cache_path(params)
+        cached = self._read(path) if os.path.exists(path) else None
+        if cached is not None:
+            self.hits += 1
+            self.last_hit = True
+            return cached
+
+        self.misses += 1
+        if self.mode == "offline":
+            logger.warning(f"⚠️  Candle cache miss in offline mode: {path}")
+            return {"status": False, "message": "Not in candle cache (offline)", "errorcode": "CACHE_MISS", "data": None}
+
+        response = self.client.getCandleData(params)
+        # Only successful responses for settled windows are final; empty data
+        # for a closed window (holidays) is worth remembering too
+        if isinstance(response, dict) and response.get("status") and is_closed_window(params["todate"]):
+            self._write(path, response)
+        return response
+
+    def log_stats(self):
+        if self.mode != "off":
+            logger.info(f"📦 Candle cache: {self.hits} hits, {self.misses} misses ({self.mode})")
@@ -0,0 +1,316 @@
+"""
+Shared candle read path with an in-process LRU cache
+
+    from istocks.candles import get_candles
+    bars = get_candles("WIPRO", datetime(2025, 1, 1), datetime(2025, 4, 1), "15m", ("close", "rsi"))
+    bars["timestamp"], bars["close"], bars["rsi"]      # NumPy arrays
+
+Minute candles are cached per stock as contiguous segments of column
+arrays. A request inside a cached segment is answered with slices of those
+arrays (views - no copy, no query); a request that overlaps a segment only
+queries the missing edges and extends it. Cached arrays are read-only, so
+callers that modify results must copy them first.
+
+The cache is bounded by the bytes of its arrays (CANDLE_LRU_MB, default 512)
+and evicts least recently used segments. Segments that reach past the time
+they were loaded expire after `ttl` seconds, so new candles show up; older
+ones after `history_ttl` seconds, so corrections and recomputed indicators
+written by other processes show up too. Writers in this process call
+invalidate_stock() so their own changes are visible at once.
+"""
+
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from .config import connect, load_env
+
+OHLCV = ("open", "high", "low", "close", "volume")
+INTEGER_COLUMNS = ("volume",)
+
+# timeframe -> bucket width in minutes (None = one bar per session)
+TIMEFRAMES = {"1m": 1, "5m": 5, "15m": 15, "30m": 30, "1h": 60, "1d": None}
+SESSION_OPEN_MINUTE = 9 * 60 + 15
+EARLIEST = datetime(1970, 1, 1)
+
+
+def _aggregate(column):
+    if column == "open":
+        return "first"
+    if column == "high":
+        return "max"
+    if column == "low":
+        return "min"
+    if column == "volume":
+        return "sum"
+    return "last"     # close and indicator columns
+
+
+def resample(bars, timeframe):
+    """
+    Aggregate minute bars into `timeframe` bars aligned to the 09:15 session open.
+
+    Buckets never span two sessions. Returns new arrays keyed like `bars`;
+    "timestamp" is the first minute of each bucket.
+    """
+    width = TIMEFRAMES[timeframe]
+    if width == 1 or len(bars["timestamp"]) == 0:
+        return bars
+    minutes = bars["timestamp"].astype("datetime64[m]")
+    days = minutes.astype("datetime64[D]")
+    if width is None:
+        keys = days.astype(np.int64)
+    else:
+        offset = (minutes - days).astype(np.int64) - SESSION_OPEN_MINUTE
+        keys = days.astype(np.int64) * 1440 + offset // width
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.append(starts[1:], len(keys)) - 1
+
+    out = {"timestamp": minutes[starts]}
+    for column, values in bars.items():
+        if column == "timestamp":
+            continue
+        how = _aggregate(column)
+        if how == "first":
+            out[column] = values[starts]
+        elif how == "last":
+            out[column] = values[ends]
+        elif how == "max":
+            out[column] = np.fmax.reduceat(values, starts)
+        elif how == "min":
+            out[column] = np.fmin.reduceat(values, starts)
+        else:
+            out[column] = np.add.reduceat(values, starts)
+    return out
+
+
+def query_candles(conn, stock_id, start, end, columns):
+    """Minute candles in [start, end) as {"timestamp": datetime64[m], column: array}"""
+    import pandas as pd
+
+    names = ["timestamp"] + list(columns)
+    select = ", ".join(f'"{c}"' for c in names)
+    buffer = io.StringIO()
+    # Only end the transaction if this read opened it; a caller's open
+    # transaction, uncommitted writes included, is left as it was
+    opened = conn.get_transaction_status() == TRANSACTION_STATUS_IDLE
+    with conn.cursor() as cur:
+        query = cur.mogrify(f"""
+            SELECT {select} FROM "StockPrice"
+            WHERE "stockId" = %s AND timestamp >= %s AND timestamp < %s
+            ORDER BY timestamp
+        """, (stock_id, start, end)).decode()
+        cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv)", buffer)
+    if opened:
+        conn.rollback()
+    buffer.seek(0)
+
+    dtypes = {c: (np.int64 if c in INTEGER_COLUMNS else np.float64) for c in columns}
+    frame = pd.read_csv(buffer, header=None, names=names, dtype=dtypes, parse_dates=["timestamp"])
+    bars = {"timestamp": frame["timestamp"].to_numpy().astype("datetime64[m]")}
+    for column in columns:
+        bars[column] = frame[column].to_numpy()
+    return bars
+
+
+class _Segment:
+    __slots__ = ("stock_id", "start", "end", "columns", "bars", "expires", "nbytes")
+
+    def __init__(self, stock_id, start, end, columns, bars, expires):
+        self.stock_id = stock_id
+        self.start = start
+        self.end = end
+        self.columns = frozenset(columns)
+        self.bars = bars
+        self.expires = expires
+        self.nbytes = sum(values.nbytes for values in bars.values())
+        for values in bars.values():
+            values.flags.writeable = False
+
+    def covers(self, start, end, columns):
+        return self.start <= start and end <= self.end and self.columns.issuperset(columns)
+
+    def slice(self, start, end, columns):
+        timestamps = self.bars["timestamp"]
+        lo = np.searchsorted(timestamps, np.datetime64(start, "m"), side="left")
+        hi = np.searchsorted(timestamps, np.datetime64(end, "m"), side="left")
+        return {"timestamp": timestamps[lo:hi], **{c: self.bars[c][lo:hi] for c in columns}}
+
+
+class CandleCache:
+    def __init__(self, max_bytes=None, ttl=60, history_ttl=600):
+        if max_bytes is None:
+            load_env()
+            max_bytes = int(float(os.getenv("CANDLE_LRU_MB", "512")) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.history_ttl = history_ttl
+        self._segments = OrderedDict()      # id(segment) -> segment, least recent first
+        self._stock_ids = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+
+    # -- bookkeeping ---------------------------------------------------------
+
+    def _add(self, segment):
+        self._segments[id(segment)] = segment
+        self.bytes += segment.nbytes
+        while self.bytes > self.max_bytes and len(self._segments) > 1:
+            _, evicted = self._segments.popitem(last=False)
+            self.bytes -= evicted.nbytes
+
+    def _remove(self, segment):
+        if self._segments.pop(id(segment), None) is not None:
+            self.bytes -= segment.nbytes
+
+    def _candidates(self, stock_id):
+        now = time.monotonic()
+        for segment in list(self._segments.values()):
+            if segment.expires < now:
+                self._remove(segment)
+            elif segment.stock_id == stock_id:
+                yield segment
+
+    def clear(self):
+        with self._lock:
+            self._segments.clear()
+            self.bytes = 0
+
+    def invalidate(self, stock_id):
+        """Drop every cached segment of a stock, e.g. after writing its rows"""
+        with self._lock:
+            for segment in list(self._segments.values()):
+                if segment.stock_id == stock_id:
+                    self._remove(segment)
+
+    def stats(self):
+        return {
+            "segments": len(self._segments),
+            "bytes": self.bytes,
+            "maxBytes": self.max_bytes,
+            "hits": self.hits,
+            "partialHits": self.partial_hits,
+            "misses": self.misses,
+        }
+
+    # -- lookups -------------------------------------------------------------
+
+    def stock_id(self, conn, symbol):
+        if symbol not in self._stock_ids:
+            with conn.cursor() as cur:
+                cur.execute('SELECT id FROM "Stock" WHERE symbol = %s', (symbol,))
+                row = cur.fetchone()
+            if row is None:
+                raise KeyError(f"Unknown symbol: {symbol}")
+            self._stock_ids[symbol] = row[0]
+        return self._stock_ids[symbol]
+
+    def _expiry(self, end):
+        live = end > datetime.now() - timedelta(minutes=1)
+        return time.monotonic() + (self.ttl if live else self.history_ttl)
+
+    def minute_bars(self, conn, stock_id, start, end, columns):
+        """Minute bars for [start, end) from the cache, querying only what is missing"""
+        with self._lock:
+            for segment in self._candidates(stock_id):
+                if segment.covers(start, end, columns):
+                    self._segments.move_to_end(id(segment))
+                    self.hits += 1
+                    return segment.slice(start, end, columns)
+            # A segment that overlaps or touches the request can be extended
+            base = next((
+                s for s in self._candidates(stock_id)
+                if s.columns.issuperset(columns) and s.start <= end and start <= s.end
+            ), None)
+
+        if base is None:
+            self.misses += 1
+            bars = query_candles(conn, stock_id, start, end, columns)
+            segment = _Segment(stock_id, start, end, columns, bars, self._expiry(end))
+        else:
+            self.partial_hits += 1
+            fetch_columns = sorted(base.columns)
+            parts = []
+            if start < base.start:
+                parts.append(query_candles(conn, stock_id, start, base.start, fetch_columns))
+            parts.append(base.bars)
+            if end > base.end:
+                parts.append(query_candles(conn, stock_id, base.end, end, fetch_columns))
+            bars = {key: np.concatenate([part[key] for part in parts]) for key in base.bars}
+            new_end = max(end, base.end)
+            # The kept part is no fresher than when it was loaded
+            expires = min(self._expiry(new_end), base.expires)
+            segment = _Segment(stock_id, min(start, base.start), new_end, fetch_columns, bars, expires)
+
+        with self._lock:
+            if base is not None:
+                self._remove(base)
+            self._add(segment)
+        return segment.slice(start, end, columns)
+
+    def get(self, symbol, start=None, end=None, timeframe="1m", columns=OHLCV, conn=None,
+            stock_id=None, as_arrow=False):
+        if timeframe not in TIMEFRAMES:
+            raise ValueError(f"timeframe must be one of {', '.join(TIMEFRAMES)}")
+        start = start or EARLIEST
+        end = end or (datetime.now() + timedelta(minutes=1)).replace(second=0, microsecond=0)
+        columns = tuple(columns)
+
+        own_conn = conn is None
+        conn = conn or connect()
+        try:
+            if stock_id is None:
+                stock_id = self.stock_id(conn, symbol)
+            bars = self.minute_bars(conn, stock_id, start, end, columns)
+        finally:
+            if own_conn:
+                conn.close()
+
+        bars = resample(bars, timeframe)
+        if as_arrow:
+            import pyarrow as pa
+
+            # Arrow has no minute unit; the timestamp column is the only copy
+            return pa.table({
+                key: values.astype("datetime64[s]") if key == "timestamp" else values
+                for key, values in bars.items()
+            })
+        return bars
+
+
+_default_cache = None
+
+
+def default_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = CandleCache()
+    return _default_cache
+
+
+def invalidate_stock(stock_id):
+    """Forget cached candles of a stock whose rows were just written"""
+    if _default_cache is not None:
+        _default_cache.invalidate(stock_id)
+
+
+def get_candles(symbol, start=None, end=None, timeframe="1m", columns=OHLCV, conn=None,
+                stock_id=None, as_arrow=False):
+    """
+    Candles of `symbol` in [start, end) as {"timestamp": datetime64[m], column: array}.
+
+    `timeframe` is one of 1m, 5m, 15m, 30m, 1h, 1d. Volume is int64, every
+    other column float64 with NaN for NULL. Pass `conn` to reuse a
+    connection (one is opened per cache miss otherwise) and `stock_id` to
+    skip the symbol lookup. With `as_arrow` a pyarrow.Table is returned.
+    """
+    return default_cache().get(symbol, start, end, timeframe, columns, conn, stock_id, as_arrow)
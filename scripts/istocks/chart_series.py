@@ -0,0 +1,231 @@
+"""
+Precomputed, downsampled chart series ("ChartSeries")
+
+For every stock, chart timeframe, point budget and method we keep a series
+of at most `budget` points so that a chart request is a single constant-size
+row read no matter how much minute history is stored. Buckets have a fixed
+width in trading minutes on the session clock of istocks.downsample, so a
+refresh only re-reads candles from the last cached bucket onwards and splices
+them onto the stored series.
+"""
+
+import json
+import math
+from datetime import datetime
+
+import numpy as np
+from logzero import logger
+from psycopg2.extras import execute_values
+
+from .downsample import SESSION_MINUTES, lttb_buckets, ohlc_buckets, session_day_start, session_positions, to_minutes
+from .insights import TIMEFRAMES
+
+POINT_BUDGETS = (500, 1000, 2000)
+METHODS = ("lttb", "ohlc")
+BUCKETING = "session"   # stored with each series; others are rebuilt rather than spliced
+
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS "ChartSeries" (
+        "stockId" TEXT NOT NULL,
+        timeframe TEXT NOT NULL,
+        points INTEGER NOT NULL,
+        method TEXT NOT NULL,
+        "bucketMinutes" INTEGER NOT NULL,
+        "fromTime" TIMESTAMP(3) NOT NULL,
+        "toTime" TIMESTAMP(3) NOT NULL,
+        data JSONB NOT NULL,
+        "generatedAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        CONSTRAINT "ChartSeries_pkey" PRIMARY KEY ("stockId", timeframe, points, method),
+        CONSTRAINT "ChartSeries_stockId_fkey" FOREIGN KEY ("stockId")
+            REFERENCES "Stock"(id) ON DELETE CASCADE ON UPDATE CASCADE
+    )
+"""
+
+
+def ensure_table(conn):
+    with conn.cursor() as cur:
+        cur.execute(CREATE_TABLE)
+    conn.commit()
+
+
+def bucket_minutes(timeframe, points):
+    """Bucket width in trading minutes so that a full timeframe fits in `points` buckets"""
+    span = TIMEFRAMES[timeframe]
+    if span is None:
+        return max(1, math.ceil(SESSION_MINUTES / points))
+    # Weekdays a window of `span` can touch; one bucket is kept for the
+    # partial one at the window start
+    weeks, rest = divmod(span.days, 7)
+    days = 5 * weeks + min(rest + 1, 5)
+    return max(1, math.ceil(days * SESSION_MINUTES / (points - 1)))
+
+
+def window_start(timeframe, latest):
+    """First minute of a timeframe anchored at the latest candle (minutes since epoch)"""
+    span = TIMEFRAMES[timeframe]
+    if span is None:
+        return int(latest // 1440 * 1440)
+    return int(latest - span.total_seconds() // 60)
+
+
+def _series_from_json(data):
+    series = {key: np.asarray(values) for key, values in data.items() if key != "bucketing"}
+    series["t"] = to_minutes(np.asarray(data["t"], dtype="datetime64[m]"))
+    return series
+
+
+def _series_to_json(series):
+    data = {key: values.tolist() for key, values in series.items() if key not in ("t", "bucket")}
+    data["t"] = np.datetime_as_string(series["t"].astype("datetime64[m]"), unit="s").tolist()
+    data["bucketing"] = BUCKETING
+    return data
+
+
+def _load_cached(conn, stock_id):
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT timeframe, points, method, "bucketMinutes", data
+            FROM "ChartSeries" WHERE "stockId" = %s
+        """, (stock_id,))
+        return {(tf, points, method): (width, data) for tf, points, method, width, data in cur.fetchall()}
+
+
+def _resume_position(series, width, method):
+    """Session position from which buckets must be recomputed for an existing series"""
+    if len(series["t"]) == 0:
+        return None
+    # LTTB's choice in bucket k-1 depends on bucket k's mean, so redo both
+    back = 2 if method == "lttb" and len(series["t"]) > 1 else 1
+    return int(session_positions(series["t"][-back:][:1])[0] // width * width)
+
+
+def _load_candles(conn, stock_id, since):
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT timestamp, open, high, low, close, volume
+            FROM "StockPrice"
+            WHERE "stockId" = %s AND timestamp >= %s
+            ORDER BY timestamp ASC
+        """, (stock_id, since))
+        rows = cur.fetchall()
+    if not rows:
+        return None
+    timestamps, open_, high, low, close, volume = zip(*rows)
+    return (
+        to_minutes(np.array(timestamps, dtype="datetime64[m]")),
+        np.array(open_, dtype=np.float64),
+        np.array(high, dtype=np.float64),
+        np.array(low, dtype=np.float64),
+        np.array(close, dtype=np.float64),
+        np.array(volume, dtype=np.int64),
+    )
+
+
+def _build(candles, positions, since, width, method, anchor=None):
+    minutes, open_, high, low, close, volume = candles
+    start = int(np.searchsorted(positions, since, side="left"))
+    if method == "ohlc":
+        return ohlc_buckets(minutes[start:], open_[start:], high[start:], low[start:],
+                            close[start:], volume[start:], width)
+    return lttb_buckets(minutes[start:], close[start:], width, anchor)
+
+
+def plan_series(timeframe, points, method, latest_minute, cached=None):
+    """
+    (width, window start minute, cached series or None, resume position) for
+    one series; `cached` is its stored ("bucketMinutes", data) if any
+    """
+    start = window_start(timeframe, latest_minute)
+    width = bucket_minutes(timeframe, points)
+    resume = int(session_positions([start])[0])
+    series = None
+    if cached and cached[0] == width and cached[1].get("bucketing") == BUCKETING:
+        series = _series_from_json(cached[1])
+        resume = max(_resume_position(series, width, method) or resume, resume)
+    return width, start, series, resume
+
+
+def build_series(candles, positions, method, width, start, series, resume):
+    """Splice buckets from `resume` onto the cached `series`; returns the series inside the window"""
+    anchor = None
+    if series is not None:
+        keep = session_positions(series["t"]) < resume
+        if method == "lttb" and keep.any():
+            last = np.flatnonzero(keep)[-1]
+            anchor = (series["t"][last], series["c"][last])
+        head = {key: column[keep] for key, column in series.items()}
+    fresh = _build(candles, positions, resume, width, method, anchor)
+    fresh.pop("bucket")
+    merged = fresh if series is None else {key: np.concatenate([head[key], fresh[key]]) for key in fresh}
+    inside = merged["t"] >= start
+    return {key: column[inside] for key, column in merged.items()}
+
+
+def refresh_stock(conn, stock_id, symbol, rebuild=False):
+    """Bring every cached series of one stock up to date; returns rows written"""
+    with conn.cursor() as cur:
+        cur.execute('SELECT MAX(timestamp) FROM "StockPrice" WHERE "stockId" = %s', (stock_id,))
+        latest = cur.fetchone()[0]
+    if latest is None:
+        return 0
+    latest_minute = int(to_minutes(np.array([latest], dtype="datetime64[m]"))[0])
+
+    cached = {} if rebuild else _load_cached(conn, stock_id)
+    plans = [(timeframe, points, method) + plan_series(timeframe, points, method, latest_minute,
+                                                       cached.get((timeframe, points, method)))
+             for timeframe in TIMEFRAMES for points in POINT_BUDGETS for method in METHODS]
+
+    # One read covering the oldest minute any series needs
+    since = min(session_day_start(plan[-1]) for plan in plans)
+    candles = _load_candles(conn, stock_id, np.datetime64(since, "m").astype(datetime))
+    if candles is None:
+        return 0
+    positions = session_positions(candles[0])
+
+    rows = []
+    now = datetime.now()
+    for timeframe, points, method, width, start, series, resume in plans:
+        merged = build_series(candles, positions, method, width, start, series, resume)
+        if len(merged["t"]) == 0:
+            continue
+
+        rows.append((
+            stock_id, timeframe, points, method, width,
+            np.datetime64(int(merged["t"][0]), "m").astype(datetime),
+            latest,
+            json.dumps(_series_to_json(merged)),
+            now,
+        ))
+
+    with conn.cursor() as cur:
+        execute_values(cur, """
+            INSERT INTO "ChartSeries"
+            ("stockId", timeframe, points, method, "bucketMinutes", "fromTime", "toTime", data, "generatedAt")
+            VALUES %s
+            ON CONFLICT ("stockId", timeframe, points, method) DO UPDATE SET
+                "bucketMinutes" = EXCLUDED."bucketMinutes",
+                "fromTime" = EXCLUDED."fromTime",
+                "toTime" = EXCLUDED."toTime",
+                data = EXCLUDED.data,
+                "generatedAt" = EXCLUDED."generatedAt"
+        """, rows, page_size=len(rows) or 1)
+    conn.commit()
+
+    logger.info(f"✅ {symbol}: refreshed {len(rows)} chart series from {len(candles[0])} candles")
+    return len(rows)
+
+
+def refresh_chart_series(conn, symbols=None, rebuild=False):
+    """Refresh chart series for the given symbols (default: all stocks)"""
+    ensure_table(conn)
+    with conn.cursor() as cur:
+        if symbols:
+            cur.execute('SELECT id, symbol FROM "Stock" WHERE symbol = ANY(%s) ORDER BY symbol', (list(symbols),))
+        else:
+            cur.execute('SELECT id, symbol FROM "Stock" ORDER BY symbol')
+        stocks = cur.fetchall()
+
+    written = 0
+    for stock_id, symbol in stocks:
+        written += refresh_stock(conn, stock_id, symbol, rebuild)
+    return written
@@ -0,0 +1,94 @@
+"""
+Self-check of istocks.chart_series on a synthetic year of sessions
+
+    cd scripts && python3 -m istocks.chart_series_check
+
+Builds every timeframe, point budget and method over 13 months of 1-minute
+candles (weekday sessions with holidays and a few stray out-of-session
+ticks) and checks that no series exceeds its point budget. Then refreshes
+OHLC series cached a few days earlier, as refresh_stock does, and checks
+they match a full rebuild from the first whole bucket on (the partial
+bucket at the window start is cut differently as the window slides; LTTB
+picks depend on the previous pick, so spliced LTTB series follow their
+cached picks instead). Exits non-zero on failure.
+"""
+
+import json
+import sys
+
+import numpy as np
+
+from .chart_series import METHODS, POINT_BUDGETS, TIMEFRAMES, _series_to_json, build_series, plan_series
+from .downsample import session_positions, to_minutes
+from .validation import SESSION_CLOSE, SESSION_OPEN
+
+
+def synthetic_candles(days=400, seed=11):
+    """(minutes, open, high, low, close, volume) for the weekdays of `days` calendar days"""
+    rng = np.random.default_rng(seed)
+    dates = np.arange(np.datetime64("2024-09-02"), np.datetime64("2024-09-02") + days)
+    dates = dates[np.is_busday(dates)]
+    dates = dates[rng.random(len(dates)) > 0.04]           # exchange holidays
+    session = np.arange(SESSION_OPEN, SESSION_CLOSE + 1)
+    minutes = (to_minutes(dates.astype("datetime64[m]"))[:, None] + session).ravel()
+    # Stray ticks before the open and after the close
+    stray = rng.choice(len(dates), 10, replace=False)
+    extra = to_minutes(dates[stray].astype("datetime64[m]")) + np.where(stray % 2, 9 * 60, 16 * 60)
+    minutes = np.sort(np.concatenate([minutes, extra]))
+    close = 500 * np.exp(np.cumsum(rng.normal(0, 0.0005, len(minutes))))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * 1.0002
+    low = np.minimum(open_, close) * 0.9998
+    volume = rng.integers(1_000, 50_000, len(minutes))
+    return minutes, open_, high, low, close, volume
+
+
+def series_of(candles, timeframe, points, method, cached=None):
+    """What refresh_stock stores for candles up to the last one; returns (series, JSON data)"""
+    plan = plan_series(timeframe, points, method, int(candles[0][-1]), cached)
+    series = build_series(candles, session_positions(candles[0]), method, *plan)
+    return series, json.loads(json.dumps(_series_to_json(series)))
+
+
+def whole_buckets(data, first):
+    """`data` from the point at minute `first` on"""
+    t = to_minutes(np.array(data["t"], dtype="datetime64[m]"))
+    keep = t >= first
+    return {key: np.asarray(values)[keep].tolist() for key, values in data.items() if key != "bucketing"}
+
+
+def run():
+    failures = []
+    candles = synthetic_candles()
+    # Cached three sessions before the last candle
+    earlier = tuple(column[:-3 * 375] for column in candles)
+    checked = 0
+    for timeframe in TIMEFRAMES:
+        for points in POINT_BUDGETS:
+            for method in METHODS:
+                name = f"{timeframe}/{points}/{method}"
+                full, data = series_of(candles, timeframe, points, method)
+                if len(full["t"]) > points:
+                    failures.append(f"{name}: {len(full['t'])} points")
+                if np.any(np.diff(full["t"]) <= 0):
+                    failures.append(f"{name}: timestamps not increasing")
+
+                checked += 1
+                if method != "ohlc" or len(full["t"]) < 2:
+                    continue
+                width = plan_series(timeframe, points, method, int(earlier[0][-1]))[0]
+                _, cached = series_of(earlier, timeframe, points, method)
+                _, refreshed = series_of(candles, timeframe, points, method, (width, cached))
+                if whole_buckets(refreshed, full["t"][1]) != whole_buckets(data, full["t"][1]):
+                    failures.append(f"{name}: refreshed series differs from a full rebuild")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print(f"✅ chart series: {checked} series within their point budgets, "
+              f"incremental OHLC refreshes match full rebuilds")
+    return not failures
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run() else 1)
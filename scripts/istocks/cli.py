@@ -0,0 +1,132 @@
+"""
+`istocks` command line: one entry point for the pipeline scripts
+
+Subcommands map either to a small built-in (status, gaps) or to one of the
+scripts in scripts/, which is only loaded when its subcommand runs. Nothing
+here imports NumPy, pandas, ta, SmartApi or requests, so `istocks status`
+costs a psycopg2 import and one round trip instead of the whole stack.
+"""
+
+import argparse
+import os
+import runpy
+import sys
+from datetime import datetime, timedelta
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# subcommand -> (script in scripts/, help)
+SCRIPT_COMMANDS = {
+    "fetch": ("auto-fetch-stock-data.py", "Fetch new candles and re-fetch the trailing window, writing only changes"),
+    "backfill": ("fetch-worker.py", "Queue and run historical fetch jobs (enqueue/work/status/retry)"),
+    "indicators": ("calculate-indicators.py", "Recalculate stored technical indicators"),
+    "insights": ("generate-insights.py", "Regenerate StockInsight rows"),
+    "chart-series": ("build-chart-series.py", "Refresh the downsampled chart cache"),
+    "partitions": ("manage-partitions.py", "Inspect, migrate or extend StockPrice partitions"),
+    "export": ("export-prices.py", "Export prices per symbol and month"),
+    "import": ("import-prices.py", "Import JSON/CSV/Parquet/SQL price dumps"),
+    "correlations": ("compute-correlations.py", "Store cross-symbol correlation matrices"),
+    "backtest": ("backtest.py", "Backtest indicator strategies"),
+    "sweep": ("sweep-indicators.py", "Compute indicator families over many windows"),
+    "mirror": ("analytics-mirror.py", "Sync or query the local DuckDB analytics mirror"),
+    "alerts": ("evaluate-alerts.py", "Evaluate alert rules on the latest candles"),
+    "screen": ("screen-stocks.py", "Filter stocks on their latest indicators"),
+    "pipeline": ("run-pipeline.py", "Fetch, validate, indicators and insights per symbol, pipelined"),
+    "features": ("build-features.py", "Append ML feature columns to the memory-mapped feature store"),
+    "replay": ("replay-market.py", "Replay stored candles through the live ingest path at speed"),
+    "tier": ("tier-prices.py", "Roll up, archive and restore minute bars outside the hot horizon"),
+}
+
+
+def run_script(name, args):
+    """Run scripts/<name> as __main__ with `args` as its command line"""
+    path = os.path.join(SCRIPTS_DIR, name)
+    if SCRIPTS_DIR not in sys.path:
+        sys.path.insert(0, SCRIPTS_DIR)
+    sys.argv = [path] + list(args)
+    runpy.run_path(path, run_name="__main__")
+
+
+def status(args):
+    from .config import connect
+    from .status import latest_candles, quarantine_counts, queue_counts
+
+    now = datetime.now()
+    conn = connect()
+    try:
+        latest = latest_candles(conn, args.symbols or None)
+        quarantined = quarantine_counts(conn, now - timedelta(days=1))
+        queue = queue_counts(conn)
+    finally:
+        conn.close()
+
+    print(f"{'symbol':<14} {'latest candle':<20} {'age':>10} {'quarantined 24h':>16}")
+    for symbol, timestamp in latest:
+        if timestamp is None:
+            print(f"{symbol:<14} {'-':<20} {'-':>10} {quarantined.get(symbol, 0):>16}")
+            continue
+        age = now - timestamp
+        age_text = f"{age.days}d" if age.days else f"{age.seconds // 3600}h{age.seconds % 3600 // 60:02d}m"
+        print(f"{symbol:<14} {timestamp:%Y-%m-%d %H:%M}     {age_text:>10} {quarantined.get(symbol, 0):>16}")
+    if queue:
+        print("\nfetch queue: " + ", ".join(f"{state} {count}" for state, count in sorted(queue.items())))
+
+
+def gaps(args):
+    from .config import connect
+    from .status import session_gaps
+
+    conn = connect()
+    try:
+        rows = session_gaps(conn, args.symbols or None, args.days, args.min_bars)
+    finally:
+        conn.close()
+    if not rows:
+        print(f"✅ No sessions with fewer than {args.min_bars} candles in the last {args.days} days")
+        return
+    print(f"{'symbol':<14} {'session':<12} {'bars':>6} {'missing':>8}")
+    for symbol, day, bars in rows:
+        print(f"{symbol:<14} {day:%Y-%m-%d}   {bars:>6} {args.min_bars - bars:>8}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="istocks",
+        description="iStocks data pipeline",
+        epilog="Run `istocks <command> --help` for a command's own options.",
+    )
+    sub = parser.add_subparsers(dest="command", metavar="command")
+
+    p = sub.add_parser("status", help="Latest candle per stock, quarantine and queue counts")
+    p.add_argument("symbols", nargs="*")
+    p.set_defaults(func=status)
+
+    p = sub.add_parser("gaps", help="Sessions with missing candles")
+    p.add_argument("symbols", nargs="*")
+    p.add_argument("--days", type=int, default=30)
+    p.add_argument("--min-bars", type=int, default=375)
+    p.set_defaults(func=gaps)
+
+    # Script-backed commands: listed here for --help, parsed by the script itself
+    for name, (_, help_text) in SCRIPT_COMMANDS.items():
+        sub.add_parser(name, help=help_text, add_help=False)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in SCRIPT_COMMANDS:
+        run_script(SCRIPT_COMMANDS[argv[0]][0], argv[1:])
+        return
+
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return
+    args.symbols = [s.upper() for s in args.symbols]
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
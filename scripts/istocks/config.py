@@ -0,0 +1,65 @@
+"""
+Environment and database configuration shared by the pipeline scripts
+"""
+
+import os
+import threading
+
+# psycopg2 and dotenv are imported on first use so that `istocks --help` and
+# other commands that never touch the database start instantly
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_DATABASE_URL = "postgresql://priyanshu@localhost:5432/stock_analysis"
+
+_env_loaded = False
+
+
+def load_env():
+    """Load .env.local and .env from the project root (first one wins per key)"""
+    global _env_loaded
+    if _env_loaded:
+        return
+    from dotenv import load_dotenv
+
+    for name in ('.env.local', '.env'):
+        path = os.path.join(PROJECT_ROOT, name)
+        if os.path.exists(path):
+            load_dotenv(path)
+    _env_loaded = True
+
+
+def get_database_url():
+    """Return DATABASE_URL with the unencoded '@' in the password fixed up"""
+    load_env()
+    url = os.getenv("DATABASE_URL") or DEFAULT_DATABASE_URL
+    if "priyanshu@123" in url:
+        url = url.replace("priyanshu@123", "priyanshu%40123")
+    return url
+
+
+def connect():
+    """Open a new psycopg2 connection to the configured database"""
+    import psycopg2
+
+    return psycopg2.connect(get_database_url())
+
+
+class ThreadConnections:
+    """One connection per thread, opened on first use; close() closes them all"""
+
+    def __init__(self):
+        self.local = threading.local()
+        self.opened = []
+        self.lock = threading.Lock()
+
+    def get(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None or conn.closed:
+            conn = self.local.conn = connect()
+            with self.lock:
+                self.opened.append(conn)
+        return conn
+
+    def close(self):
+        for conn in self.opened:
+            conn.close()
@@ -0,0 +1,357 @@
+"""
+Cross-symbol returns, correlation, covariance and beta
+
+Closes for many symbols are loaded onto one shared minute or day grid as a
+(bars x symbols) array; missing bars stay NaN. Every statistic is computed for
+all symbols (or all pairs) at once:
+
+- pairwise correlation / covariance use only the bars both symbols traded,
+  via three matrix products instead of a loop over pairs
+- rolling beta and correlation against a benchmark come from cumulative sums,
+  so any window length costs the same
+
+Results for a (frequency, range, universe) key are stored in
+"CorrelationMatrix"; compute_correlations() reuses a stored result when the
+same key is requested again.
+"""
+
+import hashlib
+import io
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+from logzero import logger
+
+FREQUENCIES = ("minute", "day")
+
+# Batch job windows, anchored at the latest candle; short windows use minute bars
+WINDOWS = {
+    "1m": (timedelta(days=30), "minute"),
+    "3m": (timedelta(days=90), "day"),
+    "6m": (timedelta(days=180), "day"),
+    "1y": (timedelta(days=365), "day"),
+}
+ROLLING_BARS = {"minute": 375, "day": 20}     # one session / one trading month
+BARS_PER_YEAR = {"minute": 375 * 252, "day": 252}
+MIN_OBSERVATIONS = 10
+
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS "CorrelationMatrix" (
+        id TEXT NOT NULL,
+        "window" TEXT,
+        frequency TEXT NOT NULL,
+        "fromTime" TIMESTAMP(3) NOT NULL,
+        "toTime" TIMESTAMP(3) NOT NULL,
+        symbols JSONB NOT NULL,
+        correlation JSONB NOT NULL,
+        covariance JSONB NOT NULL,
+        stats JSONB NOT NULL,
+        "generatedAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        CONSTRAINT "CorrelationMatrix_pkey" PRIMARY KEY (id)
+    );
+    CREATE INDEX IF NOT EXISTS "CorrelationMatrix_window_generatedAt_idx"
+        ON "CorrelationMatrix" ("window", "generatedAt");
+"""
+
+
+def ensure_table(conn):
+    with conn.cursor() as cur:
+        cur.execute(CREATE_TABLE)
+    conn.commit()
+
+
+def load_stocks(conn, symbols=None):
+    """[(stock id, symbol)] ordered by symbol"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT id, symbol FROM "Stock"
+            WHERE %s::text[] IS NULL OR symbol = ANY(%s::text[])
+            ORDER BY symbol
+        """, (symbols, symbols))
+        return cur.fetchall()
+
+
+def load_closes(conn, stock_ids, start, end, frequency="day"):
+    """
+    Closes of `stock_ids` on a shared grid for [start, end).
+
+    Returns (grid, closes) where grid is datetime64[m] or datetime64[D] and
+    closes has one column per stock (NaN where a stock has no bar). Day bars
+    use the last close of the day. The rows are streamed with COPY and parsed
+    by pandas, which keeps hundreds of symbols x a year of minutes tractable.
+    """
+    import pandas as pd
+
+    if frequency == "minute":
+        select = """
+            SELECT array_position(%(ids)s::text[], "stockId") - 1,
+                   (EXTRACT(EPOCH FROM timestamp) / 60)::bigint,
+                   close
+            FROM "StockPrice"
+            WHERE "stockId" = ANY(%(ids)s::text[]) AND timestamp >= %(start)s AND timestamp < %(end)s
+        """
+        unit = "m"
+    elif frequency == "day":
+        select = """
+            SELECT DISTINCT ON ("stockId", timestamp::date)
+                   array_position(%(ids)s::text[], "stockId") - 1,
+                   timestamp::date - DATE '1970-01-01',
+                   close
+            FROM "StockPrice"
+            WHERE "stockId" = ANY(%(ids)s::text[]) AND timestamp >= %(start)s AND timestamp < %(end)s
+            ORDER BY "stockId", timestamp::date, timestamp DESC
+        """
+        unit = "D"
+    else:
+        raise ValueError(f"frequency must be one of {FREQUENCIES}")
+
+    buffer = io.StringIO()
+    with conn.cursor() as cur:
+        query = cur.mogrify(select, {"ids": list(stock_ids), "start": start, "end": end}).decode()
+        cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv)", buffer)
+    buffer.seek(0)
+
+    frame = pd.read_csv(buffer, header=None, names=("column", "time", "close"),
+                        dtype={"column": np.int64, "time": np.int64, "close": np.float64})
+    times = frame["time"].to_numpy()
+    grid = np.unique(times)
+    closes = np.full((len(grid), len(stock_ids)), np.nan)
+    closes[np.searchsorted(grid, times), frame["column"].to_numpy()] = frame["close"].to_numpy()
+    return grid.astype(f"datetime64[{unit}]"), closes
+
+
+def forward_fill(values):
+    """Forward-fill NaNs down each column"""
+    rows = np.arange(len(values))[:, None]
+    last_valid = np.where(np.isfinite(values), rows, 0)
+    np.maximum.accumulate(last_valid, axis=0, out=last_valid)
+    return values[last_valid, np.arange(values.shape[1])]
+
+
+def log_returns(grid, closes, frequency="day"):
+    """
+    Log returns per bar; NaN where a symbol has no bar.
+
+    A return after a gap runs from the last available close. For minute bars
+    the overnight return into each session's first bar is dropped.
+    """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        log_close = np.log(forward_fill(closes))
+    returns = np.full(closes.shape, np.nan)
+    returns[1:] = np.diff(log_close, axis=0)
+    returns[~np.isfinite(closes)] = np.nan
+    if frequency == "minute" and len(grid) > 1:
+        days = grid.astype("datetime64[D]")
+        returns[1:][days[1:] != days[:-1]] = np.nan
+    return returns
+
+
+def pairwise_moments(returns):
+    """
+    Pairwise-complete (observations, covariance, correlation) matrices.
+
+    For each pair only the bars where both returns exist are used; sums over
+    those bars come from matrix products of the zero-filled returns and the
+    validity mask.
+    """
+    valid = np.isfinite(returns).astype(np.float64)
+    x = np.where(valid > 0, returns, 0.0)
+
+    n = valid.T @ valid                     # n[i, j]: bars where both exist
+    sum_x = x.T @ valid                     # sum_x[i, j]: sum of x_i over those bars
+    sum_xx = (x * x).T @ valid
+    sum_xy = x.T @ x
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        covariance = (sum_xy - sum_x * sum_x.T / n) / (n - 1)
+        var_i = (sum_xx - sum_x * sum_x / n) / (n - 1)     # var of i over the pair's bars
+        correlation = covariance / np.sqrt(var_i * var_i.T)
+    covariance[n < MIN_OBSERVATIONS] = np.nan
+    correlation[n < MIN_OBSERVATIONS] = np.nan
+    np.clip(correlation, -1.0, 1.0, out=correlation)
+    return n, covariance, correlation
+
+
+def market_returns(returns):
+    """Equal-weighted mean return of the symbols trading in each bar"""
+    with np.errstate(invalid="ignore"):
+        counts = np.isfinite(returns).sum(axis=1)
+        total = np.nansum(returns, axis=1)
+        return np.where(counts > 0, total / np.maximum(counts, 1), np.nan)
+
+
+def _beta_from_sums(n, sx, sy, sxx, syy, sxy):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = sxy - sx * sy / n
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n
+        beta = cov / var_y
+        correlation = cov / np.sqrt(var_x * var_y)
+    beta[n < MIN_OBSERVATIONS] = np.nan
+    correlation[n < MIN_OBSERVATIONS] = np.nan
+    return beta, correlation
+
+
+def _paired(returns, benchmark):
+    b = np.broadcast_to(benchmark[:, None], returns.shape)
+    valid = np.isfinite(returns) & np.isfinite(b)
+    return valid.astype(np.float64), np.where(valid, returns, 0.0), np.where(valid, b, 0.0)
+
+
+def beta_correlation(returns, benchmark):
+    """Beta and correlation of every column against `benchmark` over the whole range"""
+    valid, x, y = _paired(returns, benchmark)
+    return _beta_from_sums(valid.sum(axis=0), x.sum(axis=0), y.sum(axis=0),
+                           (x * x).sum(axis=0), (y * y).sum(axis=0), (x * y).sum(axis=0))
+
+
+def _rolling_sum(values, window):
+    sums = np.cumsum(values, axis=0)
+    out = sums.copy()
+    out[window:] -= sums[:-window]
+    return out
+
+
+def rolling_beta_correlation(returns, benchmark, window):
+    """
+    Rolling beta and correlation of every column against `benchmark`.
+
+    Each uses the bars among the last `window` where both the symbol and the
+    benchmark have a return; fewer than MIN_OBSERVATIONS such bars give NaN.
+    """
+    valid, x, y = _paired(returns, benchmark)
+    return _beta_from_sums(
+        _rolling_sum(valid, window), _rolling_sum(x, window), _rolling_sum(y, window),
+        _rolling_sum(x * x, window), _rolling_sum(y * y, window), _rolling_sum(x * y, window),
+    )
+
+
+def _last_finite(values):
+    """Last finite value of each column (NaN if none)"""
+    finite = np.isfinite(values)
+    rows = np.where(finite, np.arange(len(values))[:, None], -1).max(axis=0)
+    out = np.full(values.shape[1], np.nan)
+    has = rows >= 0
+    out[has] = values[rows[has], np.flatnonzero(has)]
+    return out
+
+
+def _json_matrix(values, digits):
+    return [[None if not np.isfinite(v) else round(float(v), digits) for v in row] for row in values]
+
+
+def _json_value(value, digits=6):
+    return None if not np.isfinite(value) else round(float(value), digits)
+
+
+def analyse(grid, closes, frequency="day"):
+    """All statistics for one loaded universe; returns a dict of arrays"""
+    returns = log_returns(grid, closes, frequency)
+    observations, covariance, correlation = pairwise_moments(returns)
+    market = market_returns(returns)
+
+    beta, market_correlation = beta_correlation(returns, market)
+    rolling_beta, rolling_correlation = rolling_beta_correlation(returns, market, ROLLING_BARS[frequency])
+
+    with np.errstate(invalid="ignore"):
+        volatility = np.nanstd(returns, axis=0, ddof=1) * np.sqrt(BARS_PER_YEAR[frequency]) * 100
+    return {
+        "returns": returns,
+        "observations": observations,
+        "covariance": covariance,
+        "correlation": correlation,
+        "beta": beta,
+        "marketCorrelation": market_correlation,
+        "rollingBeta": _last_finite(rolling_beta),
+        "rollingCorrelation": _last_finite(rolling_correlation),
+        "volatility": volatility,
+    }
+
+
+def cache_key(frequency, start, end, symbols):
+    universe = hashlib.md5(",".join(sorted(symbols)).encode()).hexdigest()[:12]
+    return f"{frequency}_{start:%Y%m%d%H%M}_{end:%Y%m%d%H%M}_{universe}"
+
+
+def load_cached(conn, key):
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT symbols, correlation, covariance, stats
+            FROM "CorrelationMatrix" WHERE id = %s
+        """, (key,))
+        row = cur.fetchone()
+    if row is None:
+        return None
+    symbols, correlation, covariance, stats = row
+    return {"symbols": symbols, "correlation": correlation, "covariance": covariance, "stats": stats}
+
+
+def compute_correlations(conn, start, end, symbols=None, frequency="day", window=None, refresh=False):
+    """
+    Correlation/covariance matrices and per-symbol beta for [start, end).
+
+    Returns a dict with "symbols", "correlation", "covariance" and "stats"
+    (per symbol: beta, marketCorrelation, rollingBeta, rollingCorrelation,
+    volatility) - from "CorrelationMatrix" when the same key was computed
+    before, unless `refresh`.
+    """
+    ensure_table(conn)
+    stocks = load_stocks(conn, symbols)
+    names = [symbol for _, symbol in stocks]
+    key = cache_key(frequency, start, end, names)
+    if not refresh:
+        cached = load_cached(conn, key)
+        if cached is not None:
+            return cached
+
+    grid, closes = load_closes(conn, [stock_id for stock_id, _ in stocks], start, end, frequency)
+    result = analyse(grid, closes, frequency)
+
+    stats = {
+        name: {
+            field: _json_value(result[field][i])
+            for field in ("beta", "marketCorrelation", "rollingBeta", "rollingCorrelation", "volatility")
+        }
+        for i, name in enumerate(names)
+    }
+    stored = {
+        "symbols": names,
+        "correlation": _json_matrix(result["correlation"], 4),
+        "covariance": _json_matrix(result["covariance"], 10),
+        "stats": stats,
+    }
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO "CorrelationMatrix"
+            (id, "window", frequency, "fromTime", "toTime", symbols, correlation, covariance, stats, "generatedAt")
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (id) DO UPDATE SET
+                "window" = EXCLUDED."window",
+                symbols = EXCLUDED.symbols,
+                correlation = EXCLUDED.correlation,
+                covariance = EXCLUDED.covariance,
+                stats = EXCLUDED.stats,
+                "generatedAt" = EXCLUDED."generatedAt"
+        """, (key, window, frequency, start, end, json.dumps(names), json.dumps(stored["correlation"]),
+              json.dumps(stored["covariance"]), json.dumps(stats), datetime.now()))
+    conn.commit()
+    logger.info(f"✅ {window or frequency}: {len(names)} symbols x {len(grid)} {frequency} bars")
+    return stored
+
+
+def generate_correlations(conn, symbols=None, windows=None, refresh=False):
+    """Batch job: store the matrices of every window in WINDOWS for the universe"""
+    with conn.cursor() as cur:
+        cur.execute('SELECT MAX(timestamp) FROM "StockPrice"')
+        latest = cur.fetchone()[0]
+    if latest is None:
+        logger.warning("⚠️  No price data")
+        return
+
+    # Ranges end at the start of the next minute so that the key stays stable
+    # until a new candle arrives
+    end = latest.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    for name in windows or WINDOWS:
+        span, frequency = WINDOWS[name]
+        compute_correlations(conn, end - span, end, symbols, frequency, window=name, refresh=refresh)
@@ -0,0 +1,113 @@
+"""
+Downsampling of minute series for charting
+
+Both methods bucket points by fixed-width buckets on a session clock that
+only runs during trading hours (bucket = session_positions(minutes) // width),
+so every bucket holds the same number of trading minutes however many nights
+and weekends it spans. Positions depend on the timestamp alone, so bucket
+boundaries never move and appending candles only changes the last bucket or
+two, which is what makes the chart cache incremental.
+
+- ohlc_buckets: min/max preserving - one OHLCV candle per bucket
+- lttb_buckets: Largest-Triangle-Three-Buckets - one real point per bucket
+"""
+
+import numpy as np
+
+from .validation import SESSION_CLOSE, SESSION_OPEN
+
+SESSION_MINUTES = SESSION_CLOSE - SESSION_OPEN + 1
+EPOCH = np.datetime64("1970-01-01", "D")
+
+
+def to_minutes(timestamps):
+    """datetime64 array -> int64 minutes since epoch"""
+    return timestamps.astype("datetime64[m]").astype(np.int64)
+
+
+def session_positions(minutes):
+    """
+    Minutes since epoch -> trading minutes since epoch (SESSION_MINUTES per
+    weekday). Candles outside the session count as its first or last minute
+    of their day, weekend ones as the preceding Friday's last, so positions
+    never decrease over time.
+    """
+    minutes = np.asarray(minutes, dtype=np.int64)
+    days = (minutes // 1440).astype("datetime64[D]")
+    weekdays = np.busday_count(EPOCH, days)
+    offset = np.clip(minutes % 1440 - SESSION_OPEN, 0, SESSION_MINUTES - 1)
+    return np.where(np.is_busday(days), weekdays * SESSION_MINUTES + offset, weekdays * SESSION_MINUTES - 1)
+
+
+def session_day_start(position):
+    """Midnight (minutes since epoch) of the weekday of `position`; no later position has an earlier candle"""
+    day = np.busday_offset(EPOCH, int(position) // SESSION_MINUTES, roll="forward")
+    return int(day.astype(np.int64)) * 1440
+
+
+def bucket_starts(minutes, width):
+    """(bucket ids, index of the first point of every bucket)"""
+    ids = session_positions(minutes) // width
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    return ids[starts], starts
+
+
+def ohlc_buckets(minutes, open_, high, low, close, volume, width):
+    """Aggregate into one candle per bucket; returns dict of equal-length arrays"""
+    if len(minutes) == 0:
+        return {key: np.array([]) for key in ("bucket", "t", "o", "h", "l", "c", "v")}
+    ids, starts = bucket_starts(minutes, width)
+    ends = np.append(starts[1:], len(minutes)) - 1
+    return {
+        "bucket": ids,
+        "t": minutes[starts],
+        "o": open_[starts],
+        "h": np.maximum.reduceat(high, starts),
+        "l": np.minimum.reduceat(low, starts),
+        "c": close[ends],
+        "v": np.add.reduceat(volume, starts),
+    }
+
+
+def lttb_buckets(minutes, values, width, anchor=None):
+    """
+    Pick one point per bucket with Largest-Triangle-Three-Buckets.
+
+    For each bucket the point forming the largest triangle with the previously
+    selected point and the mean of the next bucket is kept. The first bucket
+    keeps its first point (or is chosen against `anchor`, the (minute, value)
+    selected just before this slice), the last bucket keeps its last point.
+    Returns dict with "bucket", "t" and "c" arrays.
+    """
+    if len(minutes) == 0:
+        return {"bucket": np.array([], dtype=np.int64), "t": np.array([], dtype=np.int64), "c": np.array([])}
+
+    ids, starts = bucket_starts(minutes, width)
+    ends = np.append(starts[1:], len(minutes))
+    count = len(starts)
+
+    # Mean point of every bucket, used as the third vertex for the bucket before
+    sums_x = np.add.reduceat(minutes.astype(np.float64), starts)
+    sums_y = np.add.reduceat(values, starts)
+    sizes = ends - starts
+    mean_x, mean_y = sums_x / sizes, sums_y / sizes
+
+    chosen = np.empty(count, dtype=np.int64)
+    for i in range(count):
+        lo, hi = starts[i], ends[i]
+        if i == count - 1:
+            chosen[i] = hi - 1
+            continue
+        if i == 0 and anchor is None:
+            chosen[i] = lo
+            continue
+        if i == 0:
+            ax, ay = anchor
+        else:
+            ax, ay = minutes[chosen[i - 1]], values[chosen[i - 1]]
+        bx, by = mean_x[i + 1], mean_y[i + 1]
+        xs, ys = minutes[lo:hi], values[lo:hi]
+        area = np.abs((ax - bx) * (ys - ay) - (ax - xs) * (by - ay))
+        chosen[i] = lo + int(np.argmax(area))
+
+    return {"bucket": ids, "t": minutes[chosen], "c": values[chosen]}
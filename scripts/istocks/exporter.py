@@ -0,0 +1,259 @@
+"""
+Parallel, compressed per-symbol/per-month export of "StockPrice"
+
+Layout (default root: exports/prices):
+
+    stocks.csv                       the "Stock" table
+    WIPRO/WIPRO_2025-10.csv.zst      one file per symbol and month
+    manifest.json                    rows, bytes and sha256 per file
+
+Each file is produced by streaming `COPY (...) TO STDOUT` straight through
+the compressor to disk, so memory stays flat regardless of table size.
+Finished files are recorded in the manifest as they complete; a re-run skips
+everything already exported except each symbol's newest (still open) month.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from logzero import logger
+
+from .config import PROJECT_ROOT, connect
+from .partitions import add_months, column_list, iter_months
+
+DEFAULT_ROOT = os.path.join(PROJECT_ROOT, "exports", "prices")
+MANIFEST = "manifest.json"
+
+# Naive IST timestamps are written as ISO-8601 with the explicit offset
+ISO_TIMESTAMP = """to_char({column}, 'YYYY-MM-DD"T"HH24:MI:SS') || '+05:30'"""
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def default_compression():
+    return "zstd" if _zstd() else "gzip"
+
+
+class _HashingWriter:
+    """File wrapper that tracks sha256 and size of everything written"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.raw.write(data)
+
+    def flush(self):
+        self.raw.flush()
+
+
+class _LineCounter:
+    """Text sink for copy_expert that counts lines and forwards bytes"""
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.lines = 0
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.lines += data.count(b"\n")
+        self.sink.write(data)
+        return len(data)
+
+
+def _open_compressed(raw, compression):
+    if compression == "zstd":
+        return _zstd().ZstdCompressor(level=6, threads=0).stream_writer(raw, closefd=False)
+    return gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6)
+
+
+def _select_list(columns):
+    parts = []
+    for column in columns:
+        quoted = f'sp."{column}"'
+        if column in ("timestamp", "createdAt"):
+            parts.append(f'{ISO_TIMESTAMP.format(column=quoted)} AS "{column}"')
+        else:
+            parts.append(quoted)
+    return ", ".join(parts)
+
+
+def plan_jobs(conn, symbols=None):
+    """List (stock_id, symbol, month) for every month between a stock's first and last candle"""
+    with conn.cursor() as cur:
+        # MIN/MAX per stock are answered from the (stockId, timestamp) index
+        cur.execute("""
+            SELECT s.id, s.symbol,
+                   (SELECT MIN(timestamp) FROM "StockPrice" WHERE "stockId" = s.id),
+                   (SELECT MAX(timestamp) FROM "StockPrice" WHERE "stockId" = s.id)
+            FROM "Stock" s
+            WHERE %s::text[] IS NULL OR s.symbol = ANY(%s::text[])
+            ORDER BY s.symbol
+        """, (symbols, symbols))
+        stocks = cur.fetchall()
+
+    return [
+        (stock_id, symbol, month)
+        for stock_id, symbol, first, last in stocks if first is not None
+        for month in iter_months(first, last)
+    ]
+
+
+class Exporter:
+    def __init__(self, root=DEFAULT_ROOT, workers=4, compression=None):
+        self.root = root
+        self.workers = workers
+        self.compression = compression or default_compression()
+        self.extension = ".csv.zst" if self.compression == "zstd" else ".csv.gz"
+        self.manifest_path = os.path.join(root, MANIFEST)
+        self.manifest = self._load_manifest()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._connections = []
+
+    def _load_manifest(self):
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        return {"files": {}}
+
+    def _save_manifest(self):
+        self.manifest["updatedAt"] = datetime.now().isoformat(timespec="seconds")
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    def _connection(self):
+        if getattr(self._local, "conn", None) is None:
+            self._local.conn = connect()
+            with self._lock:
+                self._connections.append(self._local.conn)
+        return self._local.conn
+
+    def relative_path(self, symbol, month):
+        return os.path.join(symbol, f"{symbol}_{month:%Y-%m}{self.extension}")
+
+    def is_done(self, path):
+        entry = self.manifest["files"].get(path)
+        full = os.path.join(self.root, path)
+        return bool(entry) and os.path.exists(full) and os.path.getsize(full) == entry["bytes"]
+
+    def export_month(self, stock_id, symbol, month, columns):
+        """Stream one symbol-month to disk; returns its manifest entry"""
+        path = self.relative_path(symbol, month)
+        full = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        tmp = full + ".part"
+
+        conn = self._connection()
+        with conn.cursor() as cur:
+            query = cur.mogrify(f"""
+                SELECT {_select_list(columns)}
+                FROM "StockPrice" sp
+                WHERE sp."stockId" = %s AND sp.timestamp >= %s AND sp.timestamp < %s
+                ORDER BY sp.timestamp
+            """, (stock_id, month, add_months(month, 1))).decode()
+
+        try:
+            with open(tmp, "wb") as raw:
+                hashed = _HashingWriter(raw)
+                compressed = _open_compressed(hashed, self.compression)
+                counter = _LineCounter(compressed)
+                with conn.cursor() as cur:
+                    cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true)", counter)
+                compressed.close()
+        except Exception:
+            # Leave the thread's connection usable for its next month
+            conn.rollback()
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        conn.rollback()
+        os.replace(tmp, full)
+
+        return path, {
+            "symbol": symbol,
+            "month": f"{month:%Y-%m}",
+            "rows": max(counter.lines - 1, 0),
+            "bytes": hashed.size,
+            "sha256": hashed.sha256.hexdigest(),
+            "compression": self.compression,
+        }
+
+    def export_stocks(self, conn):
+        path = os.path.join(self.root, "stocks.csv")
+        with open(path, "w", newline="") as f, conn.cursor() as cur:
+            cur.copy_expert(f"""
+                COPY (
+                    SELECT id, symbol, name, exchange,
+                           {ISO_TIMESTAMP.format(column='"createdAt"')} AS "createdAt",
+                           {ISO_TIMESTAMP.format(column='"updatedAt"')} AS "updatedAt"
+                    FROM "Stock" ORDER BY symbol
+                ) TO STDOUT WITH (FORMAT csv, HEADER true)
+            """, f)
+        conn.rollback()
+
+    def run(self, symbols=None, force=False):
+        os.makedirs(self.root, exist_ok=True)
+        conn = connect()
+        try:
+            self.export_stocks(conn)
+            columns = column_list(conn)
+            jobs = plan_jobs(conn, list(symbols) if symbols else None)
+        finally:
+            conn.close()
+
+        # The newest month of every symbol may still receive candles
+        newest = {}
+        for stock_id, symbol, month in jobs:
+            newest[symbol] = max(newest.get(symbol, month), month)
+
+        pending = [
+            job for job in jobs
+            if force or job[2] == newest[job[1]] or not self.is_done(self.relative_path(job[1], job[2]))
+        ]
+        logger.info(f"📦 {len(jobs)} symbol-months, {len(pending)} to export "
+                    f"with {self.workers} workers ({self.compression})")
+
+        total_rows = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {
+                pool.submit(self.export_month, stock_id, symbol, month, columns): (symbol, month)
+                for stock_id, symbol, month in pending
+            }
+            for future in as_completed(futures):
+                symbol, month = futures[future]
+                try:
+                    path, entry = future.result()
+                except Exception as e:
+                    logger.error(f"❌ {symbol} {month:%Y-%m}: {e}")
+                    continue
+                total_rows += entry["rows"]
+                with self._lock:
+                    self.manifest["files"][path] = entry
+                    self._save_manifest()
+                logger.info(f"  ✅ {path}: {entry['rows']} rows, {entry['bytes'] / 1024:.0f} KB")
+
+        for worker_conn in self._connections:
+            worker_conn.close()
+        self._connections = []
+
+        logger.info(f"🏁 Exported {total_rows} rows into {self.root}")
+        return total_rows
@@ -0,0 +1,255 @@
+"""
+Memory-mapped feature store built from StockPrice
+
+Per symbol, every feature is one fixed-dtype column file under
+exports/features/<SYMBOL>/ (FEATURE_STORE overrides the root) plus a
+manifest.json with row count, time range and column dtypes:
+
+    from istocks.features import open_features
+    features = open_features("WIPRO", ("ret_15", "rsi_lag5", "fwd_ret_15"))
+    features["ret_15"][-1000:]          # read-only view, no copy, no query
+
+Column files are ordinary .npy files (np.load(path, mmap_mode="r") works)
+written with a fixed-size header, so new rows are appended in place and only
+the shape in the header changes. The manifest is replaced after the columns
+are written and readers stop at its row count, so a reader never sees a
+half-written append.
+
+Features are computed from candles and stored indicators: log returns over
+RETURN_HORIZONS (and forward returns as labels), indicators with LAGS,
+price-relative indicators and rolling volatility, range and volume z-scores
+over ROLLING_WINDOWS. Appends recompute the last max(RETURN_HORIZONS) rows,
+whose forward returns were still open, and read LOOKBACK rows before them
+for context, so incremental and full builds produce the same values.
+"""
+
+import json
+import os
+import struct
+from datetime import datetime, timedelta
+
+import numpy as np
+from logzero import logger
+
+from .candles import query_candles
+from .config import PROJECT_ROOT, load_env
+
+FEATURE_VERSION = 1
+RETURN_HORIZONS = (1, 5, 15, 60, 375)
+ROLLING_WINDOWS = (15, 60, 375)
+LAGS = (1, 5, 15)
+LAGGED_INDICATORS = ("rsi", "macdHistogram", "adx", "stochK", "cci", "williamsR", "roc")
+SOURCE_COLUMNS = ("open", "high", "low", "close", "volume", "rsi", "macdHistogram", "adx",
+                  "stochK", "cci", "williamsR", "roc", "sma20", "sma50", "sma200",
+                  "bbUpper", "bbLower", "atr")
+
+FORWARD = max(RETURN_HORIZONS)                              # rows whose labels are still open
+LOOKBACK = max(max(RETURN_HORIZONS), max(ROLLING_WINDOWS) + 1) + max(LAGS)
+BATCH = timedelta(days=180)                                 # candles read per query
+HEADER_BYTES = 128
+SESSION_OPEN_MINUTE = 9 * 60 + 15
+
+
+def store_root():
+    load_env()
+    return os.getenv("FEATURE_STORE") or os.path.join(PROJECT_ROOT, "exports", "features")
+
+
+# -- feature definitions --------------------------------------------------------
+
+def compute_features(bars):
+    """{column: array} for minute `bars` (from candles.query_candles), oldest first"""
+    import pandas as pd
+
+    close = pd.Series(bars["close"], dtype=float)
+    high = pd.Series(bars["high"], dtype=float)
+    low = pd.Series(bars["low"], dtype=float)
+    volume = pd.Series(bars["volume"], dtype=float)
+    log_close = np.log(close)
+    minute_return = log_close.diff()
+    timestamps = bars["timestamp"].astype("datetime64[m]")
+
+    features = {"timestamp": timestamps, "close": close.to_numpy()}
+    for horizon in RETURN_HORIZONS:
+        features[f"ret_{horizon}"] = (log_close - log_close.shift(horizon)).to_numpy()
+        features[f"fwd_ret_{horizon}"] = (log_close.shift(-horizon) - log_close).to_numpy()
+
+    for name in LAGGED_INDICATORS:
+        series = pd.Series(bars[name], dtype=float)
+        features[name] = series.to_numpy()
+        for lag in LAGS:
+            features[f"{name}_lag{lag}"] = series.shift(lag).to_numpy()
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for window in (20, 50, 200):
+            features[f"close_sma{window}"] = bars["close"] / bars[f"sma{window}"] - 1
+        features["bb_position"] = (bars["close"] - bars["bbLower"]) / (bars["bbUpper"] - bars["bbLower"])
+        features["atr_pct"] = bars["atr"] / bars["close"]
+
+        for window in ROLLING_WINDOWS:
+            features[f"volatility_{window}"] = minute_return.rolling(window, min_periods=window).std().to_numpy()
+            features[f"range_{window}"] = ((high.rolling(window, min_periods=window).max()
+                                            - low.rolling(window, min_periods=window).min()) / close).to_numpy()
+            mean = volume.rolling(window, min_periods=window).mean()
+            std = volume.rolling(window, min_periods=window).std()
+            features[f"volume_z_{window}"] = ((volume - mean) / std).to_numpy()
+
+    minutes = (timestamps - timestamps.astype("datetime64[D]")).astype(np.int64)
+    features["session_minute"] = minutes - SESSION_OPEN_MINUTE
+    features["weekday"] = (timestamps.astype("datetime64[D]").astype(np.int64) + 3) % 7   # Monday = 0
+
+    dtypes = column_dtypes()
+    return {name: np.asarray(values).astype(dtypes[name]) for name, values in features.items()}
+
+
+def column_dtypes():
+    """{column: numpy dtype} of the current feature spec"""
+    names = ["close"]
+    for horizon in RETURN_HORIZONS:
+        names += [f"ret_{horizon}", f"fwd_ret_{horizon}"]
+    for name in LAGGED_INDICATORS:
+        names += [name] + [f"{name}_lag{lag}" for lag in LAGS]
+    names += ["close_sma20", "close_sma50", "close_sma200", "bb_position", "atr_pct"]
+    for window in ROLLING_WINDOWS:
+        names += [f"volatility_{window}", f"range_{window}", f"volume_z_{window}"]
+    dtypes = {"timestamp": np.dtype("datetime64[m]")}
+    dtypes.update({name: np.dtype(np.float32) for name in names})
+    dtypes["session_minute"] = np.dtype(np.int16)
+    dtypes["weekday"] = np.dtype(np.int8)
+    return dtypes
+
+
+# -- column files ---------------------------------------------------------------
+
+def _header(dtype, rows):
+    text = repr({"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False, "shape": (rows,)})
+    text = text.ljust(HEADER_BYTES - 11) + "\n"
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(text)) + text.encode("latin1")
+
+
+def _write_column(path, values, offset):
+    """Write `values` as rows [offset, offset + len) of a column file, dropping rows after them"""
+    mode = "r+b" if os.path.exists(path) else "w+b"
+    with open(path, mode) as f:
+        f.seek(HEADER_BYTES + offset * values.dtype.itemsize)
+        f.write(np.ascontiguousarray(values).tobytes())
+        f.truncate()
+        f.seek(0)
+        f.write(_header(values.dtype, offset + len(values)))
+
+
+def _load_column(directory, name, rows):
+    return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")[:rows]
+
+
+def read_manifest(directory):
+    path = os.path.join(directory, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_manifest(directory, manifest):
+    path = os.path.join(directory, "manifest.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def _spec():
+    return {name: str(dtype) for name, dtype in column_dtypes().items()}
+
+
+# -- build / append -------------------------------------------------------------
+
+def _reset(directory):
+    for name in os.listdir(directory):
+        if name.endswith(".npy") or name == "manifest.json":
+            os.remove(os.path.join(directory, name))
+
+
+def _candle_range(conn, stock_id):
+    with conn.cursor() as cur:
+        cur.execute('SELECT MIN(timestamp), MAX(timestamp) FROM "StockPrice" WHERE "stockId" = %s',
+                    (stock_id,))
+        return cur.fetchone()
+
+
+def update_features(conn, symbol, stock_id, rebuild=False, root=None):
+    """
+    Append feature rows for candles after the stored ones (the whole
+    history on the first run). Returns the number of new rows.
+    """
+    directory = os.path.join(root or store_root(), symbol)
+    os.makedirs(directory, exist_ok=True)
+    first, latest = _candle_range(conn, stock_id)
+    manifest = read_manifest(directory)
+    if manifest and (rebuild or manifest.get("version") != FEATURE_VERSION or manifest.get("columns") != _spec()
+                     or first is None or first < datetime.fromisoformat(manifest["first"])):
+        logger.info(f"♻️  {symbol}: rebuilding feature store")
+        manifest = None
+    if manifest is None:
+        _reset(directory)
+        manifest = {"symbol": symbol, "stockId": stock_id, "version": FEATURE_VERSION,
+                    "rows": 0, "first": None, "last": None, "columns": _spec()}
+    if latest is None:
+        return 0
+
+    rows_before = manifest["rows"]
+    cursor = datetime.fromisoformat(manifest["last"]) if manifest["last"] else first
+    while cursor <= latest:
+        rows = manifest["rows"]
+        context = max(0, rows - FORWARD - LOOKBACK)
+        rewrite = max(0, rows - FORWARD)
+        stored = _load_column(directory, "timestamp", rows) if rows else None
+        start = stored[context].astype("datetime64[ms]").item() if rows else first
+        end = max(cursor, start) + BATCH
+        bars = query_candles(conn, stock_id, start, end, SOURCE_COLUMNS)
+        cursor = end
+        if len(bars["timestamp"]) <= rows - context:
+            continue
+        if rows and not np.array_equal(bars["timestamp"][:rows - context], stored[context:]):
+            # Candles inside the stored range changed (e.g. a backfilled gap)
+            return update_features(conn, symbol, stock_id, rebuild=True, root=root)
+
+        features = compute_features(bars)
+        for name, values in features.items():
+            _write_column(os.path.join(directory, f"{name}.npy"), values[rewrite - context:], rewrite)
+        total = context + len(bars["timestamp"])
+        manifest.update(
+            rows=total,
+            first=manifest["first"] or str(bars["timestamp"][0].astype("datetime64[ms]").item()),
+            last=str(bars["timestamp"][-1].astype("datetime64[ms]").item()),
+            updatedAt=datetime.now().isoformat(timespec="seconds"),
+        )
+        _write_manifest(directory, manifest)
+
+    added = manifest["rows"] - rows_before
+    logger.info(f"✅ {symbol}: {added:,} new feature rows ({manifest['rows']:,} total)")
+    return added
+
+
+# -- read path ------------------------------------------------------------------
+
+def open_features(symbol, columns=None, start=None, end=None, root=None):
+    """
+    {column: read-only memory-mapped array} of one symbol, optionally limited
+    to timestamps in [start, end). Slices are views into the files.
+    """
+    directory = os.path.join(root or store_root(), symbol)
+    manifest = read_manifest(directory)
+    if manifest is None:
+        raise FileNotFoundError(f"No feature store for {symbol} in {directory}")
+    rows = manifest["rows"]
+    timestamps = _load_column(directory, "timestamp", rows)
+    lo = 0 if start is None else int(np.searchsorted(timestamps, np.datetime64(start, "m")))
+    hi = rows if end is None else int(np.searchsorted(timestamps, np.datetime64(end, "m")))
+    names = ["timestamp"] + [c for c in (columns or manifest["columns"]) if c != "timestamp"]
+    return {name: _load_column(directory, name, rows)[lo:hi] for name in names}
+
+
+def feature_matrix(symbol, columns, start=None, end=None, root=None):
+    """(timestamps, float32 matrix rows x columns) - copies, for model input"""
+    features = open_features(symbol, columns, start, end, root)
+    return features["timestamp"], np.column_stack([features[c].astype(np.float32, copy=False) for c in columns])
@@ -0,0 +1,142 @@
+"""
+Earliest available history per (symbol, interval), found by binary search
+
+"Is there any candle in [day, day + PROBE_DAYS)?" is false before a symbol's
+history starts and true from there on (a PROBE_DAYS window always spans
+trading days), so the first day with data is found with a binary search over
+days: about log2(days) one-window requests instead of scanning years of
+empty windows. The first candle of the last successful probe is the
+earliest candle.
+
+Results are kept in "HistoryStart" and reused for PROBE_TTL, so backfill
+planners can start each symbol where its data actually begins. "No data"
+answers (e.g. a symbol that is not listed yet) are only reused for
+EMPTY_PROBE_TTL; re-checking them costs a single request.
+"""
+
+import time
+from datetime import datetime, timedelta
+
+from logzero import logger
+
+from .prices import parse_candle_time
+
+SEARCH_FROM = datetime(2000, 1, 1, 9, 15)
+PROBE_DAYS = 10
+PROBE_TTL = timedelta(days=90)
+EMPTY_PROBE_TTL = timedelta(days=1)
+
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS "HistoryStart" (
+        symbol TEXT NOT NULL,
+        exchange TEXT NOT NULL DEFAULT 'NSE',
+        interval TEXT NOT NULL DEFAULT 'ONE_MINUTE',
+        earliest TIMESTAMP(3),
+        probes INTEGER NOT NULL,
+        "probedAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        CONSTRAINT "HistoryStart_pkey" PRIMARY KEY (symbol, exchange, interval)
+    )
+"""
+
+
+def ensure_table(conn):
+    with conn.cursor() as cur:
+        cur.execute(CREATE_TABLE)
+    conn.commit()
+
+
+def _first_candle(client, token, exchange, interval, start, min_interval):
+    """First candle time in [start, start + PROBE_DAYS), or None"""
+    end = start + timedelta(days=PROBE_DAYS)
+    response = client.getCandleData({
+        "exchange": exchange,
+        "symboltoken": token,
+        "interval": interval,
+        "fromdate": start.strftime("%Y-%m-%d %H:%M"),
+        "todate": end.strftime("%Y-%m-%d %H:%M"),
+    })
+    if not getattr(client, "last_hit", False):
+        time.sleep(min_interval)
+    if not response.get("status") and response.get("errorcode"):
+        raise RuntimeError(f"{response.get('errorcode')} {response.get('message')}")
+    data = response.get("data") or []
+    return parse_candle_time(data[0][0]) if data else None
+
+
+def probe_earliest(client, token, exchange="NSE", interval="ONE_MINUTE",
+                   search_from=SEARCH_FROM, until=None, min_interval=0.5):
+    """
+    Binary-search the earliest candle of one instrument.
+
+    Returns (earliest datetime or None when there is no data at all,
+    number of requests made).
+    """
+    until = until or datetime.now()
+    lo, hi = 0, max(0, (until - search_from).days - PROBE_DAYS)
+
+    def first_at(day):
+        return _first_candle(client, token, exchange, interval, search_from + timedelta(days=day), min_interval)
+
+    probes = 1
+    earliest = first_at(hi)
+    if earliest is None:
+        return None, probes
+    while lo < hi:
+        mid = (lo + hi) // 2
+        first = first_at(mid)
+        probes += 1
+        if first is None:
+            lo = mid + 1
+        else:
+            hi, earliest = mid, first
+    return earliest, probes
+
+
+def cached_starts(conn, symbols, exchange="NSE", interval="ONE_MINUTE", max_age=PROBE_TTL,
+                  empty_max_age=EMPTY_PROBE_TTL):
+    """
+    {symbol: earliest or None} for symbols probed within `max_age`, or
+    within `empty_max_age` when the probe found no data
+    """
+    ensure_table(conn)
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT symbol, earliest FROM "HistoryStart"
+            WHERE symbol = ANY(%s) AND exchange = %s AND interval = %s
+              AND "probedAt" >= NOW() - CASE WHEN earliest IS NULL THEN %s ELSE %s END
+        """, (list(symbols), exchange, interval, empty_max_age, max_age))
+        return dict(cur.fetchall())
+
+
+def store_start(conn, symbol, earliest, probes, exchange="NSE", interval="ONE_MINUTE"):
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO "HistoryStart" (symbol, exchange, interval, earliest, probes, "probedAt")
+            VALUES (%s, %s, %s, %s, %s, NOW())
+            ON CONFLICT (symbol, exchange, interval) DO UPDATE SET
+                earliest = EXCLUDED.earliest,
+                probes = EXCLUDED.probes,
+                "probedAt" = EXCLUDED."probedAt"
+        """, (symbol, exchange, interval, earliest, probes))
+    conn.commit()
+
+
+def history_starts(conn, client, tokens, symbols, exchange="NSE", interval="ONE_MINUTE",
+                   refresh=False, min_interval=0.5):
+    """
+    {symbol: earliest or None}, probing (and storing) symbols not known yet.
+
+    `tokens` maps symbol -> instrument token (see angel.symbol_tokens).
+    Symbols without a token are left out.
+    """
+    starts = {} if refresh else cached_starts(conn, symbols, exchange, interval)
+    for symbol in symbols:
+        if symbol in starts or symbol not in tokens:
+            continue
+        earliest, probes = probe_earliest(client, tokens[symbol], exchange, interval,
+                                          min_interval=min_interval)
+        store_start(conn, symbol, earliest, probes, exchange, interval)
+        starts[symbol] = earliest
+        found = f"{earliest:%Y-%m-%d %H:%M}" if earliest else "no data"
+        logger.info(f"🔎 {symbol} {interval}: {found} ({probes} requests)")
+    return starts
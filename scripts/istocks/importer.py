@@ -0,0 +1,416 @@
+"""
+Streaming bulk importer for price dumps
+
+Supported inputs (optionally .gz / .zst compressed):
+
+- JSON arrays of Angel One candles ([ts, o, h, l, c, v] or objects), parsed
+  element by element so the file is never loaded whole
+- CSV with a header: our own exports (ISO timestamps) and the legacy
+  exports/*.csv files with JavaScript date strings
+- Parquet (requires pyarrow), read in record batches
+- pg_dump plain SQL files; the COPY blocks for "Stock" and "StockPrice" are
+  streamed, everything else is ignored
+
+Rows are normalised to naive IST timestamps, collected into fixed-size
+batches and pushed through istocks.prices.bulk_insert (COPY + per-partition
+merge + validation), so memory use depends on the batch size only.
+"""
+
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+
+from logzero import logger
+
+from .config import connect
+from .partitions import column_list
+from .prices import PRICE_COLUMNS, bulk_insert, price_id
+from .validation import SESSION_CLOSE, SESSION_OPEN
+
+IST = timezone(timedelta(hours=5, minutes=30))
+BATCH_SIZE = 50_000
+
+JS_DATE = re.compile(r"^\w{3} (\w{3} \d{2} \d{4} \d{2}:\d{2}:\d{2}) GMT([+-]\d{4})")
+COPY_START = re.compile(r'^COPY (?:public\.)?"?(\w+)"? \((.+)\) FROM stdin;$')
+NULLS = ("", r"\N", None)
+NUMBER_CHARS = "0123456789+-.eE"
+WHITESPACE = re.compile(r"[ \t\r\n]*")
+SEPARATOR = re.compile(r"[ \t\r\n]*,[ \t\r\n]*")
+
+
+# -- parsing helpers ---------------------------------------------------------
+
+def parse_timestamp(value, naive_tz=IST):
+    """Parse ISO / JS date strings into a naive IST datetime"""
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        value = str(value).strip()
+        match = JS_DATE.match(value)
+        if match:
+            parsed = datetime.strptime(f"{match.group(1)} {match.group(2)}", "%b %d %Y %H:%M:%S %z")
+        else:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=naive_tz)
+    return parsed.astimezone(IST).replace(tzinfo=None)
+
+
+def is_naive(value):
+    """True for timestamps without an offset, which are read in the --naive-tz zone"""
+    if isinstance(value, datetime):
+        return value.tzinfo is None
+    value = str(value).strip()
+    return not JS_DATE.match(value) and datetime.fromisoformat(value.replace("Z", "+00:00")).tzinfo is None
+
+
+def _session_share(timestamps, shift=timedelta(0)):
+    """Share of naive IST `timestamps` inside trading sessions once moved by `shift`"""
+    inside = 0
+    for timestamp in timestamps:
+        timestamp += shift
+        minute = timestamp.hour * 60 + timestamp.minute
+        inside += timestamp.weekday() < 5 and SESSION_OPEN <= minute <= SESSION_CLOSE
+    return inside / len(timestamps)
+
+
+def check_naive_tz(path, timestamps, naive_tz):
+    """
+    Raise ValueError when timestamps read without an offset fit the trading
+    sessions far better in the other --naive-tz zone, e.g. a pg_dump of UTC
+    timestamps (sessions from 03:45) read as IST, which validation would
+    quarantine wholesale.
+    """
+    offset = timedelta(hours=5, minutes=30)
+    other, shift = ("utc", offset) if naive_tz == IST else ("ist", -offset)
+    share, other_share = _session_share(timestamps), _session_share(timestamps, shift)
+    if share < 0.5 and other_share > share:
+        raise ValueError(f"{path}: only {share:.0%} of the first {len(timestamps):,} candles fall in trading "
+                         f"sessions, {other_share:.0%} with --naive-tz {other} - re-run with --naive-tz {other}")
+
+
+def _open_text(path):
+    """Open a possibly compressed file as text"""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", newline="")
+    if path.endswith(".zst"):
+        import zstandard
+        raw = open(path, "rb")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw), newline="")
+    return open(path, "r", newline="")
+
+
+def _base_name(path):
+    name = os.path.basename(path)
+    for suffix in (".gz", ".zst"):
+        if name.endswith(suffix):
+            name = name[: -len(suffix)]
+    return name
+
+
+def file_kind(path):
+    name = _base_name(path).lower()
+    for kind in ("json", "csv", "parquet", "sql"):
+        if name.endswith("." + kind):
+            return kind
+    raise ValueError(f"Unsupported file type: {path}")
+
+
+def iter_json_array(stream, chunk_size=1 << 16):
+    """
+    Yield the elements of a top-level JSON array without loading it whole.
+    Elements must be separated by exactly one comma; raises ValueError on
+    a malformed or unterminated array.
+    """
+    decoder = json.JSONDecoder()
+    buffer, idx, eof = "", 0, False
+    expect = "["            # then "first", "element" after a comma, "separator"
+    while True:
+        idx = WHITESPACE.match(buffer, idx).end()
+        if idx == len(buffer):
+            if eof:
+                if expect == "[":
+                    return
+                raise ValueError("Unterminated JSON array")
+            # Only the unread tail is kept when refilling
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer, idx = buffer[idx:] + chunk, 0
+            continue
+        char = buffer[idx]
+        if expect == "[":
+            if char != "[":
+                raise ValueError("Expected a JSON array")
+            idx += 1
+            expect = "first"
+            continue
+        if expect == "separator":
+            if char == "]":
+                return
+            if char != ",":
+                raise ValueError(f"Expected ',' or ']' between array elements, got {char!r}")
+            idx += 1
+            expect = "element"
+            continue
+        if char == "]":
+            if expect == "first":
+                return
+            raise ValueError("Trailing comma in JSON array")
+        if char == ",":
+            raise ValueError("Missing array element before ','")
+        # Decode comma-separated elements for as long as the buffer holds them
+        while True:
+            try:
+                element, end = decoder.raw_decode(buffer, idx)
+                # A number is only complete once a character that cannot continue it
+                # follows ("7." may be the start of "7.5" in the next chunk)
+                complete = eof or (end < len(buffer) and buffer[end] not in NUMBER_CHARS)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+            if not complete:
+                # Element straddles the chunk boundary - read more
+                chunk = stream.read(chunk_size)
+                eof = not chunk
+                buffer, idx = buffer[idx:] + chunk, 0
+                break
+            yield element
+            separator = SEPARATOR.match(buffer, end)
+            if separator is None:
+                idx, expect = end, "separator"
+                break
+            idx, expect = separator.end(), "element"
+            if idx == len(buffer) or buffer[idx] in ",]":
+                break
+
+
+def _copy_unescape(value):
+    if value == r"\N":
+        return None
+    if "\\" not in value:
+        return value
+    return value.encode("latin-1", "backslashreplace").decode("unicode_escape")
+
+
+# -- readers -----------------------------------------------------------------
+
+def read_json(path):
+    with _open_text(path) as f:
+        for element in iter_json_array(f):
+            if isinstance(element, dict):
+                yield element
+            else:
+                yield dict(zip(("timestamp", "open", "high", "low", "close", "volume"), element))
+
+
+def read_csv(path):
+    with _open_text(path) as f:
+        yield from csv.DictReader(f)
+
+
+def read_parquet(path, batch_size=BATCH_SIZE):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet import requires pyarrow (pip3 install pyarrow)")
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        yield from batch.to_pylist()
+
+
+def read_sql_dump(path, table="StockPrice"):
+    """Yield dict rows of one table's COPY block in a plain pg_dump file"""
+    with _open_text(path) as f:
+        columns = None
+        for line in f:
+            line = line.rstrip("\n")
+            if columns is None:
+                match = COPY_START.match(line)
+                if match and match.group(1) == table:
+                    columns = [c.strip().strip('"') for c in match.group(2).split(",")]
+                continue
+            if line == "\\.":
+                return
+            yield dict(zip(columns, (_copy_unescape(v) for v in line.split("\t"))))
+
+
+READERS = {"json": read_json, "csv": read_csv, "parquet": read_parquet, "sql": read_sql_dump}
+
+
+# -- stocks ------------------------------------------------------------------
+
+def _stock_id_for(symbol):
+    """Same id scheme as fetch-multi-stock-data.py"""
+    return f"stock_{hashlib.md5(symbol.encode()).hexdigest()[:20]}"
+
+
+def ensure_stock(conn, symbol, name=None, exchange="NSE"):
+    """Return the id of `symbol`, creating the Stock row if needed"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO "Stock" (id, symbol, name, exchange, "createdAt", "updatedAt")
+            VALUES (%s, %s, %s, %s, NOW(), NOW())
+            ON CONFLICT (symbol) DO UPDATE SET "updatedAt" = "Stock"."updatedAt"
+            RETURNING id
+        """, (_stock_id_for(symbol), symbol, name or symbol, exchange or "NSE"))
+        stock_id = cur.fetchone()[0]
+    conn.commit()
+    return stock_id
+
+
+def load_stock_map(conn, path):
+    """
+    Import the Stock rows of a stocks.csv export or SQL dump.
+
+    Returns {source stock id: database stock id}, matched by symbol, so price
+    rows can be re-pointed when the target database assigned different ids.
+    """
+    rows = read_sql_dump(path, "Stock") if file_kind(path) == "sql" else read_csv(path)
+    mapping = {}
+    for row in rows:
+        mapping[row["id"]] = ensure_stock(conn, row["symbol"], row.get("name"), row.get("exchange"))
+    return mapping
+
+
+# -- import ------------------------------------------------------------------
+
+
+def _normalise(record, stock_id, stock_map, symbol_ids, extras, naive_tz):
+    if stock_id is None:
+        source_id = record.get("stockId")
+        if source_id is not None:
+            stock_id = stock_map.get(source_id, source_id)
+        else:
+            stock_id = symbol_ids[record["symbol"]]
+    timestamp = parse_timestamp(record["timestamp"], naive_tz)
+    return (
+        record.get("id") or price_id(stock_id, timestamp),
+        stock_id,
+        timestamp,
+        float(record["open"]),
+        float(record["high"]),
+        float(record["low"]),
+        float(record["close"]),
+        int(float(record["volume"])),
+        *(None if record.get(column) in NULLS else record[column] for column in extras),
+    )
+
+
+def import_file(path, symbol=None, stock_map=None, naive_tz=IST, batch_size=BATCH_SIZE, validate=True):
+    """Stream one file into StockPrice; returns (rows read, rows inserted)"""
+    stock_map = stock_map or {}
+    kind = file_kind(path)
+    conn = connect()
+    try:
+        stock_id = ensure_stock(conn, symbol) if symbol else None
+        symbol_ids = {}
+        known = set(column_list(conn)) - set(PRICE_COLUMNS) - {"createdAt"}
+
+        records = READERS[kind](path)
+        first = next(records, None)
+        if first is None:
+            return 0, 0
+        if stock_id is None and "stockId" not in first and "symbol" not in first:
+            raise ValueError(f"{path}: no stockId/symbol column - pass a symbol")
+
+        extras = [column for column in first if column in known]
+        columns = PRICE_COLUMNS + tuple(extras)
+        # Checked on the first batch, before anything is written
+        check_tz = is_naive(first["timestamp"])
+
+        read = inserted = 0
+        batch = []
+
+        def flush():
+            nonlocal inserted, check_tz
+            if check_tz:
+                check_naive_tz(path, [row[2] for row in batch], naive_tz)
+                check_tz = False
+            inserted += bulk_insert(conn, batch, columns, source=f"import:{os.path.basename(path)}",
+                                    validate=validate)
+            conn.commit()
+            batch.clear()
+
+        for record in _chain(first, records):
+            if stock_id is None and "stockId" not in record and record["symbol"] not in symbol_ids:
+                symbol_ids[record["symbol"]] = ensure_stock(conn, record["symbol"], record.get("stockName"))
+            batch.append(_normalise(record, stock_id, stock_map, symbol_ids, extras, naive_tz))
+            read += 1
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+
+        logger.info(f"  ✅ {path}: read {read}, inserted {inserted}")
+        return read, inserted
+    finally:
+        conn.close()
+
+
+def _chain(first, rest):
+    yield first
+    yield from rest
+
+
+def collect_files(paths):
+    """Expand directories into importable files (stocks.csv is handled separately)"""
+    files, stock_files = [], []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in sorted(names):
+                    full = os.path.join(root, name)
+                    if name == "stocks.csv":
+                        stock_files.append(full)
+                    elif not name.endswith((".part", ".tmp")) and name != "manifest.json":
+                        try:
+                            file_kind(full)
+                        except ValueError:
+                            continue
+                        files.append(full)
+        elif os.path.basename(path) == "stocks.csv":
+            stock_files.append(path)
+        else:
+            files.append(path)
+    return stock_files, files
+
+
+def run_import(paths, symbol=None, jobs=4, naive_tz=IST, batch_size=BATCH_SIZE, validate=True):
+    """Import files with up to `jobs` worker processes; returns rows inserted"""
+    from .live import ensure_tables
+
+    stock_files, files = collect_files(paths)
+
+    conn = connect()
+    try:
+        ensure_tables(conn)
+        stock_map = {}
+        for path in stock_files + [f for f in files if file_kind(f) == "sql"]:
+            stock_map.update(load_stock_map(conn, path))
+    finally:
+        conn.close()
+
+    logger.info(f"📥 Importing {len(files)} files with {jobs} workers")
+    total_read = total_inserted = 0
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            pool.submit(import_file, path, symbol, stock_map, naive_tz, batch_size, validate): path
+            for path in files
+        }
+        for future in as_completed(futures):
+            try:
+                read, inserted = future.result()
+            except Exception as e:
+                logger.error(f"❌ {futures[future]}: {e}")
+                continue
+            total_read += read
+            total_inserted += inserted
+
+    logger.info(f"🏁 Read {total_read} rows, inserted {total_inserted}")
+    return total_inserted
@@ -0,0 +1,289 @@
+"""
+Precomputed "StockInsight" rows
+
+For every stock and chart timeframe we derive the same fields InsightsPanel
+shows (trend, momentum, volatility, volume, support/resistance) from one read
+of the last year of candles. Features for all (stock, timeframe) pairs are
+collected first and the labelling rules are then applied with NumPy over the
+whole batch; the result is upserted in a single statement.
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+from logzero import logger
+from psycopg2.extras import execute_values
+
+from .candles import get_candles
+
+# Same windows as /api/stocks/[symbol]/data, anchored at the latest candle
+TIMEFRAMES = {
+    "1d": None,  # the latest trading day
+    "1w": timedelta(days=7),
+    "1m": timedelta(days=30),
+    "3m": timedelta(days=90),
+    "6m": timedelta(days=180),
+    "1y": timedelta(days=365),
+}
+
+MAX_BARS = 250          # windows are bucketed to at most this many bars
+SWING_ORDER = 3         # a swing point is the extreme of 2 * order + 1 bars
+MINUTES_PER_YEAR = 375 * 252
+
+FEATURES = (
+    "first", "last", "change_pct", "r2", "return_std", "rsi", "macd",
+    "volatility", "volume_ratio", "support", "resistance",
+)
+
+
+def load_window(conn, stock_id, days=365):
+    """Return (timestamps, high, low, close, volume, rsi, macd) for the last `days`"""
+    with conn.cursor() as cur:
+        cur.execute('SELECT MAX(timestamp) FROM "StockPrice" WHERE "stockId" = %s', (stock_id,))
+        latest = cur.fetchone()[0]
+    if latest is None:
+        return None
+    bars = get_candles(None, latest - timedelta(days=days), latest + timedelta(minutes=1), "1m",
+                       ("high", "low", "close", "volume", "rsi", "macd"), conn=conn, stock_id=stock_id)
+    return (
+        bars["timestamp"].astype("datetime64[s]"),
+        bars["high"],
+        bars["low"],
+        bars["close"],
+        bars["volume"].astype(np.float64),
+        bars["rsi"],
+        bars["macd"],
+    )
+
+
+def bucket_bars(high, low, close, max_bars=MAX_BARS):
+    """Collapse a window into at most `max_bars` bars (max high, min low, last close)"""
+    n = len(close)
+    if n <= max_bars:
+        return high, low, close
+    starts = np.linspace(0, n, max_bars, endpoint=False).astype(np.int64)
+    ends = np.append(starts[1:], n) - 1
+    return np.maximum.reduceat(high, starts), np.minimum.reduceat(low, starts), close[ends]
+
+
+def swing_levels(high, low, last_close, order=SWING_ORDER):
+    """
+    Nearest swing low below and swing high above the last close.
+
+    A bar is a swing high (low) when its high (low) is the extreme of the
+    2 * order + 1 bars centred on it. Falls back to the window low/high when
+    no swing point lies on the right side of the price.
+    """
+    width = 2 * order + 1
+    support, resistance = np.nanmin(low), np.nanmax(high)
+    if len(high) < width:
+        return support, resistance
+
+    highs = np.lib.stride_tricks.sliding_window_view(high, width)
+    lows = np.lib.stride_tricks.sliding_window_view(low, width)
+    centre_high = high[order:len(high) - order]
+    centre_low = low[order:len(low) - order]
+    swing_highs = centre_high[centre_high == highs.max(axis=1)]
+    swing_lows = centre_low[centre_low == lows.min(axis=1)]
+
+    below = swing_lows[swing_lows < last_close]
+    above = swing_highs[swing_highs > last_close]
+    if below.size:
+        support = below.max()
+    if above.size:
+        resistance = above.min()
+    return support, resistance
+
+
+def window_features(timestamps, high, low, close, volume, rsi, macd):
+    """Numeric features for one window, in FEATURES order"""
+    first, last = close[0], close[-1]
+    bucket_high, bucket_low, bucket_close = bucket_bars(high, low, close)
+
+    # Goodness of a straight-line fit through the bucketed closes
+    r2 = 0.0
+    if len(bucket_close) > 2 and np.ptp(bucket_close) > 0:
+        x = np.arange(len(bucket_close), dtype=np.float64)
+        r2 = np.corrcoef(x, bucket_close)[0, 1] ** 2
+
+    bucket_returns = np.diff(np.log(bucket_close))
+    minute_returns = np.diff(np.log(close))
+    volatility = minute_returns.std() * np.sqrt(MINUTES_PER_YEAR) * 100 if minute_returns.size > 1 else np.nan
+
+    tail = max(len(volume) // 4, 1)
+    mean_volume = volume.mean()
+    volume_ratio = volume[-tail:].mean() / mean_volume if mean_volume > 0 else 1.0
+
+    support, resistance = swing_levels(bucket_high, bucket_low, last)
+
+    return (
+        first,
+        last,
+        (last / first - 1) * 100,
+        r2,
+        bucket_returns.std() * 100 if bucket_returns.size > 1 else 0.0,
+        rsi[-1],
+        macd[-1],
+        volatility,
+        volume_ratio,
+        support,
+        resistance,
+    )
+
+
+def timeframe_slices(timestamps):
+    """Map timeframe -> start index into a window anchored at its last candle"""
+    latest = timestamps[-1]
+    starts = {}
+    for timeframe, span in TIMEFRAMES.items():
+        if span is None:
+            cutoff = latest.astype("datetime64[D]").astype("datetime64[s]")
+        else:
+            cutoff = latest - np.timedelta64(int(span.total_seconds()), "s")
+        starts[timeframe] = int(np.searchsorted(timestamps, cutoff, side="left"))
+    return starts
+
+
+def classify(features):
+    """
+    Apply the labelling rules to a (rows x FEATURES) matrix at once.
+
+    Returns a dict of column name -> array, one entry per row.
+    """
+    f = {name: features[:, i] for i, name in enumerate(FEATURES)}
+
+    # A move counts as a trend when it clears one bar's worth of noise and the
+    # path is reasonably straight
+    significant = (np.abs(f["change_pct"]) > f["return_std"]) & (f["r2"] >= 0.25)
+    trend = np.select(
+        [significant & (f["change_pct"] > 0), significant & (f["change_pct"] < 0)],
+        ["Bullish", "Bearish"],
+        "Neutral",
+    )
+    trend_strength = np.round(np.clip(f["r2"] * 100, 0, 100), 1)
+
+    rsi = f["rsi"]
+    momentum = np.select(
+        [np.isnan(rsi), rsi > 70, rsi > 60, rsi > 50, rsi > 40],
+        ["Neutral", "Overbought", "Strong Buy", "Buy", "Sell"],
+        "Oversold",
+    )
+
+    vol = f["volatility"]
+    volatility = np.select([vol > 40, vol > 20], ["High", "Medium"], "Low")
+
+    ratio = f["volume_ratio"]
+    volume_analysis = np.select([ratio > 1.2, ratio < 0.8], ["Increasing", "Decreasing"], "Stable")
+
+    return {
+        "trend": trend,
+        "trendStrength": trend_strength,
+        "momentum": momentum,
+        "volatility": volatility,
+        "volumeAnalysis": volume_analysis,
+        "supportLevel": np.round(f["support"], 2),
+        "resistanceLevel": np.round(f["resistance"], 2),
+    }
+
+
+def _summary(labels, features_row, symbol, timeframe):
+    rsi = features_row[FEATURES.index("rsi")]
+    macd = features_row[FEATURES.index("macd")]
+    change = features_row[FEATURES.index("change_pct")]
+    rsi_text = f"{rsi:.2f}" if not np.isnan(rsi) else "N/A"
+    macd_text = f"{macd:.2f}" if not np.isnan(macd) else "N/A"
+    return (
+        f"{symbol} is {change:+.2f}% over {timeframe} with a {labels['trend'].lower()} trend "
+        f"({labels['trendStrength']:.0f}% strength). RSI: {rsi_text}, MACD: {macd_text}. "
+        f"Momentum is {labels['momentum'].lower()}, volatility {labels['volatility'].lower()}, "
+        f"volume {labels['volumeAnalysis'].lower()}. "
+        f"Support ₹{labels['supportLevel']:.2f}, resistance ₹{labels['resistanceLevel']:.2f}."
+    )
+
+
+def compute_insights(conn, stocks):
+    """Build insight rows for [(stock_id, symbol)] - one DB read per stock"""
+    keys, rows = [], []
+    for stock_id, symbol in stocks:
+        window = load_window(conn, stock_id)
+        if window is None or len(window[0]) < 2:
+            logger.warning(f"⚠️  Not enough data for {symbol}, skipping insights")
+            continue
+        for timeframe, start in timeframe_slices(window[0]).items():
+            if len(window[0]) - start < 2:
+                continue
+            keys.append((stock_id, symbol, timeframe))
+            rows.append(window_features(*(column[start:] for column in window)))
+
+    if not rows:
+        return []
+
+    features = np.array(rows, dtype=np.float64)
+    labels = classify(features)
+
+    insights = []
+    for i, (stock_id, symbol, timeframe) in enumerate(keys):
+        row_labels = {name: values[i].item() for name, values in labels.items()}
+        row_labels["summary"] = _summary(row_labels, features[i], symbol, timeframe)
+        insights.append((stock_id, timeframe, row_labels))
+    return insights
+
+
+def upsert_insights(conn, insights):
+    """Write all insight rows with one INSERT ... ON CONFLICT statement"""
+    if not insights:
+        return 0
+
+    now = datetime.now()
+    values = [
+        (
+            f"insight_{stock_id}_{timeframe}",
+            stock_id,
+            timeframe,
+            labels["trend"],
+            labels["trendStrength"],
+            labels["momentum"],
+            labels["volatility"],
+            labels["volumeAnalysis"],
+            labels["supportLevel"],
+            labels["resistanceLevel"],
+            labels["summary"],
+            now,
+        )
+        for stock_id, timeframe, labels in insights
+    ]
+
+    with conn.cursor() as cur:
+        execute_values(cur, """
+            INSERT INTO "StockInsight"
+            (id, "stockId", timeframe, trend, "trendStrength", momentum, volatility,
+             "volumeAnalysis", "supportLevel", "resistanceLevel", summary, "generatedAt")
+            VALUES %s
+            ON CONFLICT ("stockId", timeframe) DO UPDATE SET
+                trend = EXCLUDED.trend,
+                "trendStrength" = EXCLUDED."trendStrength",
+                momentum = EXCLUDED.momentum,
+                volatility = EXCLUDED.volatility,
+                "volumeAnalysis" = EXCLUDED."volumeAnalysis",
+                "supportLevel" = EXCLUDED."supportLevel",
+                "resistanceLevel" = EXCLUDED."resistanceLevel",
+                summary = EXCLUDED.summary,
+                "generatedAt" = EXCLUDED."generatedAt"
+        """, values, page_size=len(values))
+    conn.commit()
+    return len(values)
+
+
+def generate_insights(conn, symbols=None):
+    """Compute and store insights for the given symbols (default: all stocks)"""
+    with conn.cursor() as cur:
+        if symbols:
+            cur.execute('SELECT id, symbol FROM "Stock" WHERE symbol = ANY(%s) ORDER BY symbol', (list(symbols),))
+        else:
+            cur.execute('SELECT id, symbol FROM "Stock" ORDER BY symbol')
+        stocks = cur.fetchall()
+
+    insights = compute_insights(conn, stocks)
+    written = upsert_insights(conn, insights)
+    logger.info(f"✅ Upserted {written} insights for {len(stocks)} stocks")
+    return written
@@ -0,0 +1,190 @@
+"""
+Latest-candle snapshot per stock for cross-sectional screening
+
+"StockLatest" holds one row per stock: its most recent candle with all
+indicator columns, the session so far (high, low, volume, change against
+the previous session's close) and longer-range stats (52-week high/low,
+average daily volume of the previous 20 sessions). Screening the whole
+universe is then one read of as many rows as there are stocks instead of a
+latest-row search per symbol in "StockPrice".
+
+update_latest() is cheap (index seeks into the last session) and runs
+wherever candles or indicators are written; it extends the 52-week range
+with the session's high/low. refresh_stats() recomputes the 52-week range
+and average volume from daily aggregates and runs with the indicator job.
+
+    from istocks.latest import screen
+    screen(conn, "adx > 25 and rsi < 40", sort="rsi")    # pandas DataFrame
+"""
+
+import io
+
+import numpy as np
+
+from .alerts import compile_condition
+from .replay import SHADOW_PREFIX
+from .streaming import INDICATOR_COLUMNS
+
+CANDLE_COLUMNS = ("open", "high", "low", "close", "volume")
+STAT_COLUMNS = (
+    "prevClose", "dayChange", "dayChangePercent", "sessionHigh", "sessionLow",
+    "sessionVolume", "high52w", "low52w", "avgVolume",
+)
+AVERAGE_SESSIONS = 20
+
+CREATE_TABLE = f"""
+    CREATE TABLE IF NOT EXISTS "StockLatest" (
+        "stockId" TEXT NOT NULL,
+        timestamp TIMESTAMP(3) NOT NULL,
+        open DOUBLE PRECISION NOT NULL,
+        high DOUBLE PRECISION NOT NULL,
+        low DOUBLE PRECISION NOT NULL,
+        close DOUBLE PRECISION NOT NULL,
+        volume BIGINT NOT NULL,
+        {", ".join(f'"{c}" BIGINT' if c == "obv" else f'"{c}" DOUBLE PRECISION' for c in INDICATOR_COLUMNS)},
+        "prevClose" DOUBLE PRECISION,
+        "dayChange" DOUBLE PRECISION,
+        "dayChangePercent" DOUBLE PRECISION,
+        "sessionHigh" DOUBLE PRECISION,
+        "sessionLow" DOUBLE PRECISION,
+        "sessionVolume" BIGINT,
+        "high52w" DOUBLE PRECISION,
+        "low52w" DOUBLE PRECISION,
+        "avgVolume" DOUBLE PRECISION,
+        "updatedAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        CONSTRAINT "StockLatest_pkey" PRIMARY KEY ("stockId"),
+        CONSTRAINT "StockLatest_stockId_fkey" FOREIGN KEY ("stockId")
+            REFERENCES "Stock"(id) ON DELETE CASCADE ON UPDATE CASCADE
+    )
+"""
+
+
+def ensure_table(conn):
+    with conn.cursor() as cur:
+        cur.execute(CREATE_TABLE)
+    conn.commit()
+
+
+def update_latest(conn, stock_ids=None):
+    """
+    Upsert the latest candle, indicators and session stats of `stock_ids`
+    (all stocks but replay shadows when None). Returns rows written; the
+    caller owns the transaction.
+    """
+    copied = CANDLE_COLUMNS + INDICATOR_COLUMNS
+    names = ", ".join(f'"{c}"' for c in copied)
+    values = ", ".join(f'p."{c}"' for c in copied)
+    updates = ", ".join(f'"{c}" = EXCLUDED."{c}"' for c in ("timestamp",) + copied + STAT_COLUMNS[:6])
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            INSERT INTO "StockLatest" ("stockId", timestamp, {names}, "prevClose", "dayChange",
+                "dayChangePercent", "sessionHigh", "sessionLow", "sessionVolume",
+                "high52w", "low52w", "updatedAt")
+            SELECT s.id, p.timestamp, {values}, prev.close, p.close - prev.close,
+                (p.close - prev.close) / NULLIF(prev.close, 0) * 100,
+                session.high, session.low, session.volume, session.high, session.low, NOW()
+            FROM "Stock" s
+            CROSS JOIN LATERAL (
+                SELECT * FROM "StockPrice"
+                WHERE "stockId" = s.id
+                ORDER BY timestamp DESC
+                LIMIT 1
+            ) p
+            LEFT JOIN LATERAL (
+                SELECT close FROM "StockPrice"
+                WHERE "stockId" = s.id AND timestamp < date_trunc('day', p.timestamp)
+                ORDER BY timestamp DESC
+                LIMIT 1
+            ) prev ON TRUE
+            CROSS JOIN LATERAL (
+                SELECT MAX(high) AS high, MIN(low) AS low, SUM(volume) AS volume
+                FROM "StockPrice"
+                WHERE "stockId" = s.id AND timestamp >= date_trunc('day', p.timestamp)
+            ) session
+            WHERE (%s::text[] IS NULL AND s.symbol NOT LIKE %s) OR s.id = ANY(%s::text[])
+            ON CONFLICT ("stockId") DO UPDATE SET
+                {updates},
+                "high52w" = GREATEST("StockLatest"."high52w", EXCLUDED."high52w"),
+                "low52w" = LEAST("StockLatest"."low52w", EXCLUDED."low52w"),
+                "updatedAt" = EXCLUDED."updatedAt"
+        """, (stock_ids, SHADOW_PREFIX + "%", stock_ids))
+        return cur.rowcount
+
+
+def refresh_stats(conn, stock_ids=None):
+    """Recompute 52-week high/low and average daily volume from daily aggregates"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            WITH daily AS (
+                SELECT p."stockId", date_trunc('day', p.timestamp) AS day,
+                       MAX(p.high) AS high, MIN(p.low) AS low, SUM(p.volume) AS volume
+                FROM "StockPrice" p
+                JOIN "StockLatest" l ON l."stockId" = p."stockId"
+                WHERE p.timestamp > l.timestamp - INTERVAL '52 weeks'
+                  AND (%s::text[] IS NULL OR p."stockId" = ANY(%s::text[]))
+                GROUP BY 1, 2
+            ), ranked AS (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY "stockId" ORDER BY day DESC) AS n
+                FROM daily
+            )
+            UPDATE "StockLatest" l
+            SET "high52w" = r.high, "low52w" = r.low, "avgVolume" = r.avg_volume
+            FROM (
+                SELECT "stockId", MAX(high) AS high, MIN(low) AS low,
+                       AVG(volume) FILTER (WHERE n BETWEEN 2 AND %s) AS avg_volume
+                FROM ranked
+                GROUP BY 1
+            ) r
+            WHERE l."stockId" = r."stockId"
+        """, (stock_ids, stock_ids, AVERAGE_SESSIONS + 1))
+        return cur.rowcount
+
+
+def refresh_latest(conn, stock_ids=None):
+    """update_latest() plus refresh_stats(), committed"""
+    ensure_table(conn)
+    written = update_latest(conn, stock_ids)
+    refresh_stats(conn, stock_ids)
+    conn.commit()
+    return written
+
+
+def load_latest(conn, symbols=None):
+    """"StockLatest" joined with symbols as a DataFrame (one row per stock, no replay shadows)"""
+    import pandas as pd
+
+    ensure_table(conn)
+    with conn.cursor() as cur:
+        query = cur.mogrify("""
+            SELECT s.symbol, s.name, l.*
+            FROM "StockLatest" l
+            JOIN "Stock" s ON s.id = l."stockId"
+            WHERE (%s::text[] IS NULL AND s.symbol NOT LIKE %s) OR s.symbol = ANY(%s::text[])
+            ORDER BY s.symbol
+        """, (symbols, SHADOW_PREFIX + "%", symbols)).decode()
+        buffer = io.StringIO()
+        cur.copy_expert(f"COPY ({query}) TO STDOUT WITH CSV HEADER", buffer)
+    buffer.seek(0)
+    return pd.read_csv(buffer, parse_dates=["timestamp", "updatedAt"])
+
+
+def screen(conn, condition, sort=None, descending=False, limit=None, latest=None):
+    """
+    Stocks whose latest row matches `condition` (alert rule syntax without
+    prev/crosses, e.g. "adx > 25 and rsi < 40 and close > 0.9 * high52w").
+
+    The condition is evaluated as NumPy operations over all rows at once.
+    Pass `latest` (from load_latest) to screen the same snapshot repeatedly.
+    """
+    latest = load_latest(conn) if latest is None else latest
+    numeric = CANDLE_COLUMNS + INDICATOR_COLUMNS + STAT_COLUMNS
+    evaluate, depth = compile_condition(condition, set(numeric))
+    if depth:
+        raise ValueError("screens see only the latest candle (no prev/crosses)")
+    columns = {name: latest[name].to_numpy(dtype=float) for name in numeric}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mask = np.broadcast_to(np.asarray(evaluate(lambda offset: columns, 0), dtype=bool), len(latest))
+    matches = latest[mask]
+    if sort:
+        matches = matches.sort_values(sort, ascending=not descending)
+    return matches.head(limit) if limit else matches
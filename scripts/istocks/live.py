@@ -0,0 +1,185 @@
+"""
+Change-aware writes for the live tail of the current session
+
+A candle fetched while it is still forming keeps changing until its minute
+closes, so the live updater re-fetches a short trailing window on every run.
+The fetched candles are compared with the stored OHLCV in memory and only
+rows that are new or actually changed are written: new ones through the
+validated bulk insert, changed ones with a single UPDATE. Unchanged rows
+cost nothing - no write, WAL or index churn.
+
+Indicators of written candles are computed from the stock's streaming
+state (see streaming.py) and written with them. Without it, the earliest
+changed or inserted timestamp per stock is recorded in "IndicatorDirty" so
+the indicator job can recompute from there. Either way the stock's
+"StockLatest" row follows the new tail.
+"""
+
+from psycopg2.extras import execute_values
+
+from . import latest, streaming, validation
+from .candles import invalidate_stock
+from .prices import PRICE_COLUMNS, bulk_insert
+from .streaming import INDICATOR_COLUMNS, stream_rows, update_indicators
+from .validation import validate_rows
+
+# Minutes re-fetched up to the last stored candle so forming candles get corrected
+TRAILING_MINUTES = 15
+PRICE_TOLERANCE = 1e-9
+
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS "IndicatorDirty" (
+        "stockId" TEXT NOT NULL,
+        since TIMESTAMP(3) NOT NULL,
+        "markedAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        CONSTRAINT "IndicatorDirty_pkey" PRIMARY KEY ("stockId"),
+        CONSTRAINT "IndicatorDirty_stockId_fkey" FOREIGN KEY ("stockId")
+            REFERENCES "Stock"(id) ON DELETE CASCADE ON UPDATE CASCADE
+    )
+"""
+
+
+def ensure_table(conn):
+    with conn.cursor() as cur:
+        cur.execute(CREATE_TABLE)
+    conn.commit()
+
+
+def ensure_tables(conn):
+    """
+    Create the tables the ingest path writes next to "StockPrice"
+    (quarantine, dirty marks, streaming state, "StockLatest"); committed.
+    Run once at script start - the write helpers work inside their
+    caller's transaction and do not create tables.
+    """
+    validation.ensure_table(conn)
+    ensure_table(conn)
+    streaming.ensure_table(conn)
+    latest.ensure_table(conn)
+
+
+def stored_tail(conn, stock_id, since):
+    """{timestamp: (open, high, low, close, volume)} of stored candles from `since`"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT timestamp, open, high, low, close, volume
+            FROM "StockPrice"
+            WHERE "stockId" = %s AND timestamp >= %s
+        """, (stock_id, since))
+        return {row[0]: row[1:] for row in cur.fetchall()}
+
+
+def _changed(stored, row):
+    prices_differ = any(abs(a - b) > PRICE_TOLERANCE for a, b in zip(stored[:4], row[3:7]))
+    return prices_differ or stored[4] != row[7]
+
+
+def diff_rows(stored, rows):
+    """Split PRICE_COLUMNS tuples into (new, changed) against stored OHLCV"""
+    new, changed = [], []
+    for row in rows:
+        current = stored.get(row[2])
+        if current is None:
+            new.append(row)
+        elif _changed(current, row):
+            changed.append(row)
+    return new, changed
+
+
+def update_candles(conn, rows):
+    """Overwrite OHLCV of existing (stockId, timestamp) rows; returns rows updated"""
+    if not rows:
+        return 0
+    with conn.cursor() as cur:
+        execute_values(cur, """
+            UPDATE "StockPrice" AS p
+            SET open = v.open, high = v.high, low = v.low, close = v.close, volume = v.volume
+            FROM (VALUES %s) AS v ("stockId", timestamp, open, high, low, close, volume)
+            WHERE p."stockId" = v."stockId" AND p.timestamp = v.timestamp
+        """, [row[1:8] for row in rows],
+            template="(%s, %s::timestamp, %s::double precision, %s::double precision, "
+                     "%s::double precision, %s::double precision, %s::bigint)",
+            page_size=len(rows))
+        return cur.rowcount
+
+
+def mark_dirty(conn, stock_id, since):
+    """Record that indicators of `stock_id` must be recomputed from `since`"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO "IndicatorDirty" ("stockId", since, "markedAt")
+            VALUES (%s, %s, NOW())
+            ON CONFLICT ("stockId") DO UPDATE SET
+                since = LEAST("IndicatorDirty".since, EXCLUDED.since),
+                "markedAt" = EXCLUDED."markedAt"
+        """, (stock_id, since))
+
+
+def dirty_marks(conn, stock_ids=None):
+    """{stockId: (since, markedAt)} of stocks whose indicators need recomputing"""
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('\"IndicatorDirty\"') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            return {}
+        cur.execute("""
+            SELECT "stockId", since, "markedAt" FROM "IndicatorDirty"
+            WHERE %s::text[] IS NULL OR "stockId" = ANY(%s::text[])
+        """, (stock_ids, stock_ids))
+        return {stock_id: (since, marked_at) for stock_id, since, marked_at in cur.fetchall()}
+
+
+def clear_dirty(conn, stock_id, marked_at):
+    """
+    Drop a mark once indicators are recomputed.
+
+    Only the mark read before recomputing (same "markedAt") is removed; a
+    stock re-marked in the meantime keeps its mark for the next run.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            DELETE FROM "IndicatorDirty" WHERE "stockId" = %s AND "markedAt" = %s
+        """, (stock_id, marked_at))
+
+
+def upsert_tail(conn, stock_id, rows, source="live", indicators=True):
+    """
+    Write the re-fetched tail of one stock, touching only new or changed rows.
+
+    `rows` are PRICE_COLUMNS tuples (see prices.candle_rows). With
+    `indicators`, written candles get their indicator columns from the
+    streaming state; otherwise the stock is marked dirty. Returns
+    (inserted, updated). The caller owns the transaction.
+    """
+    if not rows:
+        return 0, 0
+    since = min(row[2] for row in rows)
+    new, changed = diff_rows(stored_tail(conn, stock_id, since), rows)
+    if not new and not changed:
+        return 0, 0
+
+    # Validate only what will be written; the stored candles before the first
+    # of them warm up the rolling checks (validation._load_context)
+    accepted = validate_rows(conn, new + changed, source=source)
+    accepted_ids = {row[0] for row in accepted}
+    changed = [row for row in changed if row[0] in accepted_ids]
+    changed_keys = {row[2] for row in changed}
+    new = [row for row in accepted if row[2] not in changed_keys]
+
+    if not new and not changed:
+        return 0, 0
+    if not indicators:
+        inserted = bulk_insert(conn, new, source=source, validate=False)
+        updated = update_candles(conn, changed)
+        mark_dirty(conn, stock_id, min(row[2] for row in new + changed))
+        latest.update_latest(conn, [stock_id])
+        invalidate_stock(stock_id)
+        return inserted, updated
+
+    new, refreshed = stream_rows(conn, stock_id, new, changed)
+    inserted = bulk_insert(conn, new, columns=PRICE_COLUMNS + INDICATOR_COLUMNS,
+                           source=source, validate=False)
+    updated = update_candles(conn, changed)
+    update_indicators(conn, stock_id, refreshed)
+    latest.update_latest(conn, [stock_id])
+    invalidate_stock(stock_id)
+    return inserted, updated
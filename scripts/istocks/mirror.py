@@ -0,0 +1,265 @@
+"""
+Local DuckDB mirror of "Stock" and "StockPrice" for analytical queries
+
+Large scans and GROUP BYs over years of minute candles run on a columnar,
+vectorized copy instead of the PostgreSQL instance that serves ingest and
+the app. Tables and columns keep their Prisma names, so SQL written for
+Postgres mostly runs unchanged:
+
+    SELECT date_trunc('month', timestamp) AS month, AVG(close)
+    FROM "StockPrice" JOIN "Stock" s ON s.id = "stockId"
+    WHERE s.symbol = 'WIPRO' GROUP BY 1 ORDER BY 1
+
+Sync is incremental per stock, using the mirrored first and last candle
+timestamps as watermarks (kept in "_MirrorState"):
+- new candles after the last watermark are appended,
+- the last `resync_days` are re-copied so recalculated indicators and
+  corrected live candles come through,
+- history backfilled before the first watermark is copied in,
+- `since` re-copies everything from a date (e.g. after gap repair or a full
+  indicator recalculation).
+Every copied range replaces the mirrored rows in that range, so deletions
+inside it are mirrored too. "Stock" is small and replaced on every sync.
+"""
+
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from logzero import logger
+
+from .config import PROJECT_ROOT, load_env
+from .partitions import PRICE_TABLE
+
+DEFAULT_PATH = os.path.join(PROJECT_ROOT, ".cache", "analytics.duckdb")
+STATE_TABLE = "_MirrorState"
+RESYNC_DAYS = 3
+SKIPPED_COLUMNS = {"id"}    # StockPrice cuid; (stockId, timestamp) is the key
+
+# information_schema data_type -> DuckDB type
+TYPES = {
+    "text": "VARCHAR",
+    "character varying": "VARCHAR",
+    "double precision": "DOUBLE",
+    "real": "FLOAT",
+    "bigint": "BIGINT",
+    "integer": "INTEGER",
+    "smallint": "SMALLINT",
+    "boolean": "BOOLEAN",
+    "numeric": "DOUBLE",
+    "timestamp without time zone": "TIMESTAMP",
+    "timestamp with time zone": "TIMESTAMPTZ",
+    "date": "DATE",
+    "jsonb": "JSON",
+    "json": "JSON",
+}
+
+
+def mirror_path():
+    load_env()
+    return os.getenv("ANALYTICS_DB") or DEFAULT_PATH
+
+
+def open_mirror(path=None, read_only=False):
+    """Connect to the DuckDB file; only one process may hold it read-write"""
+    import duckdb
+
+    path = path or mirror_path()
+    if not read_only:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    return duckdb.connect(path, read_only=read_only)
+
+
+def column_types(conn, table):
+    """[(column, DuckDB type)] of a Postgres table in ordinal order"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT column_name, data_type
+            FROM information_schema.columns
+            WHERE table_schema = 'public' AND table_name = %s
+            ORDER BY ordinal_position
+        """, (table,))
+        return [(name, TYPES.get(data_type, "VARCHAR")) for name, data_type in cur.fetchall()]
+
+
+def _quoted(columns):
+    return ", ".join(f'"{c}"' for c in columns)
+
+
+def _copy_to_file(conn, query, params, path):
+    with conn.cursor() as cur:
+        sql = cur.mogrify(query, params).decode()
+        with open(path, "w", newline="") as f:
+            cur.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv)", f)
+    conn.rollback()
+
+
+def _read_csv(path, types):
+    columns = ", ".join(f"'{name}': '{duck_type}'" for name, duck_type in types)
+    return f"read_csv('{path}', header = false, columns = {{{columns}}})"
+
+
+def ensure_tables(duck, price_types):
+    """Create the price and state tables and add columns new in Postgres"""
+    columns = ", ".join(f'"{name}" {duck_type}' for name, duck_type in price_types)
+    duck.execute(f'CREATE TABLE IF NOT EXISTS "{PRICE_TABLE}" ({columns})')
+    existing = {row[0] for row in duck.execute(
+        "SELECT column_name FROM information_schema.columns WHERE table_name = ?", [PRICE_TABLE]
+    ).fetchall()}
+    for name, duck_type in price_types:
+        if name not in existing:
+            duck.execute(f'ALTER TABLE "{PRICE_TABLE}" ADD COLUMN "{name}" {duck_type}')
+    duck.execute(f"""
+        CREATE TABLE IF NOT EXISTS "{STATE_TABLE}" (
+            "stockId"  VARCHAR PRIMARY KEY,
+            "first"    TIMESTAMP,
+            "last"     TIMESTAMP,
+            "syncedAt" TIMESTAMP
+        )
+    """)
+
+
+def sync_stocks(conn, duck, workdir):
+    types = column_types(conn, "Stock")
+    path = os.path.join(workdir, "stock.csv")
+    _copy_to_file(conn, f'SELECT {_quoted(n for n, _ in types)} FROM "Stock"', (), path)
+    duck.execute(f'CREATE OR REPLACE TABLE "Stock" AS SELECT * FROM {_read_csv(path, types)}')
+    return duck.execute('SELECT COUNT(*) FROM "Stock"').fetchone()[0]
+
+
+def price_bounds(conn):
+    """{stockId: (first, last)} from the (stockId, timestamp) index"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT s.id,
+                   (SELECT MIN(timestamp) FROM "StockPrice" WHERE "stockId" = s.id),
+                   (SELECT MAX(timestamp) FROM "StockPrice" WHERE "stockId" = s.id)
+            FROM "Stock" s
+        """)
+        return {stock_id: (first, last) for stock_id, first, last in cur.fetchall() if first is not None}
+
+
+def _year_ranges(start, end):
+    """Split [start, end) at year boundaries to bound the size of one copy"""
+    while start < end:
+        boundary = datetime(start.year + 1, 1, 1)
+        yield start, min(boundary, end)
+        start = boundary
+
+
+def plan_ranges(bounds, state, since=None, resync_days=RESYNC_DAYS):
+    """
+    [(stockId, start, end)] to re-copy, from Postgres bounds and mirror state.
+
+    Ranges are half-open; the end of a stock's tail range is just after its
+    last Postgres candle.
+    """
+    ranges = []
+    for stock_id, (first, last) in bounds.items():
+        stop = last + timedelta(minutes=1)
+        mirrored = state.get(stock_id)
+        if mirrored is None:
+            ranges.append((stock_id, first, stop))
+            continue
+        mirror_first, mirror_last = mirrored
+        tail = mirror_last - timedelta(days=resync_days)
+        if since is not None:
+            tail = min(tail, since)
+        if first < mirror_first:
+            ranges.append((stock_id, first, min(mirror_first, tail)))
+        ranges.append((stock_id, max(tail, first), stop))
+    return ranges
+
+
+def copy_range(conn, duck, stock_id, start, end, price_types, workdir):
+    """Replace the mirrored candles of one stock in [start, end); returns rows copied"""
+    names = [name for name, _ in price_types]
+    path = os.path.join(workdir, "prices.csv")
+    copied = 0
+    for lo, hi in _year_ranges(start, end):
+        _copy_to_file(conn, f"""
+            SELECT {_quoted(names)} FROM "StockPrice"
+            WHERE "stockId" = %s AND timestamp >= %s AND timestamp < %s
+            ORDER BY timestamp
+        """, (stock_id, lo, hi), path)
+        duck.execute("BEGIN")
+        duck.execute(
+            f'DELETE FROM "{PRICE_TABLE}" WHERE "stockId" = ? AND timestamp >= ? AND timestamp < ?',
+            [stock_id, lo, hi],
+        )
+        if os.path.getsize(path):
+            copied += duck.execute(
+                f'INSERT INTO "{PRICE_TABLE}" ({_quoted(names)}) SELECT * FROM {_read_csv(path, price_types)}'
+            ).fetchone()[0]
+        duck.execute("COMMIT")
+    return copied
+
+
+def sync(conn, duck, full=False, since=None, resync_days=RESYNC_DAYS):
+    """
+    Bring the mirror up to date with Postgres.
+
+    `full` drops the mirrored prices and copies everything again. Returns
+    {"stocks": n, "ranges": n, "rows": n} for the run.
+    """
+    price_types = [(n, t) for n, t in column_types(conn, PRICE_TABLE) if n not in SKIPPED_COLUMNS]
+    if full:
+        duck.execute(f'DROP TABLE IF EXISTS "{PRICE_TABLE}"')
+        duck.execute(f'DROP TABLE IF EXISTS "{STATE_TABLE}"')
+    ensure_tables(duck, price_types)
+
+    with tempfile.TemporaryDirectory(prefix="istocks-mirror-") as workdir:
+        stocks = sync_stocks(conn, duck, workdir)
+        bounds = price_bounds(conn)
+        state = {
+            stock_id: (first, last) for stock_id, first, last in
+            duck.execute(f'SELECT "stockId", "first", "last" FROM "{STATE_TABLE}"').fetchall()
+        }
+
+        # Stocks deleted (or emptied) in Postgres
+        gone = [stock_id for stock_id in state if stock_id not in bounds]
+        for stock_id in gone:
+            duck.execute(f'DELETE FROM "{PRICE_TABLE}" WHERE "stockId" = ?', [stock_id])
+            duck.execute(f'DELETE FROM "{STATE_TABLE}" WHERE "stockId" = ?', [stock_id])
+
+        ranges = plan_ranges(bounds, state, since, resync_days)
+        rows = 0
+        for stock_id, start, end in ranges:
+            rows += copy_range(conn, duck, stock_id, start, end, price_types, workdir)
+
+        now = datetime.now()
+        for stock_id, (first, last) in bounds.items():
+            # History trimmed in Postgres stays in the mirror
+            if stock_id in state:
+                first = min(first, state[stock_id][0])
+            duck.execute(f"""
+                INSERT INTO "{STATE_TABLE}" VALUES (?, ?, ?, ?)
+                ON CONFLICT ("stockId") DO UPDATE
+                SET "first" = excluded."first", "last" = excluded."last", "syncedAt" = excluded."syncedAt"
+            """, [stock_id, first, last, now])
+
+    if gone:
+        logger.info(f"🗑️  Removed {len(gone)} stocks no longer in Postgres")
+    logger.info(f"✅ Mirrored {rows:,} candles in {len(ranges)} ranges ({stocks} stocks)")
+    return {"stocks": stocks, "ranges": len(ranges), "rows": rows}
+
+
+def mirror_status(duck):
+    """[(symbol, candles, first, last, syncedAt)] per mirrored stock"""
+    return duck.execute(f"""
+        SELECT s.symbol, COUNT(p.timestamp), m."first", m."last", m."syncedAt"
+        FROM "{STATE_TABLE}" m
+        JOIN "Stock" s ON s.id = m."stockId"
+        LEFT JOIN "{PRICE_TABLE}" p ON p."stockId" = m."stockId"
+        GROUP BY s.symbol, m."first", m."last", m."syncedAt"
+        ORDER BY s.symbol
+    """).fetchall()
+
+
+def query(sql, params=None, path=None):
+    """Run `sql` against the mirror (read-only) and return a pandas DataFrame"""
+    duck = open_mirror(path, read_only=True)
+    try:
+        return duck.execute(sql, params or []).df()
+    finally:
+        duck.close()
@@ -0,0 +1,383 @@
+"""
+Monthly range partitioning for "StockPrice"
+
+Layout after migration:
+
+    "StockPrice"                      PARTITION BY RANGE ("timestamp")
+      "StockPrice_p202510"            FOR VALUES FROM ('2025-10-01') TO ('2025-11-01')
+        [optional] "StockPrice_p202510_h0..hN"   PARTITION BY HASH ("stockId")
+      ...
+      "StockPrice_default"            DEFAULT (safety net, normally empty)
+
+The B-tree on "timestamp" is replaced by a BRIN index: minute bars are appended
+in time order, so a BRIN summary per block range is tiny and almost free to
+maintain during ingest, while range scans are already pruned to the relevant
+monthly partitions.
+"""
+
+from datetime import date, datetime
+
+from logzero import logger
+
+PRICE_TABLE = "StockPrice"
+STAGING_TABLE = "StockPrice_partitioned"
+LEGACY_TABLE = "StockPrice_legacy"
+DEFAULT_PARTITION = "StockPrice_default"
+
+BRIN_PAGES_PER_RANGE = 32
+
+# Prisma-generated names that must survive the table swap
+INDEX_NAMES = {
+    "unique": "StockPrice_stockId_timestamp_key",
+    "stock_time": "StockPrice_stockId_timestamp_idx",
+    "time": "StockPrice_timestamp_idx",
+}
+PKEY_NAME = "StockPrice_pkey"
+FKEY_NAME = "StockPrice_stockId_fkey"
+
+# Keys of rows written to the heap while it is being copied
+CHANGES_TABLE = "StockPrice_migrate_changes"
+CAPTURE_TRIGGER = "stockprice_migrate_capture"
+
+
+def month_start(value):
+    """First day of the month containing a date/datetime"""
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    """Shift a month-start date by a number of months"""
+    index = month.year * 12 + (month.month - 1) + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def iter_months(first, last):
+    """Yield month-start dates from first to last inclusive"""
+    month = month_start(first)
+    last = month_start(last)
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def partition_name(month, table=PRICE_TABLE):
+    """Name of the monthly partition holding `month`"""
+    return f"{table}_p{month.year:04d}{month.month:02d}"
+
+
+def is_partitioned(conn, table=PRICE_TABLE):
+    """True if `table` exists and is a partitioned table"""
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT relkind FROM pg_class WHERE relname = %s AND relnamespace = 'public'::regnamespace",
+            (table,),
+        )
+        row = cur.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def table_exists(conn, table):
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL", (f'public."{table}"',))
+        return cur.fetchone()[0]
+
+
+def hash_buckets(conn, table=PRICE_TABLE):
+    """Number of stockId hash sub-partitions per month (0 for plain range layout)"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT COUNT(*)
+            FROM pg_inherits i
+            JOIN pg_class parent ON parent.oid = i.inhparent
+            JOIN pg_class child ON child.oid = i.inhrelid
+            WHERE parent.relname = (
+                SELECT c.relname
+                FROM pg_inherits pi
+                JOIN pg_class c ON c.oid = pi.inhrelid
+                JOIN pg_class p ON p.oid = pi.inhparent
+                WHERE p.relname = %s AND c.relkind = 'p'
+                ORDER BY c.relname DESC
+                LIMIT 1
+            )
+        """, (table,))
+        return cur.fetchone()[0]
+
+
+def list_partitions(conn, table=PRICE_TABLE):
+    """Return [(name, bounds, estimated_rows, total_bytes)] for direct partitions"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT c.relname,
+                   pg_get_expr(c.relpartbound, c.oid),
+                   COALESCE((
+                       SELECT SUM(GREATEST(l.reltuples, 0))::bigint
+                       FROM pg_partition_tree(c.oid) t
+                       JOIN pg_class l ON l.oid = t.relid
+                       WHERE t.isleaf
+                   ), 0),
+                   COALESCE((
+                       SELECT SUM(pg_total_relation_size(t.relid))
+                       FROM pg_partition_tree(c.oid) t
+                   ), 0)
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = %s
+            ORDER BY c.relname
+        """, (table,))
+        return cur.fetchall()
+
+
+def column_list(conn, table=PRICE_TABLE):
+    """Column names of a table in ordinal order"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_schema = 'public' AND table_name = %s
+            ORDER BY ordinal_position
+        """, (table,))
+        return [row[0] for row in cur.fetchall()]
+
+
+def _quoted(columns):
+    return ", ".join(f'"{c}"' for c in columns)
+
+
+def _create_parent(cur, source, target, buckets, suffix):
+    """Create the empty partitioned parent with Prisma-compatible indexes"""
+    cur.execute(f"""
+        CREATE TABLE "{target}" (LIKE "{source}" INCLUDING DEFAULTS)
+        PARTITION BY RANGE ("timestamp")
+    """)
+    # Unique constraints on a partitioned table must contain every partition key;
+    # the same key with or without hash buckets, as declared in schema.prisma
+    cur.execute(f'ALTER TABLE "{target}" ADD CONSTRAINT "{PKEY_NAME}{suffix}" PRIMARY KEY ("id", "stockId", "timestamp")')
+    cur.execute(f"""
+        ALTER TABLE "{target}" ADD CONSTRAINT "{FKEY_NAME}{suffix}"
+        FOREIGN KEY ("stockId") REFERENCES "Stock"(id) ON DELETE CASCADE ON UPDATE CASCADE
+    """)
+    cur.execute(f'CREATE UNIQUE INDEX "{INDEX_NAMES["unique"]}{suffix}" ON "{target}" ("stockId", "timestamp")')
+    cur.execute(f'CREATE INDEX "{INDEX_NAMES["stock_time"]}{suffix}" ON "{target}" ("stockId", "timestamp" DESC)')
+    cur.execute(f"""
+        CREATE INDEX "{INDEX_NAMES["time"]}{suffix}" ON "{target}"
+        USING brin ("timestamp") WITH (pages_per_range = {BRIN_PAGES_PER_RANGE})
+    """)
+    cur.execute(f'CREATE TABLE "{target}_default" PARTITION OF "{target}" DEFAULT')
+
+
+def create_month_partition(conn, month, table=PRICE_TABLE, buckets=None):
+    """
+    Create the partition for `month` if it does not exist yet.
+
+    The partition is built detached, back-filled from the DEFAULT partition
+    if rows for that month landed there, and then attached - attaching a new
+    range next to a non-empty DEFAULT partition would otherwise fail.
+    Returns True if a partition was created.
+    """
+    name = partition_name(month, table)
+    if table_exists(conn, name):
+        return False
+    if buckets is None:
+        buckets = hash_buckets(conn, table)
+
+    lower, upper = month, add_months(month, 1)
+    default = f"{table}_default"
+
+    with conn.cursor() as cur:
+        if buckets:
+            cur.execute(f"""
+                CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS)
+                PARTITION BY HASH ("stockId")
+            """)
+            for remainder in range(buckets):
+                cur.execute(f"""
+                    CREATE TABLE "{name}_h{remainder}" PARTITION OF "{name}"
+                    FOR VALUES WITH (MODULUS {buckets}, REMAINDER {remainder})
+                """)
+        else:
+            cur.execute(f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS)')
+
+        moved = 0
+        if table_exists(conn, default):
+            cur.execute(f"""
+                WITH moved AS (
+                    DELETE FROM "{default}"
+                    WHERE "timestamp" >= %s AND "timestamp" < %s
+                    RETURNING *
+                )
+                INSERT INTO "{name}" SELECT * FROM moved
+            """, (lower, upper))
+            moved = cur.rowcount
+
+        cur.execute(f"""
+            ALTER TABLE "{table}" ATTACH PARTITION "{name}"
+            FOR VALUES FROM (%s) TO (%s)
+        """, (lower, upper))
+    conn.commit()
+
+    if moved:
+        logger.info(f"  moved {moved} rows from {default} into {name}")
+    logger.info(f"✅ Created partition {name} [{lower} .. {upper})")
+    return True
+
+
+def ensure_future_partitions(conn, months_ahead=3, table=PRICE_TABLE, today=None):
+    """Pre-create partitions for the current month and `months_ahead` after it"""
+    current = month_start(today or datetime.now())
+    created = 0
+    for month in iter_months(current, add_months(current, months_ahead)):
+        if create_month_partition(conn, month, table):
+            created += 1
+    return created
+
+
+def partition_for(conn, timestamp, table=PRICE_TABLE):
+    """
+    Name of the table a bulk load for `timestamp` should write into.
+
+    Returns the monthly partition when the table is partitioned and that
+    partition exists, otherwise the parent table itself.
+    """
+    if not is_partitioned(conn, table):
+        return table
+    name = partition_name(month_start(timestamp), table)
+    return name if table_exists(conn, name) else table
+
+
+def _capture_changes(cur, table=PRICE_TABLE):
+    """Record the (stockId, timestamp) of every row written to `table` from now on"""
+    cur.execute(f'''
+        CREATE UNLOGGED TABLE IF NOT EXISTS "{CHANGES_TABLE}" (
+            "stockId" TEXT NOT NULL,
+            "timestamp" TIMESTAMP(3) NOT NULL
+        )
+    ''')
+    cur.execute(f"""
+        CREATE OR REPLACE FUNCTION {CAPTURE_TRIGGER}() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                INSERT INTO "{CHANGES_TABLE}" VALUES (OLD."stockId", OLD."timestamp");
+            END IF;
+            IF TG_OP <> 'DELETE' THEN
+                INSERT INTO "{CHANGES_TABLE}" VALUES (NEW."stockId", NEW."timestamp");
+            END IF;
+            RETURN NULL;
+        END $$
+    """)
+    cur.execute(f'DROP TRIGGER IF EXISTS "{CAPTURE_TRIGGER}" ON "{table}"')
+    cur.execute(f"""
+        CREATE TRIGGER "{CAPTURE_TRIGGER}" AFTER INSERT OR UPDATE OR DELETE ON "{table}"
+        FOR EACH ROW EXECUTE FUNCTION {CAPTURE_TRIGGER}()
+    """)
+
+
+def migrate(conn, buckets=0, months_ahead=3, drop_legacy=False):
+    """
+    Migrate a plain "StockPrice" heap table to monthly range partitions.
+
+    Rows are copied month by month into a staging parent with one commit per
+    month, so an interrupted run can simply be restarted. A trigger records
+    the keys of rows inserted, updated or deleted in the heap meanwhile (e.g.
+    indicator recalculations); the final swap takes an exclusive lock,
+    re-syncs exactly those rows, and renames tables and indexes so that
+    Prisma keeps seeing the same names.
+    """
+    if is_partitioned(conn):
+        logger.info(f'"{PRICE_TABLE}" is already partitioned - nothing to migrate')
+        return False
+
+    suffix = "_new"
+    with conn.cursor() as cur:
+        if not table_exists(conn, STAGING_TABLE):
+            _create_parent(cur, PRICE_TABLE, STAGING_TABLE, buckets, suffix)
+            conn.commit()
+            logger.info(f'✅ Created partitioned staging table "{STAGING_TABLE}"')
+
+        _capture_changes(cur)
+        conn.commit()
+
+        cur.execute(f'SELECT MIN("timestamp"), MAX("timestamp") FROM "{PRICE_TABLE}"')
+        first, last = cur.fetchone()
+
+    today = datetime.now()
+    first = first or today
+    last = max(last or today, today)
+    months = list(iter_months(first, add_months(month_start(last), months_ahead)))
+
+    for month in months:
+        create_month_partition(conn, month, STAGING_TABLE, buckets)
+
+    names = column_list(conn, PRICE_TABLE)
+    columns = _quoted(names)
+    excluded = ", ".join(f'EXCLUDED."{c}"' for c in names)
+    copy_sql = f"""
+        INSERT INTO "{STAGING_TABLE}" ({columns})
+        SELECT {columns} FROM "{PRICE_TABLE}"
+        WHERE "timestamp" >= %s AND "timestamp" < %s
+        ON CONFLICT ("stockId", "timestamp") DO UPDATE SET
+            ({columns}) = ({excluded})
+        WHERE ROW("{STAGING_TABLE}".*) IS DISTINCT FROM ROW(EXCLUDED.*)
+    """
+
+    with conn.cursor() as cur:
+        for month in months:
+            if month > month_start(last):
+                break
+            cur.execute(copy_sql, (month, add_months(month, 1)))
+            conn.commit()
+            if cur.rowcount:
+                logger.info(f"  {month:%Y-%m}: copied {cur.rowcount} rows")
+
+        # Swap under lock; rows written since the bulk copy started are re-synced here
+        cur.execute(f'LOCK TABLE "{PRICE_TABLE}" IN EXCLUSIVE MODE')
+        cur.execute(f'''
+            DELETE FROM "{STAGING_TABLE}" s USING "{CHANGES_TABLE}" c
+            WHERE s."stockId" = c."stockId" AND s."timestamp" = c."timestamp"
+        ''')
+        cur.execute(f'''
+            INSERT INTO "{STAGING_TABLE}" ({columns})
+            SELECT {columns} FROM "{PRICE_TABLE}" p
+            WHERE EXISTS (
+                SELECT 1 FROM "{CHANGES_TABLE}" c
+                WHERE c."stockId" = p."stockId" AND c."timestamp" = p."timestamp"
+            )
+        ''')
+        logger.info(f"  catch-up re-synced {cur.rowcount} rows")
+        cur.execute(f'DROP TRIGGER "{CAPTURE_TRIGGER}" ON "{PRICE_TABLE}"')
+        cur.execute(f'DROP FUNCTION {CAPTURE_TRIGGER}()')
+        cur.execute(f'DROP TABLE "{CHANGES_TABLE}"')
+
+        cur.execute(f'ALTER TABLE "{PRICE_TABLE}" RENAME TO "{LEGACY_TABLE}"')
+        cur.execute(f'ALTER TABLE "{LEGACY_TABLE}" RENAME CONSTRAINT "{FKEY_NAME}" TO "{FKEY_NAME}_legacy"')
+        cur.execute(f'ALTER INDEX "{PKEY_NAME}" RENAME TO "{PKEY_NAME}_legacy"')
+        for index in INDEX_NAMES.values():
+            cur.execute(f'ALTER INDEX IF EXISTS "{index}" RENAME TO "{index}_legacy"')
+
+        cur.execute(f'ALTER TABLE "{STAGING_TABLE}" RENAME TO "{PRICE_TABLE}"')
+        cur.execute(f'ALTER TABLE "{PRICE_TABLE}" RENAME CONSTRAINT "{FKEY_NAME}{suffix}" TO "{FKEY_NAME}"')
+        cur.execute(f'ALTER INDEX "{PKEY_NAME}{suffix}" RENAME TO "{PKEY_NAME}"')
+        for index in INDEX_NAMES.values():
+            cur.execute(f'ALTER INDEX "{index}{suffix}" RENAME TO "{index}"')
+        cur.execute(f'ALTER TABLE "{STAGING_TABLE}_default" RENAME TO "{DEFAULT_PARTITION}"')
+        for month in months:
+            old = partition_name(month, STAGING_TABLE)
+            cur.execute(f'ALTER TABLE IF EXISTS "{old}" RENAME TO "{partition_name(month)}"')
+            for remainder in range(buckets):
+                cur.execute(
+                    f'ALTER TABLE IF EXISTS "{old}_h{remainder}" '
+                    f'RENAME TO "{partition_name(month)}_h{remainder}"'
+                )
+
+        if drop_legacy:
+            cur.execute(f'DROP TABLE "{LEGACY_TABLE}"')
+    conn.commit()
+
+    logger.info(f'✅ "{PRICE_TABLE}" is now partitioned into {len(months)} monthly partitions')
+    if not drop_legacy:
+        logger.info(f'   Old heap kept as "{LEGACY_TABLE}" - drop it once verified')
+
+    with conn.cursor() as cur:
+        cur.execute(f'ANALYZE "{PRICE_TABLE}"')
+    conn.commit()
+    return True
@@ -0,0 +1,212 @@
+"""
+In-process DAG scheduler for per-symbol pipeline stages
+
+Stages form a dependency graph that is run once per symbol. A symbol's
+stage starts as soon as that symbol's upstream stages are done, on the
+thread pool of its stage, so later stages of finished symbols overlap with
+earlier stages of the others: with fetch -> validate -> indicators ->
+insights, a symbol's indicators are computed while the next symbols are
+still being fetched, and the wall time approaches that of the slowest stage
+rather than the sum of all of them.
+
+    pipeline = Pipeline([
+        Stage("fetch", fetch, pool="fetch"),
+        Stage("validate", validate, after=("fetch",)),
+        Stage("indicators", indicators, after=("validate",)),
+    ], workers={"fetch": 2, "default": 4})
+    report = pipeline.run(["WIPRO", "VEDL"])
+
+Stage functions are called as fn(symbol, upstream) where `upstream` maps
+the names of the symbol's finished stages to their return values. Failed
+attempts are retried with exponential backoff; a stage that keeps failing
+skips its dependents for that symbol only.
+"""
+
+import heapq
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+from logzero import logger
+
+
+@dataclass
+class Stage:
+    name: str
+    run: object                 # fn(symbol, upstream) -> result
+    after: tuple = ()
+    pool: str = "default"
+    retries: int = 2
+    backoff: float = 2.0        # seconds before the first retry, doubled per attempt
+
+
+@dataclass
+class TaskRecord:
+    symbol: str
+    stage: str
+    status: str = "pending"     # pending, done, failed, skipped
+    attempts: int = 0
+    queued: float = 0.0         # time.monotonic() when it became runnable
+    started: float = 0.0
+    finished: float = 0.0
+    seconds: float = 0.0        # time spent running, over all attempts
+    error: str = None
+
+
+@dataclass
+class PipelineReport:
+    stages: list
+    records: dict               # (symbol, stage) -> TaskRecord
+    wall: float = 0.0
+    results: dict = field(default_factory=dict)     # symbol -> {stage: result}
+
+    def stage_summary(self):
+        """[(stage, done, failed, skipped, busy seconds, mean, max, mean wait)]"""
+        summary = []
+        for stage in self.stages:
+            records = [r for (_, name), r in self.records.items() if name == stage.name]
+            done = [r for r in records if r.status == "done"]
+            ran = [r for r in records if r.attempts]
+            busy = sum(r.seconds for r in ran)
+            waits = [r.started - r.queued for r in ran]
+            summary.append((
+                stage.name, len(done),
+                sum(r.status == "failed" for r in records),
+                sum(r.status == "skipped" for r in records),
+                busy,
+                busy / len(ran) if ran else 0.0,
+                max((r.seconds for r in ran), default=0.0),
+                sum(waits) / len(waits) if waits else 0.0,
+            ))
+        return summary
+
+    def failed(self):
+        return [r for r in self.records.values() if r.status == "failed"]
+
+    def log(self):
+        busy_total = 0.0
+        logger.info(f"{'stage':<14} {'done':>6} {'failed':>6} {'skipped':>7} {'busy s':>9} {'mean s':>8} {'max s':>8} {'wait s':>8}")
+        for name, done, failed, skipped, busy, mean, longest, waited in self.stage_summary():
+            busy_total += busy
+            logger.info(f"{name:<14} {done:>6} {failed:>6} {skipped:>7} {busy:>9.2f} {mean:>8.2f} {longest:>8.2f} {waited:>8.2f}")
+        logger.info(f"⏱️  Wall time {self.wall:.2f}s for {busy_total:.2f}s of stage work")
+        for record in self.failed():
+            logger.error(f"❌ {record.symbol} {record.stage} after {record.attempts} attempts: {record.error}")
+
+
+def _ordered(stages):
+    """Stages in dependency order; raises ValueError on unknown or cyclic dependencies"""
+    by_name = {stage.name: stage for stage in stages}
+    if len(by_name) != len(stages):
+        raise ValueError("duplicate stage names")
+    ordered, state = [], {}
+
+    def visit(stage, path):
+        if state.get(stage.name) == "done":
+            return
+        if state.get(stage.name) == "visiting":
+            raise ValueError(f"dependency cycle: {' -> '.join(path + [stage.name])}")
+        state[stage.name] = "visiting"
+        for dependency in stage.after:
+            if dependency not in by_name:
+                raise ValueError(f"{stage.name} depends on unknown stage {dependency!r}")
+            visit(by_name[dependency], path + [stage.name])
+        state[stage.name] = "done"
+        ordered.append(stage)
+
+    for stage in stages:
+        visit(stage, [])
+    return ordered
+
+
+def _timed(fn, symbol, upstream):
+    started = time.monotonic()
+    try:
+        return fn(symbol, upstream), None, started, time.monotonic()
+    except Exception as e:
+        return None, e, started, time.monotonic()
+
+
+class Pipeline:
+    def __init__(self, stages, workers=None):
+        self.stages = _ordered(list(stages))
+        self.workers = {"default": 4, **(workers or {})}
+        self.dependents = {stage.name: [s for s in self.stages if stage.name in s.after]
+                           for stage in self.stages}
+
+    def run(self, symbols):
+        """Run every stage for every symbol; returns a PipelineReport"""
+        started = time.monotonic()
+        stages = {stage.name: stage for stage in self.stages}
+        records = {(symbol, stage.name): TaskRecord(symbol, stage.name)
+                   for symbol in symbols for stage in self.stages}
+        results = {symbol: {} for symbol in symbols}
+        pools = {pool: ThreadPoolExecutor(max_workers=self.workers.get(pool, self.workers["default"]),
+                                          thread_name_prefix=f"pipeline-{pool}")
+                 for pool in {stage.pool for stage in self.stages}}
+        running = {}        # future -> (symbol, stage)
+        delayed = []        # heap of (ready at, sequence, symbol, stage name) for retries
+        sequence = 0
+
+        def submit(symbol, stage):
+            record = records[(symbol, stage.name)]
+            record.attempts += 1
+            future = pools[stage.pool].submit(_timed, stage.run, symbol, dict(results[symbol]))
+            running[future] = (symbol, stage)
+
+        def ready(symbol, stage):
+            records[(symbol, stage.name)].queued = time.monotonic()
+            submit(symbol, stage)
+
+        def skip_dependents(symbol, stage):
+            for dependent in self.dependents[stage.name]:
+                record = records[(symbol, dependent.name)]
+                if record.status == "pending":
+                    record.status = "skipped"
+                    skip_dependents(symbol, dependent)
+
+        try:
+            for symbol in symbols:
+                for stage in self.stages:
+                    if not stage.after:
+                        ready(symbol, stage)
+
+            while running or delayed:
+                timeout = max(0.0, delayed[0][0] - time.monotonic()) if delayed else None
+                if running:
+                    done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+                else:
+                    time.sleep(timeout)
+                    done = ()
+
+                for future in done:
+                    symbol, stage = running.pop(future)
+                    record = records[(symbol, stage.name)]
+                    value, error, attempt_started, record.finished = future.result()
+                    if record.attempts == 1:
+                        record.started = attempt_started
+                    record.seconds += record.finished - attempt_started
+                    if error is None:
+                        record.status = "done"
+                        results[symbol][stage.name] = value
+                        for dependent in self.dependents[stage.name]:
+                            if all(records[(symbol, d)].status == "done" for d in dependent.after):
+                                ready(symbol, dependent)
+                    elif record.attempts <= stage.retries:
+                        delay = stage.backoff * 2 ** (record.attempts - 1)
+                        logger.warning(f"⚠️  {symbol} {stage.name} failed ({error}), retry in {delay:.0f}s")
+                        sequence += 1
+                        heapq.heappush(delayed, (time.monotonic() + delay, sequence, symbol, stage.name))
+                    else:
+                        record.status = "failed"
+                        record.error = str(error)
+                        skip_dependents(symbol, stage)
+
+                while delayed and delayed[0][0] <= time.monotonic():
+                    _, _, symbol, name = heapq.heappop(delayed)
+                    submit(symbol, stages[name])
+        finally:
+            for pool in pools.values():
+                pool.shutdown(wait=True)
+
+        return PipelineReport(self.stages, records, time.monotonic() - started, results)
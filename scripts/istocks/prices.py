@@ -0,0 +1,103 @@
+"""
+Bulk write path for "StockPrice" rows
+
+Rows are streamed into a temporary staging table with COPY and then merged
+month by month into the matching partition (or the plain table when it is not
+partitioned), so a backfill only ever touches one partition's indexes at a
+time and duplicates are skipped with ON CONFLICT like the fetch scripts do.
+"""
+
+import io
+from datetime import datetime
+
+from .partitions import add_months, month_start, partition_for
+from .validation import validate_rows
+
+PRICE_COLUMNS = ("id", "stockId", "timestamp", "open", "high", "low", "close", "volume")
+
+
+def price_id(stock_id, timestamp):
+    """Deterministic row id, same format as fetch-multi-stock-data.py"""
+    return f"price_{stock_id}_{timestamp.strftime('%Y%m%d%H%M%S')}"
+
+
+def parse_candle_time(value):
+    """Parse an Angel One candle timestamp into a naive IST datetime"""
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+
+
+def candle_rows(stock_id, candles):
+    """Convert Angel One candles [ts, o, h, l, c, v] into PRICE_COLUMNS tuples"""
+    rows = []
+    for candle in candles:
+        timestamp = parse_candle_time(candle[0])
+        rows.append((
+            price_id(stock_id, timestamp),
+            stock_id,
+            timestamp,
+            float(candle[1]),
+            float(candle[2]),
+            float(candle[3]),
+            float(candle[4]),
+            int(candle[5]),
+        ))
+    return rows
+
+
+def _copy_buffer(rows):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(
+            r"\N" if value is None
+            else value.isoformat(sep=' ') if isinstance(value, datetime)
+            else str(value)
+            for value in row
+        ))
+        buffer.write("\n")
+    buffer.seek(0)
+    return buffer
+
+
+def bulk_insert(conn, rows, columns=PRICE_COLUMNS, source=None, validate=True):
+    """
+    Insert rows into "StockPrice", skipping (stockId, timestamp) duplicates.
+
+    With `validate`, rows are first run through the data-quality checks and
+    rejects go to "StockPriceQuarantine" (requires `columns` to start with
+    PRICE_COLUMNS). Returns the number of rows actually inserted. The caller
+    owns the transaction for the inserted rows.
+    """
+    if validate and rows:
+        rows = validate_rows(conn, rows, source=source)
+    if not rows:
+        return 0
+
+    quoted = ", ".join(f'"{c}"' for c in columns)
+    ts_index = columns.index("timestamp")
+    first = min(row[ts_index] for row in rows)
+    last = max(row[ts_index] for row in rows)
+
+    inserted = 0
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            CREATE TEMP TABLE IF NOT EXISTS price_staging
+            (LIKE "StockPrice" INCLUDING DEFAULTS) ON COMMIT DELETE ROWS
+        """)
+        cur.execute("TRUNCATE price_staging")
+        cur.copy_expert(f"COPY price_staging ({quoted}) FROM STDIN", _copy_buffer(rows))
+
+        month = month_start(first)
+        while month <= month_start(last):
+            target = partition_for(conn, month)
+            cur.execute(f"""
+                INSERT INTO "{target}" ({quoted}, "createdAt")
+                SELECT {quoted}, NOW() FROM price_staging
+                WHERE "timestamp" >= %s AND "timestamp" < %s
+                ON CONFLICT ("stockId", "timestamp") DO NOTHING
+            """, (month, add_months(month, 1)))
+            inserted += cur.rowcount
+            month = add_months(month, 1)
+
+    return inserted
@@ -0,0 +1,194 @@
+"""
+Accelerated replay of stored candles through the live ingest path
+
+Stored StockPrice history of some symbols is served by ReplayClient, which
+answers getCandleData like SmartConnect but only with candles that have
+closed on a simulated clock. The replay polls it the way
+auto-fetch-stock-data.py polls Angel One (trailing window, candle_rows,
+live.upsert_tail with streaming indicators, optionally the alert rules)
+and writes into shadow stocks (REPLAY_<SYMBOL>), so the real candles are
+never touched. Jobs over all stocks (run-pipeline.py, alerts, StockLatest)
+skip symbols starting with SHADOW_PREFIX.
+
+The clock advances one trading minute per 60/speed seconds and skips the
+gaps between sessions. For every written candle the latency from its
+scheduled close to the commit of its row (indicators included) is
+recorded; when ingest cannot keep up, latencies grow with the backlog.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+import numpy as np
+from logzero import logger
+
+from .candles import OHLCV, query_candles
+
+SHADOW_PREFIX = "REPLAY_"
+
+
+class ReplayClient:
+    """getCandleData over preloaded candles, limited to those closed by `now`"""
+
+    def __init__(self, bars_by_token):
+        self.bars = bars_by_token       # token -> query_candles() result
+        self.now = None                 # simulated time; candles must have closed by then
+        self.last_hit = False
+
+    def getCandleData(self, params):
+        bars = self.bars.get(params["symboltoken"])
+        if bars is None:
+            return {"status": False, "errorcode": "AB1019", "message": "Invalid symbol token", "data": None}
+        timestamps = bars["timestamp"]
+        start = np.datetime64(params["fromdate"].replace(" ", "T"), "m")
+        end = np.datetime64(params["todate"].replace(" ", "T"), "m")
+        closed = np.datetime64(self.now, "m") - np.timedelta64(1, "m")
+        lo = np.searchsorted(timestamps, start)
+        hi = np.searchsorted(timestamps, min(end, closed), side="right")
+        data = [[f"{timestamps[i].astype('datetime64[s]')}+05:30", float(bars["open"][i]), float(bars["high"][i]),
+                 float(bars["low"][i]), float(bars["close"][i]), int(bars["volume"][i])]
+                for i in range(lo, hi)]
+        return {"status": True, "message": "SUCCESS", "errorcode": "", "data": data}
+
+
+@dataclass
+class ReplayStats:
+    latencies: list = field(default_factory=list)      # seconds, scheduled close -> committed
+    fetch: list = field(default_factory=list)
+    write: list = field(default_factory=list)
+    alerts: list = field(default_factory=list)
+    candles: int = 0
+    minutes: int = 0
+    wall: float = 0.0
+    speed: float = 1.0
+
+    def log(self):
+        def ms(values, q):
+            return np.percentile(values, q) * 1000 if values else float("nan")
+
+        achieved = self.minutes * 60 / self.wall if self.wall else float("nan")
+        logger.info(f"📊 {self.candles:,} candles over {self.minutes:,} simulated minutes in {self.wall:.1f}s "
+                    f"({achieved:,.0f}x real time, target {self.speed:,.0f}x)")
+        logger.info(f"{'latency ms':<14} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}")
+        for name, values in (("close→row", self.latencies), ("fetch", self.fetch),
+                             ("write", self.write), ("alerts", self.alerts)):
+            if values:
+                logger.info(f"{name:<14} {ms(values, 50):>9.1f} {ms(values, 90):>9.1f} "
+                            f"{ms(values, 99):>9.1f} {max(values) * 1000:>9.1f}")
+
+
+def load_history(conn, stock_ids, start, end):
+    """{symbol: minute bars in [start, end)} read from the real stocks"""
+    return {symbol: query_candles(conn, stock_id, start, end, OHLCV) for symbol, stock_id in stock_ids.items()}
+
+
+def reset_shadows(conn, symbols):
+    """Drop earlier replays' shadow stocks (their candles and state cascade) and create fresh ones"""
+    from .importer import ensure_stock
+
+    shadows = [SHADOW_PREFIX + symbol for symbol in symbols]
+    with conn.cursor() as cur:
+        cur.execute('DELETE FROM "Stock" WHERE symbol = ANY(%s)', (shadows,))
+    conn.commit()
+    return {symbol: ensure_stock(conn, SHADOW_PREFIX + symbol, name=f"Replay of {symbol}")
+            for symbol in symbols}
+
+
+def delete_shadows(conn, shadow_ids):
+    """Delete the shadow stocks (their candles and state cascade), committed"""
+    with conn.cursor() as cur:
+        cur.execute('DELETE FROM "Stock" WHERE id = ANY(%s)', (list(shadow_ids.values()),))
+    conn.commit()
+
+
+def seed_shadows(conn, shadow_ids, history, before):
+    """Copy candles before the replay start into the shadows as indicator warm-up"""
+    from .prices import bulk_insert, candle_rows
+
+    client = ReplayClient(history)
+    client.now = before
+    for symbol, stock_id in shadow_ids.items():
+        bars = history[symbol]["timestamp"]
+        if len(bars) == 0:
+            continue
+        response = client.getCandleData({"symboltoken": symbol, "fromdate": str(bars[0]).replace("T", " "),
+                                         "todate": before.strftime("%Y-%m-%d %H:%M")})
+        bulk_insert(conn, candle_rows(stock_id, response["data"]), validate=False)
+    conn.commit()
+
+
+def replay(history, shadow_ids, start, end, speed, connections, workers=4, alerts=None):
+    """
+    Replay the minutes in [start, end) of `history` into the shadow stocks.
+
+    `connections` is a config.ThreadConnections; `alerts` an optional list of
+    alert rules evaluated over the shadows after every minute.
+    """
+    from .live import TRAILING_MINUTES, upsert_tail
+    from .prices import candle_rows
+
+    client = ReplayClient(history)
+    lo, hi = np.datetime64(start, "m"), np.datetime64(end, "m")
+    minutes = np.unique(np.concatenate([bars["timestamp"] for bars in history.values()]))
+    minutes = minutes[(minutes >= lo) & (minutes < hi)]
+    last = {}
+    for symbol, bars in history.items():
+        before = bars["timestamp"][bars["timestamp"] < lo]
+        last[symbol] = before[-1].astype("datetime64[ms]").item() if len(before) else start
+
+    stats = ReplayStats(speed=speed)
+    step = 60.0 / speed
+
+    def poll(symbol, close_at):
+        """One auto-fetch cycle for one symbol; returns (latency or None, fetch s, write s)"""
+        conn = connections.get()
+        fetch_started = time.monotonic()
+        response = client.getCandleData({
+            "exchange": "NSE", "symboltoken": symbol, "interval": "ONE_MINUTE",
+            "fromdate": (last[symbol] - timedelta(minutes=TRAILING_MINUTES - 1)).strftime("%Y-%m-%d %H:%M"),
+            "todate": client.now.strftime("%Y-%m-%d %H:%M"),
+        })
+        rows = candle_rows(shadow_ids[symbol], response["data"] or [])
+        write_started = time.monotonic()
+        try:
+            inserted, updated = upsert_tail(conn, shadow_ids[symbol], rows, source="replay")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        done = time.monotonic()
+        if rows:
+            last[symbol] = rows[-1][2]
+        return (done - close_at if inserted else None), write_started - fetch_started, done - write_started
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for i, minute in enumerate(minutes):
+            close_at = started + (i + 1) * step
+            delay = close_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            client.now = (minute + np.timedelta64(1, "m")).astype("datetime64[ms]").item()
+
+            for latency, fetch_seconds, write_seconds in pool.map(lambda s: poll(s, close_at), list(history)):
+                stats.fetch.append(fetch_seconds)
+                stats.write.append(write_seconds)
+                if latency is not None:
+                    stats.latencies.append(latency)
+                    stats.candles += 1
+            if alerts:
+                from .alerts import run_alerts
+
+                alert_started = time.monotonic()
+                run_alerts(connections.get(), alerts, sinks=[],
+                           symbols=[SHADOW_PREFIX + s for s in history])
+                stats.alerts.append(time.monotonic() - alert_started)
+            stats.minutes += 1
+            if stats.minutes % 375 == 0:
+                behind = time.monotonic() - close_at
+                logger.info(f"⏩ {client.now:%Y-%m-%d %H:%M} replayed, {behind:.2f}s behind schedule")
+
+    stats.wall = time.monotonic() - started
+    return stats
@@ -0,0 +1,315 @@
+"""
+In-database indicator engine: indicators computed and written by one SQL statement
+
+calculate-indicators.py's Python engine reads a stock's whole history,
+computes indicators with `ta` and sends every row back. This engine
+generates a single UPDATE instead, so candles never leave the server:
+
+- windows (SMA, Bollinger, stochastic, Williams %R, CCI, VWAP, ROC) are
+  window functions over ROWS frames
+- running totals (OBV, A/D line) are SUM() OVER an unbounded frame
+- recurrences (EMA, MACD signal, RSI, ATR, ADX/+DI/-DI) are running window
+  aggregates istocks_ema, istocks_wilder and istocks_wilder_sum, created by
+  ensure_functions(); each returns {value, count} so warm-up rows stay NULL
+
+Definitions are those of streaming.IndicatorState. Only the steps the
+requested columns need are generated, and rows whose values are unchanged
+are not rewritten.
+
+The engine is chosen per indicator with INDICATOR_ENGINE (or
+calculate-indicators.py --engine): "python", "sql", or a default followed
+by overrides, e.g. "sql,cci=python,adx=python". Since Postgres rewrites a
+whole row for any update, mixing engines writes changed rows twice;
+calculate-indicators.py --benchmark times both engines on a stock.
+"""
+
+import os
+
+from .config import load_env
+from .streaming import (
+    ADX_WINDOW, ATR_WINDOW, BB_DEVIATIONS, BB_WINDOW, CCI_CONSTANT, CCI_WINDOW, INDICATOR_COLUMNS,
+    MACD_FAST, MACD_SIGNAL, MACD_SLOW, ROC_WINDOW, RSI_WINDOW, STOCH_SMOOTH, STOCH_WINDOW, VWAP_WINDOW,
+    WILLIAMS_WINDOW,
+)
+
+ENGINES = ("python", "sql")
+NUMERIC_FRAMES = 30     # sliding frames at least this long are aggregated as NUMERIC
+
+FUNCTIONS = """
+    CREATE OR REPLACE FUNCTION istocks_ema_step(state DOUBLE PRECISION[], x DOUBLE PRECISION,
+                                                alpha DOUBLE PRECISION)
+    RETURNS DOUBLE PRECISION[] LANGUAGE plpgsql IMMUTABLE AS $$
+    BEGIN
+        IF x IS NULL THEN
+            RETURN state;
+        ELSIF state IS NULL THEN
+            RETURN ARRAY[x, 1];
+        END IF;
+        RETURN ARRAY[alpha * x + (1 - alpha) * state[1], state[2] + 1];
+    END $$;
+
+    -- Mean of the first `window` values, then Wilder smoothing: {value, count, seed sum}
+    CREATE OR REPLACE FUNCTION istocks_wilder_step(state DOUBLE PRECISION[], x DOUBLE PRECISION,
+                                                   window_size INTEGER)
+    RETURNS DOUBLE PRECISION[] LANGUAGE plpgsql IMMUTABLE AS $$
+    BEGIN
+        IF x IS NULL THEN
+            RETURN state;
+        ELSIF state IS NULL THEN
+            state := ARRAY[NULL, 0, 0];
+        END IF;
+        IF state[2] < window_size THEN
+            state[3] := state[3] + x;
+            state[2] := state[2] + 1;
+            IF state[2] = window_size THEN
+                state[1] := state[3] / window_size;
+            END IF;
+            RETURN state;
+        END IF;
+        RETURN ARRAY[(state[1] * (window_size - 1) + x) / window_size, state[2] + 1, state[3]];
+    END $$;
+
+    -- Sum of the first `window` values, then Wilder sums: {value, count}
+    CREATE OR REPLACE FUNCTION istocks_wilder_sum_step(state DOUBLE PRECISION[], x DOUBLE PRECISION,
+                                                       window_size INTEGER)
+    RETURNS DOUBLE PRECISION[] LANGUAGE plpgsql IMMUTABLE AS $$
+    BEGIN
+        IF x IS NULL THEN
+            RETURN state;
+        ELSIF state IS NULL THEN
+            RETURN ARRAY[x, 1];
+        ELSIF state[2] < window_size THEN
+            RETURN ARRAY[state[1] + x, state[2] + 1];
+        END IF;
+        RETURN ARRAY[state[1] - state[1] / window_size + x, state[2] + 1];
+    END $$;
+
+    CREATE OR REPLACE AGGREGATE istocks_ema(DOUBLE PRECISION, DOUBLE PRECISION) (
+        SFUNC = istocks_ema_step, STYPE = DOUBLE PRECISION[]
+    );
+    CREATE OR REPLACE AGGREGATE istocks_wilder(DOUBLE PRECISION, INTEGER) (
+        SFUNC = istocks_wilder_step, STYPE = DOUBLE PRECISION[]
+    );
+    CREATE OR REPLACE AGGREGATE istocks_wilder_sum(DOUBLE PRECISION, INTEGER) (
+        SFUNC = istocks_wilder_sum_step, STYPE = DOUBLE PRECISION[]
+    );
+"""
+
+
+def ensure_functions(conn):
+    with conn.cursor() as cur:
+        cur.execute(FUNCTIONS)
+    conn.commit()
+
+
+# -- step definitions -----------------------------------------------------------
+
+def _rows(function, expression, window):
+    return f"{function}({expression}) OVER (ORDER BY timestamp ROWS BETWEEN {window - 1} PRECEDING AND CURRENT ROW)"
+
+
+def _running(function, *arguments):
+    return f"{function}({', '.join(arguments)}) OVER (ORDER BY timestamp ROWS UNBOUNDED PRECEDING)"
+
+
+def _ready(bars, expression):
+    """`expression` from the bar with index bars - 1 on, NULL during warm-up"""
+    return f"CASE WHEN n >= {bars - 1} THEN {expression} END"
+
+
+def _state(name, count):
+    """Value of a recurrence state once it has seen `count` inputs"""
+    return f'CASE WHEN "{name}"[2] >= {count} THEN "{name}"[1] END'
+
+
+def _moving(function, expression, window):
+    """
+    Sliding-window aggregate. Postgres re-aggregates the whole frame per row
+    for floats but updates NUMERIC aggregates incrementally, which is
+    cheaper for long windows.
+    """
+    if window < NUMERIC_FRAMES:
+        return _rows(function, expression, window)
+    return f"{_rows(function, f'({expression})::NUMERIC', window)}::DOUBLE PRECISION"
+
+
+def _sma(window):
+    return _ready(window, _moving("AVG", "close", window)), ()
+
+
+def _ema(column, alpha):
+    return _running("istocks_ema", column, f"{alpha!r}")
+
+
+# name -> (expression, steps it reads). Candles come with their index n and
+# the previous bar; every step is computed in a CTE after those it reads.
+STEPS = {
+    "typical": ("(high + low + close) / 3", ()),
+    "gain": ('GREATEST(close - "prevClose", 0)', ()),
+    "loss": ('GREATEST("prevClose" - close, 0)', ()),
+    # GREATEST ignores NULLs, so the first bar's true range is its high - low
+    "trueRange": ('GREATEST(high - low, ABS(high - "prevClose"), ABS(low - "prevClose"))', ()),
+    "movement": ('CASE WHEN n > 0 THEN GREATEST(high, "prevClose") - LEAST(low, "prevClose") END', ()),
+    "plusMove": ('''CASE WHEN n > 0 THEN
+        CASE WHEN high - "prevHigh" > "prevLow" - low AND high - "prevHigh" > 0 THEN high - "prevHigh" ELSE 0 END
+    END''', ()),
+    "minusMove": ('''CASE WHEN n > 0 THEN
+        CASE WHEN "prevLow" - low > high - "prevHigh" AND "prevLow" - low > 0 THEN "prevLow" - low ELSE 0 END
+    END''', ()),
+
+    "sma20": _sma(20),
+    "sma50": _sma(50),
+    "sma200": _sma(200),
+    "bbMiddle": (f'"sma{BB_WINDOW}"', (f"sma{BB_WINDOW}",)),
+    "bbStd": (_ready(BB_WINDOW, _moving("STDDEV_POP", "close", BB_WINDOW)), ()),
+    "bbUpper": (f'"bbMiddle" + {BB_DEVIATIONS!r} * "bbStd"', ("bbMiddle", "bbStd")),
+    "bbLower": (f'"bbMiddle" - {BB_DEVIATIONS!r} * "bbStd"', ("bbMiddle", "bbStd")),
+
+    "emaFast": (_ema("close", 2.0 / (MACD_FAST + 1)), ()),
+    "emaSlow": (_ema("close", 2.0 / (MACD_SLOW + 1)), ()),
+    "ema12": (_ready(MACD_FAST, '"emaFast"[1]'), ("emaFast",)),
+    "ema26": (_ready(MACD_SLOW, '"emaSlow"[1]'), ("emaSlow",)),
+    "macd": (_ready(MACD_SLOW, '"emaFast"[1] - "emaSlow"[1]'), ("emaFast", "emaSlow")),
+    "macdSignalState": (_ema("macd", 2.0 / (MACD_SIGNAL + 1)), ("macd",)),
+    "macdSignal": (_state("macdSignalState", MACD_SIGNAL), ("macdSignalState",)),
+    "macdHistogram": ("macd - \"macdSignal\"", ("macd", "macdSignal")),
+
+    "rsiGain": (_ema("gain", 1.0 / RSI_WINDOW), ("gain",)),
+    "rsiLoss": (_ema("loss", 1.0 / RSI_WINDOW), ("loss",)),
+    "rsi": (_ready(RSI_WINDOW, 'CASE WHEN "rsiLoss"[1] = 0 THEN 100 '
+                               'ELSE 100 - 100 / (1 + "rsiGain"[1] / "rsiLoss"[1]) END'), ("rsiGain", "rsiLoss")),
+
+    "atrState": (_running("istocks_wilder", '"trueRange"', str(ATR_WINDOW)), ("trueRange",)),
+    "atr": (_state("atrState", ATR_WINDOW), ("atrState",)),
+
+    "trSum": (_running("istocks_wilder_sum", "movement", str(ADX_WINDOW)), ("movement",)),
+    "plusSum": (_running("istocks_wilder_sum", '"plusMove"', str(ADX_WINDOW)), ("plusMove",)),
+    "minusSum": (_running("istocks_wilder_sum", '"minusMove"', str(ADX_WINDOW)), ("minusMove",)),
+    "plusDI": (f'CASE WHEN "trSum"[2] >= {ADX_WINDOW} THEN COALESCE(100 * "plusSum"[1] / NULLIF("trSum"[1], 0), 0) END',
+               ("trSum", "plusSum")),
+    "minusDI": (f'CASE WHEN "trSum"[2] >= {ADX_WINDOW} THEN COALESCE(100 * "minusSum"[1] / NULLIF("trSum"[1], 0), 0) END',
+                ("trSum", "minusSum")),
+    "dx": ('''CASE WHEN "plusDI" + "minusDI" > 0 THEN 100 * ABS("plusDI" - "minusDI") / ("plusDI" + "minusDI")
+        WHEN "plusDI" IS NOT NULL THEN 0 END''', ("plusDI", "minusDI")),
+    "adxState": (_running("istocks_wilder", "dx", str(ADX_WINDOW)), ("dx",)),
+    "adx": (_state("adxState", ADX_WINDOW), ("adxState",)),
+
+    # Named by window, so equal stochastic and Williams windows share one frame
+    f"highest{STOCH_WINDOW}": (_rows("MAX", "high", STOCH_WINDOW), ()),
+    f"lowest{STOCH_WINDOW}": (_rows("MIN", "low", STOCH_WINDOW), ()),
+    f"highest{WILLIAMS_WINDOW}": (_rows("MAX", "high", WILLIAMS_WINDOW), ()),
+    f"lowest{WILLIAMS_WINDOW}": (_rows("MIN", "low", WILLIAMS_WINDOW), ()),
+    "stochK": (_ready(STOCH_WINDOW, f'100 * (close - "lowest{STOCH_WINDOW}") '
+                                    f'/ NULLIF("highest{STOCH_WINDOW}" - "lowest{STOCH_WINDOW}", 0)'),
+               (f"highest{STOCH_WINDOW}", f"lowest{STOCH_WINDOW}")),
+    "stochD": (f'''CASE WHEN {_rows("COUNT", '"stochK"', STOCH_SMOOTH)} = {STOCH_SMOOTH}
+        THEN {_rows("AVG", '"stochK"', STOCH_SMOOTH)} END''', ("stochK",)),
+    "williamsR": (_ready(WILLIAMS_WINDOW, f'-100 * ("highest{WILLIAMS_WINDOW}" - close) '
+                                          f'/ NULLIF("highest{WILLIAMS_WINDOW}" - "lowest{WILLIAMS_WINDOW}", 0)'),
+                  (f"highest{WILLIAMS_WINDOW}", f"lowest{WILLIAMS_WINDOW}")),
+
+    "typicalMean": (_ready(CCI_WINDOW, _rows("AVG", "typical", CCI_WINDOW)), ("typical",)),
+    "typicalWindow": (_rows("ARRAY_AGG", "typical", CCI_WINDOW), ("typical",)),
+    # A flat window has no deviation; checked explicitly as float means of equal values may not be exact
+    "cci": (f'''(typical - "typicalMean") / NULLIF({CCI_CONSTANT!r} * (
+        SELECT CASE WHEN MAX(v) > MIN(v) THEN SUM(ABS(v - "typicalMean")) / {CCI_WINDOW} END
+        FROM UNNEST("typicalWindow") v
+    ), 0)''', ("typical", "typicalMean", "typicalWindow")),
+    "vwap": (_ready(VWAP_WINDOW, f'''{_moving("SUM", "typical * volume", VWAP_WINDOW)}
+        / NULLIF({_moving("SUM", "volume", VWAP_WINDOW)}, 0)'''), ("typical",)),
+    "roc": (f'''(close - LAG(close, {ROC_WINDOW}) OVER (ORDER BY timestamp)) * 100
+        / NULLIF(LAG(close, {ROC_WINDOW}) OVER (ORDER BY timestamp), 0)''', ()),
+    "obv": (_running("SUM", 'CASE WHEN close < "prevClose" THEN -volume ELSE volume END') + "::BIGINT", ()),
+    "adLine": (_running("SUM", "CASE WHEN high <> low THEN ((close - low) - (high - close)) / (high - low) "
+                               "ELSE 0 END * volume"), ()),
+}
+
+
+def _layers(columns):
+    """Steps needed for `columns`, grouped into CTE layers in dependency order"""
+    depth = {}
+
+    def visit(name):
+        if name not in depth:
+            expression, needs = STEPS[name]
+            depth[name] = 1 + max((visit(need) for need in needs), default=0)
+        return depth[name]
+
+    for column in columns:
+        visit(column)
+    layers = [[] for _ in range(max(depth.values(), default=0))]
+    for name, level in depth.items():
+        layers[level - 1].append(name)
+    return layers
+
+
+def build_query(columns):
+    """
+    WITH ... SELECT of `columns` for every candle of %(stock)s, computed
+    over its full history
+    """
+    ctes = ["""candles AS (
+        SELECT timestamp, high, low, close, volume::DOUBLE PRECISION AS volume,
+               ROW_NUMBER() OVER w - 1 AS n,
+               LAG(high) OVER w AS "prevHigh", LAG(low) OVER w AS "prevLow", LAG(close) OVER w AS "prevClose"
+        FROM "StockPrice"
+        WHERE "stockId" = %(stock)s
+        WINDOW w AS (ORDER BY timestamp)
+    )"""]
+    previous = "candles"
+    for i, layer in enumerate(_layers(columns), 1):
+        expressions = ",\n               ".join(f'{STEPS[name][0]} AS "{name}"' for name in layer)
+        ctes.append(f"""layer{i} AS (
+        SELECT *, {expressions}
+        FROM {previous}
+    )""")
+        previous = f"layer{i}"
+    names = ", ".join(f'"{c}"' for c in columns)
+    return f"WITH {', '.join(ctes)}\nSELECT timestamp, {names} FROM {previous}"
+
+
+def build_update(columns):
+    """UPDATE writing `columns` of %(stock)s's candles from %(since)s on (all when NULL)"""
+    assignments = ", ".join(f'"{c}" = r."{c}"' for c in columns)
+    stored = ", ".join(f'p."{c}"' for c in columns)
+    computed = ", ".join(f'r."{c}"' for c in columns)
+    return f"""
+        UPDATE "StockPrice" AS p SET {assignments}
+        FROM ({build_query(columns)}) AS r
+        WHERE p."stockId" = %(stock)s AND p.timestamp = r.timestamp
+          AND (%(since)s::timestamp IS NULL OR r.timestamp >= %(since)s::timestamp)
+          AND ROW({stored}) IS DISTINCT FROM ROW({computed})
+    """
+
+
+def update_indicators_sql(conn, stock_id, since=None, columns=INDICATOR_COLUMNS):
+    """
+    Compute `columns` over the stock's full history inside the database and
+    write rows from `since` on. Returns rows changed; the caller owns the
+    transaction (ensure_functions() must have run once).
+    """
+    with conn.cursor() as cur:
+        cur.execute(build_update(list(columns)), {"stock": stock_id, "since": since})
+        return cur.rowcount
+
+
+def indicator_engines(spec=None):
+    """
+    {column: "python" or "sql"} from `spec` or INDICATOR_ENGINE, e.g. "sql"
+    or "sql,cci=python,adx=python"; defaults to the Python engine
+    """
+    if spec is None:
+        load_env()
+        spec = os.getenv("INDICATOR_ENGINE") or "python"
+    engines = dict.fromkeys(INDICATOR_COLUMNS, "python")
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        column, _, engine = part.rpartition("=")
+        if engine not in ENGINES:
+            raise ValueError(f"unknown indicator engine {engine!r} (expected one of {', '.join(ENGINES)})")
+        if not column:
+            engines = dict.fromkeys(INDICATOR_COLUMNS, engine)
+        elif column in engines:
+            engines[column] = engine
+        else:
+            raise ValueError(f"unknown indicator {column!r}")
+    return engines
@@ -0,0 +1,92 @@
+"""
+Cheap health queries for `istocks status` and `istocks gaps`
+
+Everything here is plain SQL through psycopg2 (no NumPy/pandas), so the
+commands answer in well under a second even from cron.
+"""
+
+from datetime import datetime, timedelta
+
+SESSION_BARS = 375  # 09:15-15:29 one-minute candles
+
+
+def _table_exists(conn, name):
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL", (f'"{name}"',))
+        return cur.fetchone()[0]
+
+
+def latest_candles(conn, symbols=None):
+    """[(symbol, latest timestamp or None)] using the (stockId, timestamp DESC) index"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT s.symbol, latest.timestamp
+            FROM "Stock" s
+            LEFT JOIN LATERAL (
+                SELECT timestamp FROM "StockPrice"
+                WHERE "stockId" = s.id
+                ORDER BY timestamp DESC
+                LIMIT 1
+            ) latest ON true
+            WHERE %s::text[] IS NULL OR s.symbol = ANY(%s::text[])
+            ORDER BY s.symbol
+        """, (symbols, symbols))
+        return cur.fetchall()
+
+
+def quarantine_counts(conn, since):
+    """{symbol: candles quarantined since `since`}; empty if validation never ran"""
+    if not _table_exists(conn, "StockPriceQuarantine"):
+        return {}
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT s.symbol, COUNT(*)
+            FROM "StockPriceQuarantine" q JOIN "Stock" s ON s.id = q."stockId"
+            WHERE q."createdAt" >= %s
+            GROUP BY s.symbol
+        """, (since,))
+        return dict(cur.fetchall())
+
+
+def queue_counts(conn):
+    """{status: jobs} of the fetch work queue; empty if it does not exist"""
+    if not _table_exists(conn, "FetchJob"):
+        return {}
+    with conn.cursor() as cur:
+        cur.execute('SELECT status, COUNT(*) FROM "FetchJob" GROUP BY status')
+        return dict(cur.fetchall())
+
+
+def session_gaps(conn, symbols=None, days=30, min_bars=SESSION_BARS):
+    """
+    Sessions in the last `days` where a stock has fewer than `min_bars` candles.
+
+    A session is any date on which at least one stock has data, so a day
+    missing entirely for one symbol shows up with 0 bars. Days before a
+    stock's first candle in the window are not reported.
+    Returns [(symbol, date, bars)].
+    """
+    since = (datetime.now() - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+    with conn.cursor() as cur:
+        cur.execute("""
+            WITH counts AS (
+                SELECT "stockId", timestamp::date AS day, COUNT(*) AS bars
+                FROM "StockPrice"
+                WHERE timestamp >= %(since)s
+                GROUP BY 1, 2
+            ),
+            sessions AS (SELECT DISTINCT day FROM counts),
+            stocks AS (
+                SELECT s.id, s.symbol, MIN(c.day) AS first_day
+                FROM "Stock" s JOIN counts c ON c."stockId" = s.id
+                WHERE %(symbols)s::text[] IS NULL OR s.symbol = ANY(%(symbols)s::text[])
+                GROUP BY s.id, s.symbol
+            )
+            SELECT st.symbol, se.day, COALESCE(c.bars, 0)
+            FROM stocks st
+            JOIN sessions se ON se.day >= st.first_day
+            LEFT JOIN counts c ON c."stockId" = st.id AND c.day = se.day
+            WHERE COALESCE(c.bars, 0) < %(min_bars)s
+            ORDER BY st.symbol, se.day
+        """, {"since": since, "symbols": symbols, "min_bars": min_bars})
+        return cur.fetchall()
@@ -0,0 +1,446 @@
+"""
+Incremental indicator state: one new candle's indicators in constant time
+
+calculate-indicators.py recomputes every indicator over a stock's full
+history with `ta`. For the live tail that is wasteful: every indicator it
+stores is a recursion or a bounded window, so a small per-stock state is
+enough to extend the series one candle at a time:
+
+- EMA 12/26, MACD signal: the previous EMA values
+- RSI, ATR, ADX/+DI/-DI: Wilder averages (and the warm-up sums that seed them)
+- SMA 20/50/200, Bollinger, stochastic, Williams %R, CCI, ROC, VWAP: ring
+  buffers of at most 200 values
+- OBV, A/D line: running totals
+
+The state is stored per stock in "IndicatorState" (JSON) as of its last
+candle, so the ingest path computes indicators for new candles and writes
+them with the candles themselves. Definitions follow `ta` with the windows
+calculate-indicators.py uses; warm-up bars are None.
+"""
+
+import json
+import math
+from collections import deque
+
+from psycopg2.extras import execute_values
+
+WARMUP_BARS = 2000      # Wilder/EMA memory left after this many bars is < 1e-40
+
+INDICATOR_COLUMNS = (
+    "rsi", "macd", "macdSignal", "macdHistogram", "sma20", "sma50", "sma200",
+    "ema12", "ema26", "bbUpper", "bbMiddle", "bbLower", "atr", "adx", "plusDI",
+    "minusDI", "stochK", "stochD", "cci", "williamsR", "roc", "obv", "vwap", "adLine",
+)
+
+RSI_WINDOW = 14
+ATR_WINDOW = 14
+ADX_WINDOW = 14
+STOCH_WINDOW = 14
+STOCH_SMOOTH = 3
+WILLIAMS_WINDOW = 14
+CCI_WINDOW = 20
+CCI_CONSTANT = 0.015
+ROC_WINDOW = 10
+VWAP_WINDOW = 14
+BB_WINDOW = 20
+BB_DEVIATIONS = 2.0
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+
+# ring buffer -> length
+BUFFERS = {
+    "close": 200,
+    "high": max(STOCH_WINDOW, WILLIAMS_WINDOW),
+    "low": max(STOCH_WINDOW, WILLIAMS_WINDOW),
+    "typical": CCI_WINDOW,
+    "typicalVolume": VWAP_WINDOW,
+    "volume": VWAP_WINDOW,
+    "stochK": STOCH_SMOOTH,
+}
+
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS "IndicatorState" (
+        "stockId" TEXT NOT NULL,
+        "lastTimestamp" TIMESTAMP(3) NOT NULL,
+        state JSONB NOT NULL,
+        "updatedAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        CONSTRAINT "IndicatorState_pkey" PRIMARY KEY ("stockId"),
+        CONSTRAINT "IndicatorState_stockId_fkey" FOREIGN KEY ("stockId")
+            REFERENCES "Stock"(id) ON DELETE CASCADE ON UPDATE CASCADE
+    )
+"""
+
+
+def _ema_step(previous, value, span):
+    alpha = 2.0 / (span + 1)
+    return value if previous is None else alpha * value + (1 - alpha) * previous
+
+
+def _mean(values, window):
+    if len(values) < window:
+        return None
+    return math.fsum(list(values)[-window:]) / window
+
+
+def _ratio(numerator, denominator):
+    return None if not denominator else numerator / denominator
+
+
+class IndicatorState:
+    def __init__(self, data=None):
+        data = data or {}
+        self.bars = data.get("bars", 0)
+        self.previous = data.get("previous")          # [high, low, close] of the last bar
+        self.ema = data.get("ema", {})                # "12", "26", "signal" -> value
+        self.macd_count = data.get("macdCount", 0)
+        self.rsi = data.get("rsi", [0.0, 0.0])        # Wilder average gain, loss
+        self.atr = data.get("atr")
+        self.atr_seed = data.get("atrSeed", 0.0)
+        self.adx = data.get("adx", {"tr": 0.0, "plus": 0.0, "minus": 0.0, "value": None, "dx": []})
+        self.obv = data.get("obv", 0)
+        self.ad_line = data.get("adLine", 0.0)
+        self.buffers = {
+            name: deque(data.get("buffers", {}).get(name, []), maxlen=size)
+            for name, size in BUFFERS.items()
+        }
+
+    def to_json(self):
+        return json.dumps({
+            "bars": self.bars,
+            "previous": self.previous,
+            "ema": self.ema,
+            "macdCount": self.macd_count,
+            "rsi": self.rsi,
+            "atr": self.atr,
+            "atrSeed": self.atr_seed,
+            "adx": self.adx,
+            "obv": self.obv,
+            "adLine": self.ad_line,
+            "buffers": {name: list(values) for name, values in self.buffers.items()},
+        })
+
+    @classmethod
+    def seeded(cls, obv, ad_line, previous):
+        """Empty state that continues stored OBV/A-D totals after the `previous` bar"""
+        state = cls()
+        state.obv, state.ad_line = obv, ad_line
+        state.previous = list(previous)
+        return state
+
+    def update(self, open_, high, low, close, volume):
+        """Add one candle; returns {column: value or None} for it"""
+        out = {}
+        previous = self.previous
+        n = self.bars               # index of this bar in the series
+        buffers = self.buffers
+        buffers["close"].append(close)
+        buffers["high"].append(high)
+        buffers["low"].append(low)
+
+        # Moving averages and Bollinger bands
+        out["sma20"] = _mean(buffers["close"], 20)
+        out["sma50"] = _mean(buffers["close"], 50)
+        out["sma200"] = _mean(buffers["close"], 200)
+        middle = _mean(buffers["close"], BB_WINDOW)
+        if middle is not None:
+            window = list(buffers["close"])[-BB_WINDOW:]
+            std = math.sqrt(max(math.fsum((v - middle) ** 2 for v in window) / BB_WINDOW, 0.0))
+            out["bbMiddle"] = middle
+            out["bbUpper"] = middle + BB_DEVIATIONS * std
+            out["bbLower"] = middle - BB_DEVIATIONS * std
+        else:
+            out["bbMiddle"] = out["bbUpper"] = out["bbLower"] = None
+
+        # EMA / MACD
+        ema = self.ema
+        ema["12"] = _ema_step(ema.get("12"), close, MACD_FAST)
+        ema["26"] = _ema_step(ema.get("26"), close, MACD_SLOW)
+        out["ema12"] = ema["12"] if n >= MACD_FAST - 1 else None
+        out["ema26"] = ema["26"] if n >= MACD_SLOW - 1 else None
+        macd = ema["12"] - ema["26"] if n >= MACD_SLOW - 1 else None
+        if macd is not None:
+            ema["signal"] = _ema_step(ema.get("signal"), macd, MACD_SIGNAL)
+            self.macd_count += 1
+        signal = ema.get("signal") if self.macd_count >= MACD_SIGNAL else None
+        out["macd"] = macd
+        out["macdSignal"] = signal
+        out["macdHistogram"] = macd - signal if signal is not None else None
+
+        # RSI (Wilder): the first bar has no change
+        change = close - previous[2] if previous else 0.0
+        gain, loss = max(change, 0.0), max(-change, 0.0)
+        if n == 0:
+            self.rsi = [gain, loss]
+        else:
+            self.rsi = [(self.rsi[0] * (RSI_WINDOW - 1) + gain) / RSI_WINDOW,
+                        (self.rsi[1] * (RSI_WINDOW - 1) + loss) / RSI_WINDOW]
+        if n >= RSI_WINDOW - 1:
+            avg_gain, avg_loss = self.rsi
+            out["rsi"] = 100.0 if avg_loss == 0 else 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+        else:
+            out["rsi"] = None
+
+        # ATR: mean of the first `window` true ranges, then Wilder
+        true_range = high - low
+        if previous:
+            true_range = max(true_range, abs(high - previous[2]), abs(low - previous[2]))
+        if self.atr is None:
+            self.atr_seed += true_range
+            if n == ATR_WINDOW - 1:
+                self.atr = self.atr_seed / ATR_WINDOW
+        else:
+            self.atr = (self.atr * (ATR_WINDOW - 1) + true_range) / ATR_WINDOW
+        out["atr"] = self.atr
+
+        self._update_adx(n, high, low, previous, out)
+
+        # Stochastic, Williams %R
+        highest = max(list(buffers["high"])[-STOCH_WINDOW:])
+        lowest = min(list(buffers["low"])[-STOCH_WINDOW:])
+        stoch_k = None
+        if n >= STOCH_WINDOW - 1:
+            stoch_k = _ratio(100.0 * (close - lowest), highest - lowest)
+        buffers["stochK"].append(stoch_k)
+        out["stochK"] = stoch_k
+        smooth = list(buffers["stochK"])
+        out["stochD"] = (math.fsum(smooth) / STOCH_SMOOTH
+                         if len(smooth) == STOCH_SMOOTH and None not in smooth else None)
+        out["williamsR"] = None
+        if n >= WILLIAMS_WINDOW - 1:
+            highest = max(list(buffers["high"])[-WILLIAMS_WINDOW:])
+            lowest = min(list(buffers["low"])[-WILLIAMS_WINDOW:])
+            out["williamsR"] = _ratio(-100.0 * (highest - close), highest - lowest)
+
+        # CCI, VWAP
+        typical = (high + low + close) / 3.0
+        buffers["typical"].append(typical)
+        buffers["typicalVolume"].append(typical * volume)
+        buffers["volume"].append(volume)
+        out["cci"] = None
+        mean_typical = _mean(buffers["typical"], CCI_WINDOW)
+        if mean_typical is not None:
+            deviation = math.fsum(abs(v - mean_typical) for v in buffers["typical"]) / CCI_WINDOW
+            out["cci"] = _ratio(typical - mean_typical, CCI_CONSTANT * deviation)
+        out["vwap"] = None
+        if len(buffers["volume"]) == VWAP_WINDOW:
+            out["vwap"] = _ratio(math.fsum(buffers["typicalVolume"]), math.fsum(buffers["volume"]))
+
+        # ROC
+        closes = buffers["close"]
+        out["roc"] = None
+        if len(closes) > ROC_WINDOW:
+            past = closes[-ROC_WINDOW - 1]
+            out["roc"] = _ratio((close - past) * 100.0, past)
+
+        # OBV, accumulation/distribution
+        self.obv += -int(volume) if previous and close < previous[2] else int(volume)
+        out["obv"] = self.obv
+        spread = high - low
+        self.ad_line += (((close - low) - (high - close)) / spread if spread else 0.0) * volume
+        out["adLine"] = self.ad_line
+
+        self.previous = [high, low, close]
+        self.bars = n + 1
+        return out
+
+    def _update_adx(self, n, high, low, previous, out):
+        """+DI/-DI from Wilder sums of the first `window` moves, ADX from a mean of the first DX values"""
+        window = ADX_WINDOW
+        state = self.adx
+        out["adx"] = out["plusDI"] = out["minusDI"] = None
+        if not previous:
+            return
+        prev_high, prev_low, prev_close = previous
+        movement = max(high, prev_close) - min(low, prev_close)
+        up, down = high - prev_high, prev_low - low
+        plus = up if up > down and up > 0 else 0.0
+        minus = down if down > up and down > 0 else 0.0
+
+        if n <= window:
+            state["tr"] += movement
+            state["plus"] += plus
+            state["minus"] += minus
+            if n < window:
+                return
+        else:
+            state["tr"] = state["tr"] - state["tr"] / window + movement
+            state["plus"] = state["plus"] - state["plus"] / window + plus
+            state["minus"] = state["minus"] - state["minus"] / window + minus
+
+        plus_di = 100.0 * state["plus"] / state["tr"] if state["tr"] else 0.0
+        minus_di = 100.0 * state["minus"] / state["tr"] if state["tr"] else 0.0
+        out["plusDI"], out["minusDI"] = plus_di, minus_di
+        total = plus_di + minus_di
+        dx = 100.0 * abs(plus_di - minus_di) / total if total else 0.0
+
+        if state["value"] is None:
+            state["dx"].append(dx)
+            if len(state["dx"]) == window:
+                state["value"] = math.fsum(state["dx"]) / window
+                state["dx"] = []
+        else:
+            state["value"] = (state["value"] * (window - 1) + dx) / window
+        out["adx"] = state["value"]
+
+
+# -- persistence ----------------------------------------------------------------
+
+def ensure_table(conn):
+    """Create "IndicatorState" (committed); scripts run it via live.ensure_tables"""
+    with conn.cursor() as cur:
+        cur.execute(CREATE_TABLE)
+    conn.commit()
+
+
+def load_state(conn, stock_id):
+    """(IndicatorState, lastTimestamp) or (None, None)"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT state, "lastTimestamp" FROM "IndicatorState" WHERE "stockId" = %s
+        """, (stock_id,))
+        row = cur.fetchone()
+    if row is None:
+        return None, None
+    data = row[0] if isinstance(row[0], dict) else json.loads(row[0])
+    return IndicatorState(data), row[1]
+
+
+def save_state(conn, stock_id, state, last_timestamp):
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO "IndicatorState" ("stockId", "lastTimestamp", state, "updatedAt")
+            VALUES (%s, %s, %s, NOW())
+            ON CONFLICT ("stockId") DO UPDATE SET
+                "lastTimestamp" = EXCLUDED."lastTimestamp",
+                state = EXCLUDED.state,
+                "updatedAt" = EXCLUDED."updatedAt"
+        """, (stock_id, last_timestamp, state.to_json()))
+
+
+def reset_state(conn, stock_id):
+    """Forget a stock's state (e.g. after a full recalculation); rebuilt on next use"""
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('\"IndicatorState\"') IS NOT NULL")
+        if cur.fetchone()[0]:
+            cur.execute('DELETE FROM "IndicatorState" WHERE "stockId" = %s', (stock_id,))
+
+
+def _stored_bars(conn, stock_id, before, limit=None):
+    """Stored (timestamp, o, h, l, c, v, obv, adLine) before `before`, oldest first"""
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT timestamp, open, high, low, close, volume, obv, "adLine"
+            FROM "StockPrice"
+            WHERE "stockId" = %s AND timestamp < %s
+            ORDER BY timestamp DESC
+            {"LIMIT %s" if limit else ""}
+        """, (stock_id, before, limit) if limit else (stock_id, before))
+        return cur.fetchall()[::-1]
+
+
+def warm_state(conn, stock_id, before):
+    """
+    State as of the last stored candle before `before`.
+
+    Replays the last WARMUP_BARS candles, continuing the stored OBV/A-D
+    totals of the candle just before them; without stored totals (or with
+    a short history) the whole history is replayed.
+    Returns (state, last timestamp or None).
+    """
+    rows = _stored_bars(conn, stock_id, before, WARMUP_BARS + 1)
+    if len(rows) > WARMUP_BARS and rows[0][6] is not None and rows[0][7] is not None:
+        seed = rows[0]
+        state = IndicatorState.seeded(int(seed[6]), float(seed[7]), (seed[2], seed[3], seed[4]))
+        rows = rows[1:]
+    else:
+        if len(rows) > WARMUP_BARS:
+            rows = _stored_bars(conn, stock_id, before)
+        state = IndicatorState()
+    for row in rows:
+        state.update(*row[1:6])
+    return state, (rows[-1][0] if rows else None)
+
+
+def _stored_after(conn, stock_id, after):
+    """{timestamp: (o, h, l, c, v)} of stored candles after `after` (all when None)"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT timestamp, open, high, low, close, volume
+            FROM "StockPrice"
+            WHERE "stockId" = %s AND (%s::timestamp IS NULL OR timestamp > %s)
+        """, (stock_id, after, after))
+        return {row[0]: row[1:] for row in cur.fetchall()}
+
+
+def _advance(conn, stock_id, start, written=()):
+    """
+    Stream stored candles from `start` (and any the state has not seen yet),
+    with `written` PRICE_COLUMNS tuples taking the place of stored ones.
+    Saves the advanced state; returns {timestamp: {column: value}}.
+    """
+    state, last = load_state(conn, stock_id)
+    if state is None or last >= start:
+        state, last = warm_state(conn, stock_id, start)
+
+    pending = _stored_after(conn, stock_id, last)
+    for row in written:
+        pending[row[2]] = row[3:8]
+    if not pending:
+        return {}
+    values = {timestamp: state.update(*pending[timestamp]) for timestamp in sorted(pending)}
+    save_state(conn, stock_id, state, max(pending))
+    return values
+
+
+def stream_rows(conn, stock_id, new, changed):
+    """
+    Indicators for candles about to be written, from the stored state.
+
+    `new` and `changed` are PRICE_COLUMNS tuples. In the usual case they all
+    follow the state's last candle and each costs one state update. When a
+    candle the state already covers was corrected, the state is rebuilt from
+    the candles before it (see warm_state) and stored candles from there are
+    streamed again. The advanced state is saved; the caller owns the
+    transaction.
+
+    Returns (new rows extended by INDICATOR_COLUMNS,
+    {timestamp: {column: value}} for stored candles to update).
+    """
+    written = new + changed
+    if not written:
+        return new, {}
+    values = _advance(conn, stock_id, min(row[2] for row in written), written)
+
+    new_keys = {row[2] for row in new}
+    extended = [tuple(row) + tuple(values[row[2]][c] for c in INDICATOR_COLUMNS) for row in new]
+    return extended, {ts: v for ts, v in values.items() if ts not in new_keys}
+
+
+def catch_up(conn, stock_id, since):
+    """
+    Write indicators of stored candles from `since` (e.g. an IndicatorDirty
+    mark) and of any after the state's last candle. Returns rows updated;
+    the caller owns the transaction.
+    """
+    return update_indicators(conn, stock_id, _advance(conn, stock_id, since))
+
+
+def update_indicators(conn, stock_id, values):
+    """Write {timestamp: {column: value}} into stored candles; returns rows updated"""
+    if not values:
+        return 0
+    assignments = ", ".join(f'"{c}" = v."{c}"' for c in INDICATOR_COLUMNS)
+    names = ", ".join(f'"{c}"' for c in INDICATOR_COLUMNS)
+    casts = ", ".join("%s::bigint" if c == "obv" else "%s::double precision" for c in INDICATOR_COLUMNS)
+    rows = [(stock_id, timestamp) + tuple(row[c] for c in INDICATOR_COLUMNS)
+            for timestamp, row in values.items()]
+    with conn.cursor() as cur:
+        execute_values(cur, f"""
+            UPDATE "StockPrice" AS p SET {assignments}
+            FROM (VALUES %s) AS v ("stockId", timestamp, {names})
+            WHERE p."stockId" = v."stockId" AND p.timestamp = v.timestamp
+        """, rows, template=f"(%s, %s::timestamp, {casts})", page_size=len(rows))
+        updated = cur.rowcount
+    from .candles import invalidate_stock
+
+    invalidate_stock(stock_id)
+    return updated
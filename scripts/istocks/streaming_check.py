@@ -0,0 +1,125 @@
+"""
+Self-check of istocks.streaming against the `ta` library
+
+    cd scripts && python3 -m istocks.streaming_check
+
+Streams synthetic candles through IndicatorState one at a time (with a JSON
+round trip through to_json, as "IndicatorState" stores it) and compares every
+column with the full-history `ta` calculation calculate-indicators.py runs.
+Then rebuilds a state from the last WARMUP_BARS candles and stored OBV/A-D
+totals, as warm_state does after a correction, and checks the candles
+streamed after it. Exits non-zero on failure.
+
+reference_indicators and compare are meant for other engines too, e.g. the
+SQL functions of istocks.sql_indicators once they are loaded into a database.
+"""
+
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+
+from .streaming import INDICATOR_COLUMNS, WARMUP_BARS, IndicatorState
+from .validation_check import synthetic_sessions
+
+TOLERANCE = 1e-6        # relative to max(1, |reference|)
+WARMUP_ROWS = 200       # longest window (SMA 200)
+
+
+def reference_indicators(frame):
+    """INDICATOR_COLUMNS of `frame` (open/high/low/close/volume) as calculate-indicators.py computes them"""
+    import ta
+
+    high, low, close, volume = frame["high"], frame["low"], frame["close"], frame["volume"]
+    macd = ta.trend.MACD(close)
+    bands = ta.volatility.BollingerBands(close, window=20, window_dev=2)
+    return pd.DataFrame({
+        "rsi": ta.momentum.rsi(close, window=14),
+        "macd": macd.macd(),
+        "macdSignal": macd.macd_signal(),
+        "macdHistogram": macd.macd_diff(),
+        "sma20": ta.trend.sma_indicator(close, window=20),
+        "sma50": ta.trend.sma_indicator(close, window=50),
+        "sma200": ta.trend.sma_indicator(close, window=200),
+        "ema12": ta.trend.ema_indicator(close, window=12),
+        "ema26": ta.trend.ema_indicator(close, window=26),
+        "bbUpper": bands.bollinger_hband(),
+        "bbMiddle": bands.bollinger_mavg(),
+        "bbLower": bands.bollinger_lband(),
+        "atr": ta.volatility.average_true_range(high, low, close, window=14),
+        "adx": ta.trend.adx(high, low, close, window=14),
+        "plusDI": ta.trend.adx_pos(high, low, close, window=14),
+        "minusDI": ta.trend.adx_neg(high, low, close, window=14),
+        "stochK": ta.momentum.stoch(high, low, close, window=14, smooth_window=3),
+        "stochD": ta.momentum.stoch_signal(high, low, close, window=14, smooth_window=3),
+        "cci": ta.trend.cci(high, low, close, window=20),
+        "williamsR": ta.momentum.williams_r(high, low, close, lbp=14),
+        "roc": ta.momentum.roc(close, window=10),
+        "obv": ta.volume.on_balance_volume(close, volume),
+        "vwap": ta.volume.volume_weighted_average_price(high, low, close, volume, window=14),
+        "adLine": ta.volume.acc_dist_index(high, low, close, volume),
+    }, index=frame.index)[list(INDICATOR_COLUMNS)]
+
+
+def stream(frame, state=None, roundtrip_every=500):
+    """Indicators of every candle in `frame` from `state` (fresh by default), saving and loading it as JSON"""
+    state = state or IndicatorState()
+    rows = []
+    for i, candle in enumerate(frame[["open", "high", "low", "close", "volume"]].itertuples(index=False)):
+        rows.append(state.update(*candle))
+        if roundtrip_every and (i + 1) % roundtrip_every == 0:
+            state = IndicatorState(json.loads(state.to_json()))
+    return pd.DataFrame(rows, index=frame.index, columns=list(INDICATOR_COLUMNS)).astype(float), state
+
+
+def compare(expected, actual, columns=INDICATOR_COLUMNS, warmup=WARMUP_ROWS):
+    """
+    Failure messages for `columns` of `actual` that differ from `expected`.
+    Within the first `warmup` rows, where `ta` fills ATR and ADX/DI with 0
+    placeholders that streaming leaves None, only values present on both
+    sides with a non-zero reference are compared.
+    """
+    failures = []
+    for column in columns:
+        want = expected[column].to_numpy(float)
+        got = actual[column].to_numpy(float)
+        bad = (np.isnan(want) != np.isnan(got)) | (np.abs(got - want) > TOLERANCE * np.maximum(1.0, np.abs(want)))
+        bad[:warmup] &= ~(np.isnan(want[:warmup]) | np.isnan(got[:warmup]) | (want[:warmup] == 0))
+        bad = np.flatnonzero(bad)
+        if bad.size:
+            i = bad[0]
+            failures.append(f"{column}: {bad.size} of {len(want)} differ, first at row {i} "
+                            f"(expected {want[i]!r}, got {got[i]!r})")
+    return failures
+
+
+def run():
+    timestamps, open_, high, low, close, volume = synthetic_sessions(days=12)
+    frame = pd.DataFrame({"open": open_, "high": high, "low": low, "close": close, "volume": volume},
+                         index=pd.Index(timestamps, name="timestamp"))
+    expected = reference_indicators(frame)
+
+    streamed, _ = stream(frame)
+    failures = [f"streamed from the first candle: {f}" for f in compare(expected, streamed)]
+
+    # warm_state after a correction at `start`: replay WARMUP_BARS candles
+    # after the stored OBV/A-D totals of the one before them
+    start = len(frame) - 300
+    seed = start - WARMUP_BARS - 1
+    state = IndicatorState.seeded(int(expected["obv"].iloc[seed]), float(expected["adLine"].iloc[seed]),
+                                  frame[["high", "low", "close"]].iloc[seed])
+    _, state = stream(frame.iloc[seed + 1:start], state)
+    rebuilt, _ = stream(frame.iloc[start:], state)
+    failures += [f"rebuilt from {WARMUP_BARS} candles: {f}" for f in compare(expected.iloc[start:], rebuilt, warmup=0)]
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print(f"✅ streaming: {len(frame)} candles match ta, including a state rebuilt "
+              f"from the last {WARMUP_BARS} before a correction")
+    return not failures
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run() else 1)
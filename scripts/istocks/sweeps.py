@@ -0,0 +1,200 @@
+"""
+Indicator families over many windows from one pass over the data
+
+Every function takes one price series and a list of windows and returns a
+(bars x windows) array, matching the `ta` definitions calculate-indicators.py
+uses for a single window (NaN until a window has enough bars):
+
+- sma / roc: one set of prefix sums serves every window
+- bollinger: prefix sums restarted every few windows around a local mean,
+  so the variance does not cancel away on long series
+- ema / rsi: the recursion y[t] = a * x[t] + (1 - a) * y[t - 1] is evaluated
+  in blocks in closed form, so there is no per-bar Python loop; only the
+  carry between blocks is sequential
+
+A sweep over SMA 5..200 therefore costs one scan of the data plus one
+subtraction per window instead of a full indicator run per window.
+"""
+
+import numpy as np
+
+# Keep (1 - a) ** -block well inside float64 range
+_MAX_SCALE_EXPONENT = 150 * np.log(10)
+_MAX_BLOCK = 4096
+
+
+def parse_windows(text):
+    """"14", "12,26", "5:200" (inclusive) or "5:200:5" -> sorted list of ints"""
+    windows = set()
+    for part in text.split(","):
+        if ":" in part:
+            bounds = [int(v) for v in part.split(":")]
+            start, stop = bounds[0], bounds[1]
+            step = bounds[2] if len(bounds) > 2 else 1
+            windows.update(range(start, stop + 1, step))
+        else:
+            windows.add(int(part))
+    return sorted(windows)
+
+
+def _prefix(values):
+    return np.concatenate(([0.0], np.cumsum(values)))
+
+
+def _window_sums(prefix, windows, n):
+    """Sum of the last `w` values at every position, for each w (NaN while t < w - 1)"""
+    out = np.full((n, len(windows)), np.nan)
+    for j, w in enumerate(windows):
+        if w <= n:
+            out[w - 1:, j] = prefix[w:] - prefix[:n - w + 1]
+    return out
+
+
+def sma(close, windows):
+    close = np.asarray(close, dtype=np.float64)
+    windows = np.asarray(windows)
+    if not len(close):
+        return np.empty((0, len(windows)))
+    # Centre on the first price to keep the prefix sums small
+    return _window_sums(_prefix(close - close[0]), windows, len(close)) / windows + close[0]
+
+
+def _local_moments(values, w):
+    """
+    Mean and population variance of the last `w` values at every position
+    (NaN while t < w - 1).
+
+    E[x^2] - E[x]^2 from prefix sums cancels catastrophically once the sums
+    run over a long drifting series, so the prefix sums restart every few
+    windows: each block of bars is summed together with the w - 1 bars
+    before it, centred on that span's own mean, so the deviations stay as
+    small as the local price range.
+    """
+    n = len(values)
+    mean = np.full(n, np.nan)
+    var = np.full(n, np.nan)
+    if w > n:
+        return mean, var
+    block = max(4 * w, 64)
+    blocks = -(-n // block)
+    # Edge padding only feeds windows that are NaN anyway
+    padded = np.pad(values, (w - 1, blocks * block - n), mode="edge")
+    spans = np.lib.stride_tricks.sliding_window_view(padded, block + w - 1)[::block]
+    centre = spans.mean(axis=1, keepdims=True)
+    deviations = spans - centre
+    zeros = np.zeros((blocks, 1))
+    sums = np.concatenate((zeros, np.cumsum(deviations, axis=1)), axis=1)
+    squares = np.concatenate((zeros, np.cumsum(deviations * deviations, axis=1)), axis=1)
+
+    # Bar i of a block ends its window at span offset w - 1 + i
+    window_mean = (sums[:, w:] - sums[:, :block]) / w
+    window_var = (squares[:, w:] - squares[:, :block]) / w - window_mean * window_mean
+    mean[w - 1:] = (window_mean + centre).ravel()[w - 1:n]
+    var[w - 1:] = np.maximum(window_var, 0.0).ravel()[w - 1:n]
+    return mean, var
+
+
+def bollinger(close, windows, deviations=2.0):
+    """(middle, upper, lower) bands for every window; population std like `ta`"""
+    close = np.asarray(close, dtype=np.float64)
+    middle = np.full((len(close), len(windows)), np.nan)
+    std = np.full((len(close), len(windows)), np.nan)
+    for j, w in enumerate(windows):
+        mean, var = _local_moments(close, w)
+        middle[:, j] = mean
+        std[:, j] = np.sqrt(var)
+    return middle, middle + deviations * std, middle - deviations * std
+
+
+def roc(close, windows):
+    close = np.asarray(close, dtype=np.float64)
+    out = np.full((len(close), len(windows)), np.nan)
+    for j, w in enumerate(windows):
+        if w < len(close):
+            out[w:, j] = (close[w:] - close[:-w]) / close[:-w] * 100
+    return out
+
+
+def _ewm(values, alphas):
+    """
+    y[0] = x[0], y[t] = a * x[t] + (1 - a) * y[t - 1] (pandas ewm(adjust=False))
+    for every a in `alphas` at once; returns (bars x alphas).
+
+    Within a block of length B starting after carry c:
+        y[j] = d^(j+1) * c + a * d^j * sum_{k<=j} x[k] * d^-k,   d = 1 - a
+    which is one cumsum per block; B is chosen so d^-B stays finite for the
+    fastest decay, and only the carry between blocks is a Python loop.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    alphas = np.asarray(alphas, dtype=np.float64)
+    n = len(values)
+    if n == 0:
+        return np.empty((0, len(alphas)))
+    decay = np.clip(1.0 - alphas, 1e-12, None)
+    block = int(min(_MAX_BLOCK, max(1, _MAX_SCALE_EXPONENT // -np.log(decay.min()))))
+
+    steps = np.arange(block)[:, None]
+    powers = decay ** steps                     # d^j, (block, alphas)
+    inverse = decay ** -steps                   # d^-k
+    blocks = -(-n // block)
+    padded = np.zeros(blocks * block)
+    padded[:n] = values
+    padded = padded.reshape(blocks, block, 1)
+    result = alphas * powers * np.cumsum(padded * inverse, axis=1)   # each block on its own
+    carry_weight = decay * powers                                      # d^(j+1)
+
+    carry = np.full(len(alphas), values[0])
+    for b in range(blocks):
+        result[b] += carry_weight * carry
+        carry = result[b, -1]
+    return result.reshape(-1, len(alphas))[:n]
+
+
+def ema(close, spans):
+    """EMA for every span (ta.trend.ema_indicator: adjust=False, NaN for the first span - 1 bars)"""
+    close = np.asarray(close, dtype=np.float64)
+    out = _ewm(close, 2.0 / (np.asarray(spans, dtype=np.float64) + 1))
+    for j, span in enumerate(spans):
+        out[:span - 1, j] = np.nan
+    return out
+
+
+def rsi(close, windows):
+    """Wilder RSI for every window (ta.momentum.rsi)"""
+    close = np.asarray(close, dtype=np.float64)
+    diff = np.diff(close, prepend=close[:1])
+    up = np.maximum(diff, 0.0)
+    down = np.maximum(-diff, 0.0)
+    alphas = 1.0 / np.asarray(windows, dtype=np.float64)
+    avg_up, avg_down = _ewm(up, alphas), _ewm(down, alphas)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = np.where(avg_down == 0, 100.0, 100.0 - 100.0 / (1.0 + avg_up / avg_down))
+    for j, w in enumerate(windows):
+        out[:w - 1, j] = np.nan
+    return out
+
+
+FAMILIES = {
+    "sma": sma,
+    "ema": ema,
+    "rsi": rsi,
+    "roc": roc,
+    "bollinger": bollinger,
+}
+
+
+def sweep(close, families):
+    """
+    Run several families on one series: {family: windows} -> {name: 2-D array}.
+
+    Bollinger produces bbMiddle/bbUpper/bbLower arrays; the others are keyed
+    by family name. Column j of every array belongs to windows[j].
+    """
+    results = {}
+    for family, windows in families.items():
+        if family == "bollinger":
+            middle, upper, lower = bollinger(close, windows)
+            results.update(bbMiddle=middle, bbUpper=upper, bbLower=lower)
+        else:
+            results[family] = FAMILIES[family](close, windows)
+    return results
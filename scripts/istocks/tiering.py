@@ -0,0 +1,462 @@
+"""
+Hot/cold tiering of "StockPrice"
+
+Minute bars of the last HOT_MONTHS whole months (plus the current one) stay
+in "StockPrice". Every older month is, in this order:
+
+1. archived per symbol as a zstd-compressed Parquet file with every column
+   of every row, under exports/archive/<SYMBOL>/, recorded with row count
+   and sha256 in manifest.json; an existing file for the month (e.g. after
+   a partial restore) is merged with the rows in the table, which win
+2. rolled up inside the database into "StockPrice5m" and "StockPriceDaily"
+   (OHLCV and the number of minute bars per bucket)
+3. removed from "StockPrice" - when the table is partitioned by month
+   (manage-partitions.py) by detaching and dropping the month's partition,
+   so the hot table and its indexes only ever hold the horizon; a plain
+   table falls back to DELETE, whose space is only reused after VACUUM
+
+Steps 2 and 3 run in one transaction, and only if the rows archived for the
+month still match the rows in the table - same count and same checksum of
+every row, checked while writes to the month are locked out; otherwise the
+month is left for the next run.
+
+    from istocks.tiering import read_archive
+    bars = read_archive("WIPRO", datetime(2016, 1, 1), datetime(2017, 1, 1))
+
+read_archive() returns archived bars like candles.query_candles() without
+touching the database, restore() copies whole archived months back into
+"StockPrice"; a later run archives them again, unchanged. Insights, chart
+series and 52-week stats look back one year, so horizons below
+MIN_HOT_MONTHS shorten what they see.
+"""
+
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import numpy as np
+from logzero import logger
+
+from .config import PROJECT_ROOT, ThreadConnections
+from .partitions import (
+    add_months,
+    create_month_partition,
+    is_partitioned,
+    iter_months,
+    month_start,
+    partition_name,
+    table_exists,
+)
+
+DEFAULT_ROOT = os.path.join(PROJECT_ROOT, "exports", "archive")
+HOT_MONTHS = 12
+MIN_HOT_MONTHS = 12
+MANIFEST = "manifest.json"
+
+# rollup table -> bucket start of a minute bar
+ROLLUPS = {
+    "StockPrice5m": """date_trunc('hour', timestamp)
+        + FLOOR(EXTRACT(MINUTE FROM timestamp) / 5) * INTERVAL '5 minutes'""",
+    "StockPriceDaily": "date_trunc('day', timestamp)",
+}
+
+CREATE_ROLLUP = """
+    CREATE TABLE IF NOT EXISTS "{table}" (
+        "stockId" TEXT NOT NULL,
+        timestamp TIMESTAMP(3) NOT NULL,
+        open DOUBLE PRECISION NOT NULL,
+        high DOUBLE PRECISION NOT NULL,
+        low DOUBLE PRECISION NOT NULL,
+        close DOUBLE PRECISION NOT NULL,
+        volume BIGINT NOT NULL,
+        bars INTEGER NOT NULL,
+        CONSTRAINT "{table}_pkey" PRIMARY KEY ("stockId", timestamp),
+        CONSTRAINT "{table}_stockId_fkey" FOREIGN KEY ("stockId")
+            REFERENCES "Stock"(id) ON DELETE CASCADE ON UPDATE CASCADE
+    )
+"""
+
+# information_schema data_type -> pandas dtype of the archived column
+DTYPES = {"bigint": "Int64", "integer": "Int32", "double precision": "float64", "text": "string"}
+
+
+def ensure_tables(conn):
+    with conn.cursor() as cur:
+        for table in ROLLUPS:
+            cur.execute(CREATE_ROLLUP.format(table=table))
+    conn.commit()
+
+
+def hot_start(hot_months=HOT_MONTHS, today=None):
+    """First month kept in "StockPrice": `hot_months` whole months before the current one"""
+    return add_months(month_start(today or datetime.now()), -hot_months)
+
+
+def cold_months(conn, hot_months=HOT_MONTHS, today=None):
+    """Months before the hot horizon that still have rows in "StockPrice", oldest first"""
+    with conn.cursor() as cur:
+        # Per-stock MIN is answered from the (stockId, timestamp) index
+        cur.execute("""
+            SELECT MIN(first) FROM (
+                SELECT (SELECT MIN(timestamp) FROM "StockPrice" WHERE "stockId" = s.id) AS first
+                FROM "Stock" s
+            ) f
+        """)
+        first = cur.fetchone()[0]
+    boundary = hot_start(hot_months, today)
+    if first is None or month_start(first) >= boundary:
+        return []
+    return list(iter_months(first, add_months(boundary, -1)))
+
+
+# -- rollups --------------------------------------------------------------------
+
+def rollup_month(conn, month):
+    """
+    Upsert the month's 5-minute and daily bars from its minute bars; returns
+    rows per table. The caller owns the transaction.
+    """
+    written = {}
+    with conn.cursor() as cur:
+        for table, bucket in ROLLUPS.items():
+            cur.execute(f"""
+                INSERT INTO "{table}" ("stockId", timestamp, open, high, low, close, volume, bars)
+                SELECT "stockId", {bucket},
+                       (ARRAY_AGG(open ORDER BY timestamp))[1], MAX(high), MIN(low),
+                       (ARRAY_AGG(close ORDER BY timestamp DESC))[1], SUM(volume), COUNT(*)
+                FROM "StockPrice"
+                WHERE timestamp >= %s AND timestamp < %s
+                GROUP BY 1, 2
+                ON CONFLICT ("stockId", timestamp) DO UPDATE SET
+                    open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low,
+                    close = EXCLUDED.close, volume = EXCLUDED.volume, bars = EXCLUDED.bars
+            """, (month, add_months(month, 1)))
+            written[table] = cur.rowcount
+    return written
+
+
+# -- archive files --------------------------------------------------------------
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Archiving requires pyarrow (pip3 install pyarrow)")
+    return pyarrow
+
+
+def relative_path(symbol, month):
+    return os.path.join(symbol, f"{symbol}_{month:%Y-%m}.parquet")
+
+
+def load_manifest(root):
+    path = os.path.join(root, MANIFEST)
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {"files": {}, "months": {}}
+
+
+def save_manifest(root, manifest):
+    manifest["updatedAt"] = datetime.now().isoformat(timespec="seconds")
+    path = os.path.join(root, MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def column_types(conn):
+    """[(column, data_type)] of "StockPrice" in ordinal order"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT column_name, data_type
+            FROM information_schema.columns
+            WHERE table_schema = 'public' AND table_name = 'StockPrice'
+            ORDER BY ordinal_position
+        """)
+        return cur.fetchall()
+
+
+def _fingerprint(conn, month, stock_id=None):
+    """(rows, sum of row hashes) of the month in "StockPrice" (of one stock, or all)"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT COUNT(*), COALESCE(SUM(hashtextextended(p::text, 0)), 0)
+            FROM "StockPrice" p
+            WHERE (%s::text IS NULL OR "stockId" = %s) AND timestamp >= %s AND timestamp < %s
+        """, (stock_id, stock_id, month, add_months(month, 1)))
+        return cur.fetchone()
+
+
+def _read_rows(conn, stock_id, month, columns):
+    """One stock-month of "StockPrice" as a DataFrame with lossless dtypes"""
+    import pandas as pd
+
+    names = [name for name, _ in columns]
+    with conn.cursor() as cur:
+        query = cur.mogrify(f"""
+            SELECT {", ".join(f'"{c}"' for c in names)}
+            FROM "StockPrice"
+            WHERE "stockId" = %s AND timestamp >= %s AND timestamp < %s
+            ORDER BY timestamp
+        """, (stock_id, month, add_months(month, 1))).decode()
+        buffer = io.StringIO()
+        cur.copy_expert(f"COPY ({query}) TO STDOUT WITH CSV HEADER", buffer)
+    buffer.seek(0)
+    dates = [name for name, kind in columns if kind.startswith("timestamp")]
+    dtypes = {name: DTYPES[kind] for name, kind in columns if kind in DTYPES}
+    return pd.read_csv(buffer, dtype=dtypes, parse_dates=dates, float_precision="round_trip")
+
+
+def archive_stock_month(conn, root, stock_id, symbol, month, columns):
+    """
+    Write one symbol-month to Parquet, merged with an existing file for it.
+
+    Reads in its own transaction on `conn`. Returns (path, manifest entry,
+    fingerprint of the rows read, see _fingerprint) or None without rows.
+    """
+    pa = _pyarrow()
+    # Rows and fingerprint from one snapshot
+    with conn.cursor() as cur:
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+    try:
+        frame = _read_rows(conn, stock_id, month, columns)
+        fingerprint = _fingerprint(conn, month, stock_id)
+    finally:
+        conn.rollback()
+    if frame.empty:
+        return None
+
+    path = relative_path(symbol, month)
+    full = os.path.join(root, path)
+    os.makedirs(os.path.dirname(full), exist_ok=True)
+    if os.path.exists(full):
+        import pandas as pd
+
+        # Rows only in the archive (e.g. not restored) are kept; the table's rows win
+        existing = pa.parquet.read_table(full).to_pandas()
+        frame = (pd.concat([existing, frame], ignore_index=True)
+                 .drop_duplicates("timestamp", keep="last")
+                 .sort_values("timestamp", ignore_index=True))
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    pa.parquet.write_table(table, full + ".part", compression="zstd", compression_level=9)
+    if pa.parquet.read_metadata(full + ".part").num_rows != len(frame):
+        raise RuntimeError(f"{path}: row count mismatch after write")
+
+    digest = hashlib.sha256()
+    with open(full + ".part", "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    os.replace(full + ".part", full)
+    return path, {
+        "symbol": symbol,
+        "stockId": stock_id,
+        "month": f"{month:%Y-%m}",
+        "rows": len(frame),
+        "bytes": os.path.getsize(full),
+        "sha256": digest.hexdigest(),
+        "first": frame["timestamp"].iloc[0].isoformat(),
+        "last": frame["timestamp"].iloc[-1].isoformat(),
+    }, fingerprint
+
+
+def _month_stocks(conn, month):
+    """[(stockId, symbol)] of stocks with rows in `month`"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT s.id, s.symbol FROM "Stock" s
+            WHERE EXISTS (
+                SELECT 1 FROM "StockPrice" p
+                WHERE p."stockId" = s.id AND p.timestamp >= %s AND p.timestamp < %s
+            )
+            ORDER BY s.symbol
+        """, (month, add_months(month, 1)))
+        return cur.fetchall()
+
+
+# -- removal --------------------------------------------------------------------
+
+def drop_month(conn, month, archived):
+    """
+    Roll the month up and remove it from "StockPrice" if it still matches
+    the `archived` (rows, checksum) fingerprint. Writes are locked out from
+    the check to the removal. Returns rollup_month()'s counts when removed,
+    else None.
+    """
+    lower, upper = month, add_months(month, 1)
+    name = partition_name(month)
+    detach = is_partitioned(conn) and table_exists(conn, name)
+    with conn.cursor() as cur:
+        if detach:
+            cur.execute(f'LOCK TABLE "{name}" IN ACCESS EXCLUSIVE MODE')
+        else:
+            cur.execute('LOCK TABLE "StockPrice" IN SHARE ROW EXCLUSIVE MODE')
+        rows, checksum = _fingerprint(conn, month)
+        if (rows, checksum) != tuple(archived):
+            conn.rollback()
+            if rows != archived[0]:
+                reason = f"{rows:,} rows in StockPrice but {archived[0]:,} archived"
+            else:
+                reason = "rows changed since archiving"
+            logger.warning(f"⚠️  {month:%Y-%m}: {reason} - kept")
+            return None
+        rolled = rollup_month(conn, month)
+        if detach:
+            cur.execute(f'ALTER TABLE "StockPrice" DETACH PARTITION "{name}"')
+            cur.execute(f'DROP TABLE "{name}"')
+            rows = 0
+        # Rows of the month outside its partition (DEFAULT) or in a plain table
+        cur.execute('DELETE FROM "StockPrice" WHERE timestamp >= %s AND timestamp < %s', (lower, upper))
+        if cur.rowcount != rows:
+            conn.rollback()
+            logger.warning(f"⚠️  {month:%Y-%m}: deleted {cur.rowcount:,} rows, expected {rows:,} - kept")
+            return None
+    conn.commit()
+    return rolled
+
+
+# -- reads and restores ------------------------------------------------------
+
+def overlapping_months(start, end):
+    """Month-start dates of the months overlapping [start, end)"""
+    last = end - (timedelta(microseconds=1) if isinstance(end, datetime) else timedelta(days=1))
+    return list(iter_months(start, last)) if last >= start else []
+
+
+def archived_files(root, symbol, start, end):
+    """Archive files of `symbol` overlapping [start, end), oldest first"""
+    paths = (os.path.join(root, relative_path(symbol, month)) for month in overlapping_months(start, end))
+    return [path for path in paths if os.path.exists(path)]
+
+
+def _read_frames(root, symbol, start, end, columns=None):
+    pa = _pyarrow()
+    frames = [pa.parquet.read_table(path, columns=columns).to_pandas()
+              for path in archived_files(root, symbol, start, end)]
+    if not frames:
+        return None
+    import pandas as pd
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def read_archive(symbol, start, end, columns=("open", "high", "low", "close", "volume"), root=DEFAULT_ROOT):
+    """Archived minute bars in [start, end) as {"timestamp": datetime64[m], column: array}"""
+    frame = _read_frames(root, symbol, start, end, ["timestamp"] + list(columns))
+    if frame is None:
+        return {"timestamp": np.array([], dtype="datetime64[m]"),
+                **{c: np.array([], dtype=np.int64 if c == "volume" else np.float64) for c in columns}}
+    import pandas as pd
+
+    frame = frame[(frame["timestamp"] >= pd.Timestamp(start)) & (frame["timestamp"] < pd.Timestamp(end))]
+    bars = {"timestamp": frame["timestamp"].to_numpy().astype("datetime64[m]")}
+    for column in columns:
+        bars[column] = frame[column].to_numpy()
+    return bars
+
+
+def restore(conn, symbol, start, end, root=DEFAULT_ROOT):
+    """
+    Copy the archived months of `symbol` overlapping [start, end) back into
+    "StockPrice"; rows already present are kept. Returns the rows inserted.
+    """
+    months = overlapping_months(start, end)
+    frame = _read_frames(root, symbol, months[0], add_months(months[-1], 1)) if months else None
+    if frame is None:
+        return 0
+    if is_partitioned(conn):
+        for month in months:
+            create_month_partition(conn, month)
+
+    names = [name for name, _ in column_types(conn) if name in frame.columns]
+    buffer = io.StringIO()
+    frame[names].to_csv(buffer, index=False, header=False, date_format="%Y-%m-%d %H:%M:%S.%f")
+    buffer.seek(0)
+    select = ", ".join(f'"{c}"' for c in names)
+    with conn.cursor() as cur:
+        cur.execute('CREATE TEMP TABLE restored (LIKE "StockPrice") ON COMMIT DROP')
+        cur.copy_expert(f"COPY restored ({select}) FROM STDIN WITH (FORMAT csv)", buffer)
+        cur.execute(f'INSERT INTO "StockPrice" ({select}) SELECT {select} FROM restored ON CONFLICT DO NOTHING')
+        inserted = cur.rowcount
+    conn.commit()
+    return inserted
+
+
+# -- job ------------------------------------------------------------------------
+
+def tier(conn, hot_months=HOT_MONTHS, root=DEFAULT_ROOT, workers=4, dry_run=False, today=None):
+    """
+    Roll up, archive and remove every month before the hot horizon.
+    Returns the months removed from "StockPrice".
+    """
+    if hot_months < MIN_HOT_MONTHS:
+        logger.warning(f"⚠️  A {hot_months}-month horizon leaves 1y insights, chart series and "
+                       f"52-week stats with less than a year of minute bars")
+    months = cold_months(conn, hot_months, today)
+    oldest = f"{months[0]:%Y-%m}" if months else "none"
+    logger.info(f"🧊 Hot from {hot_start(hot_months, today):%Y-%m}; oldest month before it in StockPrice: {oldest}")
+    if dry_run or not months:
+        for month in months:
+            stocks = _month_stocks(conn, month)
+            if stocks:
+                logger.info(f"  would archive {month:%Y-%m} ({len(stocks)} stocks)")
+        conn.rollback()
+        return []
+    if not is_partitioned(conn):
+        logger.warning('⚠️  "StockPrice" is not partitioned: old months are DELETEd, which leaves the '
+                       'table and indexes bloated until VACUUM - see manage-partitions.py migrate')
+
+    _pyarrow()
+    ensure_tables(conn)
+    os.makedirs(root, exist_ok=True)
+    manifest = load_manifest(root)
+    columns = column_types(conn)
+    connections = ThreadConnections()
+    removed = []
+    try:
+        for month in months:
+            stocks = _month_stocks(conn, month)
+            conn.rollback()
+            if not stocks:
+                continue
+            archived, checksum, failed = 0, 0, 0
+
+            def archive(stock_id, symbol):
+                return archive_stock_month(connections.get(), root, stock_id, symbol, month, columns)
+
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(archive, stock_id, symbol): symbol for stock_id, symbol in stocks}
+                for future in as_completed(futures):
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        failed += 1
+                        logger.error(f"❌ {futures[future]} {month:%Y-%m}: {e}")
+                        continue
+                    if result:
+                        path, entry, (rows, rows_checksum) = result
+                        manifest["files"][path] = entry
+                        archived += rows
+                        checksum += rows_checksum
+            save_manifest(root, manifest)
+
+            if failed:
+                logger.error(f"❌ {month:%Y-%m}: {failed} symbols failed to archive - month kept")
+                continue
+            rolled = drop_month(conn, month, (archived, checksum))
+            if rolled:
+                manifest["months"][f"{month:%Y-%m}"] = {
+                    "rows": archived, "stocks": len(stocks),
+                    "archivedAt": datetime.now().isoformat(timespec="seconds"),
+                }
+                save_manifest(root, manifest)
+                removed.append(month)
+                logger.info(f"✅ {month:%Y-%m}: {archived:,} rows of {len(stocks)} stocks archived, "
+                            f"{rolled['StockPrice5m']:,} 5-minute and {rolled['StockPriceDaily']:,} daily bars")
+    finally:
+        connections.close()
+    return removed
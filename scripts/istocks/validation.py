@@ -0,0 +1,235 @@
+"""
+Data-quality checks for candles before they are written to "StockPrice"
+
+The checks are vectorized over whole NumPy columns and rolling statistics
+come from cumulative sums, so validating a batch is O(rows) - cheap enough
+to run on every insert, including million-row backfills.
+
+Rows failing any enabled check are written to "StockPriceQuarantine" with a
+bitmask of reasons instead of being inserted.
+"""
+
+from datetime import datetime
+
+import numpy as np
+from logzero import logger
+from psycopg2.extras import execute_values
+
+# Reason bits stored in "StockPriceQuarantine".reasons
+INVALID_VALUE = 1       # NaN / non-positive price, negative volume
+OHLC_VIOLATION = 2      # high < max(open, close), low > min(open, close), low > high
+OUT_OF_SESSION = 4      # outside 09:15-15:30 IST or on a weekend
+DUPLICATE = 8           # repeated (stockId, timestamp) within the batch
+PRICE_SPIKE = 16        # return far outside rolling volatility
+VOLUME_OUTLIER = 32     # volume far above the rolling level
+ZERO_VOLUME = 64        # bar with no traded volume
+
+REASON_NAMES = {
+    INVALID_VALUE: "invalid_value",
+    OHLC_VIOLATION: "ohlc_violation",
+    OUT_OF_SESSION: "out_of_session",
+    DUPLICATE: "duplicate",
+    PRICE_SPIKE: "price_spike",
+    VOLUME_OUTLIER: "volume_outlier",
+    ZERO_VOLUME: "zero_volume",
+}
+
+SESSION_OPEN = 9 * 60 + 15      # first 1-minute candle
+SESSION_CLOSE = 15 * 60 + 29    # last 1-minute candle
+ROLLING_WINDOW = 60
+MIN_PERIODS = 20
+SPIKE_SIGMAS = 8.0
+SPIKE_FLOOR = 0.005             # ignore moves under 0.5% regardless of sigma
+VOLUME_SIGMAS = 6.0
+CONTEXT_BARS = ROLLING_WINDOW
+
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS "StockPriceQuarantine" (
+        id TEXT NOT NULL,
+        "stockId" TEXT NOT NULL,
+        timestamp TIMESTAMP(3) NOT NULL,
+        open DOUBLE PRECISION,
+        high DOUBLE PRECISION,
+        low DOUBLE PRECISION,
+        close DOUBLE PRECISION,
+        volume BIGINT,
+        reasons INTEGER NOT NULL,
+        "reasonText" TEXT NOT NULL,
+        source TEXT,
+        "createdAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        CONSTRAINT "StockPriceQuarantine_pkey" PRIMARY KEY (id)
+    );
+    CREATE INDEX IF NOT EXISTS "StockPriceQuarantine_stockId_timestamp_idx"
+        ON "StockPriceQuarantine" ("stockId", timestamp);
+"""
+
+
+def ensure_table(conn):
+    with conn.cursor() as cur:
+        cur.execute(CREATE_TABLE)
+    conn.commit()
+
+
+def reason_text(mask):
+    return ",".join(name for bit, name in REASON_NAMES.items() if mask & bit)
+
+
+def _trailing_stats(values, window, min_periods, starts=None):
+    """
+    Mean and std of the `window` values *before* each position.
+
+    Computed from cumulative sums; positions with fewer than `min_periods`
+    prior values get NaN. `starts` optionally gives, per position, the
+    first index its window may reach back to (e.g. the session open).
+    """
+    n = len(values)
+    clean = np.where(np.isfinite(values), values, 0.0)
+    counts = np.concatenate(([0], np.cumsum(np.isfinite(values))))
+    sums = np.concatenate(([0.0], np.cumsum(clean)))
+    squares = np.concatenate(([0.0], np.cumsum(clean * clean)))
+
+    end = np.arange(n)
+    start = np.maximum(end - window, 0 if starts is None else starts)
+    count = counts[end] - counts[start]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = (sums[end] - sums[start]) / count
+        var = (squares[end] - squares[start]) / count - mean * mean
+    std = np.sqrt(np.maximum(var, 0.0))
+    mean[count < min_periods] = np.nan
+    std[count < min_periods] = np.nan
+    return mean, std
+
+
+def check_candles(timestamps, open_, high, low, close, volume, context=0):
+    """
+    Validate one stock's candles sorted by time; returns a reason bitmask per row.
+
+    The first `context` rows are previously stored candles used only to warm
+    up the rolling statistics; they are checked but their mask is dropped.
+    """
+    timestamps = np.asarray(timestamps, dtype="datetime64[m]")
+    open_, high, low, close = (np.asarray(a, dtype=np.float64) for a in (open_, high, low, close))
+    volume = np.asarray(volume, dtype=np.float64)
+    mask = np.zeros(len(timestamps), dtype=np.int64)
+
+    prices = np.stack([open_, high, low, close])
+    invalid = ~np.isfinite(prices).all(axis=0) | (prices <= 0).any(axis=0) | ~np.isfinite(volume) | (volume < 0)
+    mask[invalid] |= INVALID_VALUE
+
+    ohlc_bad = (high < np.maximum(open_, close)) | (low > np.minimum(open_, close)) | (low > high)
+    mask[ohlc_bad] |= OHLC_VIOLATION
+
+    minute_of_day = (timestamps - timestamps.astype("datetime64[D]")).astype(np.int64)
+    weekday = (timestamps.astype("datetime64[D]").astype(np.int64) + 3) % 7  # 0 = Monday
+    out_of_session = (minute_of_day < SESSION_OPEN) | (minute_of_day > SESSION_CLOSE) | (weekday >= 5)
+    mask[out_of_session] |= OUT_OF_SESSION
+
+    duplicate = np.zeros(len(timestamps), dtype=bool)
+    duplicate[1:] = timestamps[1:] == timestamps[:-1]
+    mask[duplicate] |= DUPLICATE
+
+    mask[volume == 0] |= ZERO_VOLUME
+
+    # The first bar of each trading day opens after an overnight gap
+    day = timestamps.astype("datetime64[D]")
+    session_open = np.r_[True, day[1:] != day[:-1]]
+    session_start = np.maximum.accumulate(np.where(session_open, np.arange(len(day)), 0))
+
+    # Spikes: the move into this bar (prev close -> close) and the open gap are
+    # both compared with the rolling volatility of 1-minute returns. An open
+    # far from both the previous close and its own close is a bad tick.
+    # Overnight gaps are not 1-minute moves: they are neither tested nor part
+    # of the volatility.
+    with np.errstate(invalid="ignore", divide="ignore"):
+        log_close = np.log(close)
+        returns = np.empty(len(close))
+        returns[0] = np.nan
+        returns[1:] = np.diff(log_close)
+        returns[session_open] = np.nan
+        _, sigma = _trailing_stats(returns, ROLLING_WINDOW, MIN_PERIODS)
+        limit = np.maximum(SPIKE_SIGMAS * sigma, SPIKE_FLOOR)
+
+        prev_close = np.concatenate(([np.nan], close[:-1]))
+        prev_close[session_open] = np.nan
+        open_gap = np.abs(np.log(open_ / prev_close))
+        open_off = np.abs(np.log(open_ / close))
+        spike = (np.abs(returns) > limit) | ((open_gap > limit) & (open_off > limit))
+        spike &= np.isfinite(sigma)
+        mask[spike] |= PRICE_SPIKE
+
+        # Volume has an intraday profile (heavy open and close), so its level
+        # is only compared within the same session
+        log_volume = np.log1p(volume)
+        volume_mean, volume_std = _trailing_stats(log_volume, ROLLING_WINDOW, MIN_PERIODS, session_start)
+        outlier = log_volume > volume_mean + VOLUME_SIGMAS * np.maximum(volume_std, 0.1)
+        outlier &= np.isfinite(volume_mean)
+        mask[outlier] |= VOLUME_OUTLIER
+
+    return mask[context:]
+
+
+def _load_context(conn, stock_id, before, bars=CONTEXT_BARS):
+    """Last `bars` stored candles before a timestamp, oldest first"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT timestamp, open, high, low, close, volume
+            FROM "StockPrice"
+            WHERE "stockId" = %s AND timestamp < %s
+            ORDER BY timestamp DESC
+            LIMIT %s
+        """, (stock_id, before, bars))
+        return cur.fetchall()[::-1]
+
+
+def validate_rows(conn, rows, source=None, quarantine=True, with_context=True):
+    """
+    Split PRICE_COLUMNS tuples into rows to insert and rows to quarantine.
+
+    Rows are grouped per stock and sorted by timestamp before checking.
+    Rejected rows are written to "StockPriceQuarantine" (created by
+    ensure_table at script start, committed by the caller). Returns the
+    accepted rows.
+    """
+    if not rows:
+        return rows
+
+    order = sorted(range(len(rows)), key=lambda i: (rows[i][1], rows[i][2]))
+    rows = [rows[i] for i in order]
+    stock_ids = np.array([row[1] for row in rows], dtype=object)
+    boundaries = np.flatnonzero(np.r_[True, stock_ids[1:] != stock_ids[:-1], True])
+
+    mask = np.zeros(len(rows), dtype=np.int64)
+    for lo, hi in zip(boundaries[:-1], boundaries[1:]):
+        group = rows[lo:hi]
+        context = _load_context(conn, group[0][1], group[0][2]) if with_context else []
+        columns = list(zip(*([(c[0], c[1], c[2], c[3], c[4], c[5]) for c in context] +
+                             [row[2:8] for row in group])))
+        mask[lo:hi] = check_candles(*columns, context=len(context))
+
+    bad = np.flatnonzero(mask)
+    if bad.size == 0:
+        return rows
+
+    counts = {name: int(np.count_nonzero(mask & bit)) for bit, name in REASON_NAMES.items() if (mask & bit).any()}
+    logger.warning(f"⚠️  Quarantined {bad.size}/{len(rows)} candles: {counts}")
+
+    if quarantine:
+        now = datetime.now()
+        with conn.cursor() as cur:
+            execute_values(cur, """
+                INSERT INTO "StockPriceQuarantine"
+                (id, "stockId", timestamp, open, high, low, close, volume, reasons, "reasonText", source, "createdAt")
+                VALUES %s
+                ON CONFLICT (id) DO UPDATE SET
+                    reasons = EXCLUDED.reasons,
+                    "reasonText" = EXCLUDED."reasonText",
+                    "createdAt" = EXCLUDED."createdAt"
+            """, [
+                (
+                    f"q_{rows[i][1]}_{rows[i][2]:%Y%m%d%H%M%S}_{int(mask[i])}",
+                    *rows[i][1:8], int(mask[i]), reason_text(mask[i]), source, now,
+                )
+                for i in bad
+            ], page_size=1000)
+
+    return [row for row, reasons in zip(rows, mask) if not reasons]
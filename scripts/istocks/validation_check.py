@@ -0,0 +1,77 @@
+"""
+Self-check of istocks.validation.check_candles on synthetic sessions
+
+    cd scripts && python3 -m istocks.validation_check
+
+Builds a few trading days of 1-minute candles with realistic overnight gaps
+and heavy opening volume, which must pass untouched, then plants bad ticks
+and volume bursts, which must be flagged. Exits non-zero on failure.
+"""
+
+import sys
+
+import numpy as np
+
+from .validation import PRICE_SPIKE, SESSION_CLOSE, SESSION_OPEN, VOLUME_OUTLIER, check_candles, reason_text
+
+
+def synthetic_sessions(days=5, gap=0.015, opening_volume=8.0, seed=7):
+    """Candles for `days` weekdays; each session opens `gap` away from the prior close"""
+    rng = np.random.default_rng(seed)
+    minutes = np.arange(SESSION_OPEN, SESSION_CLOSE + 1)
+    timestamps, closes, volumes = [], [], []
+    price = 1000.0
+    day = np.datetime64("2025-11-10")   # a Monday
+    for session in range(days):
+        if session:
+            price *= 1 + gap * (1 if session % 2 else -1)
+        path = price * np.exp(np.cumsum(rng.normal(0, 0.0004, len(minutes))))
+        # U-shaped intraday volume: the opening minutes trade several times the midday level
+        shape = 1 + (opening_volume - 1) * np.exp(-np.arange(len(minutes)) / 5.0)
+        volume = rng.lognormal(np.log(20_000 * shape), 0.3)
+        timestamps.append(day.astype("datetime64[m]") + minutes)
+        closes.append(path)
+        volumes.append(volume.round())
+        price = path[-1]
+        day += np.timedelta64(1, "D")
+    close = np.concatenate(closes)
+    open_ = np.r_[close[0], close[:-1]]
+    # Session opens trade at the gapped price rather than the prior close
+    first = np.r_[0, np.cumsum([len(c) for c in closes])[:-1]]
+    open_[first] = close[first] * (1 + rng.normal(0, 0.0005, len(first)))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.0002, len(close))))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.0002, len(close))))
+    return np.concatenate(timestamps), open_, high, low, close, np.concatenate(volumes)
+
+
+def run():
+    failures = []
+    timestamps, open_, high, low, close, volume = synthetic_sessions()
+    mask = check_candles(timestamps, open_, high, low, close, volume)
+    flagged = np.flatnonzero(mask)
+    if flagged.size:
+        failures.append(f"clean sessions flagged: {[(str(timestamps[i]), reason_text(mask[i])) for i in flagged[:5]]}")
+
+    # A bad tick mid-session and a volume burst must still be caught
+    tick = 3 * 375 + 200
+    burst = 2 * 375 + 150
+    close = close.copy()
+    close[tick] *= 1.04
+    high[tick] = max(high[tick], close[tick])
+    volume = volume.copy()
+    volume[burst] *= 200
+    mask = check_candles(timestamps, open_, high, low, close, volume)
+    if not mask[tick] & PRICE_SPIKE:
+        failures.append(f"planted spike at {timestamps[tick]} not flagged")
+    if not mask[burst] & VOLUME_OUTLIER:
+        failures.append(f"planted volume burst at {timestamps[burst]} not flagged")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print(f"✅ validation: {len(timestamps)} candles over gapped sessions pass, planted faults flagged")
+    return not failures
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run() else 1)
@@ -0,0 +1,218 @@
+"""
+Postgres work queue of (symbol, window) fetch jobs
+
+Jobs live in "FetchJob". Workers claim one job at a time with
+`FOR UPDATE SKIP LOCKED`, so any number of processes on any number of hosts
+can drain the queue without coordinating with each other:
+
+- a claim sets a lease; a worker that crashes simply stops renewing it and
+  the job becomes claimable again once the lease expires
+- failed jobs are retried with exponential backoff up to MAX_ATTEMPTS
+- at most `max_per_credential` jobs run concurrently per API account; claims
+  for the same account are serialised with an advisory lock so the cap holds
+  across hosts
+
+All times are database NOW(), so worker clocks do not matter.
+"""
+
+from datetime import timedelta
+
+from psycopg2.extras import execute_values
+
+from .candle_cache import chunk_windows
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+LEASE = timedelta(minutes=5)
+MAX_ATTEMPTS = 5
+RETRY_DELAY = timedelta(seconds=30)
+WINDOW_DAYS = 30
+
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS "FetchJob" (
+        id TEXT NOT NULL,
+        symbol TEXT NOT NULL,
+        exchange TEXT NOT NULL DEFAULT 'NSE',
+        interval TEXT NOT NULL DEFAULT 'ONE_MINUTE',
+        "fromTime" TIMESTAMP(3) NOT NULL,
+        "toTime" TIMESTAMP(3) NOT NULL,
+        priority INTEGER NOT NULL DEFAULT 0,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        "availableAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        "leaseExpiresAt" TIMESTAMP(3),
+        "workerId" TEXT,
+        credential TEXT,
+        "rowsInserted" INTEGER,
+        "lastError" TEXT,
+        "createdAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        "updatedAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        CONSTRAINT "FetchJob_pkey" PRIMARY KEY (id)
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS "FetchJob_symbol_exchange_interval_fromTime_toTime_key"
+        ON "FetchJob" (symbol, exchange, interval, "fromTime", "toTime");
+    CREATE INDEX IF NOT EXISTS "FetchJob_status_availableAt_idx"
+        ON "FetchJob" (status, "availableAt");
+    CREATE INDEX IF NOT EXISTS "FetchJob_credential_status_idx"
+        ON "FetchJob" (credential, status);
+"""
+
+
+def ensure_table(conn):
+    with conn.cursor() as cur:
+        cur.execute(CREATE_TABLE)
+    conn.commit()
+
+
+def job_id(symbol, exchange, interval, start, end):
+    return f"job_{exchange}_{symbol}_{interval}_{start:%Y%m%d%H%M}_{end:%Y%m%d%H%M}"
+
+
+def enqueue(conn, symbols, start, end, exchange="NSE", interval="ONE_MINUTE",
+            window_days=WINDOW_DAYS, priority=0, starts=None):
+    """
+    Queue one job per symbol and grid-aligned window; returns the number of new jobs.
+
+    `starts` ({symbol: earliest available candle}, see history.py) moves each
+    symbol's start up to where its data begins. Windows already queued (in
+    any state) are left alone, so re-enqueueing an overlapping range only
+    adds what is missing.
+    """
+    ensure_table(conn)
+    starts = starts or {}
+    jobs = [
+        (job_id(symbol, exchange, interval, lo, hi), symbol, exchange, interval, lo, hi, priority)
+        for symbol in symbols
+        for lo, hi in chunk_windows(max(start, starts.get(symbol) or start), end, days=window_days)
+    ]
+    if not jobs:
+        return 0
+    with conn.cursor() as cur:
+        rows = execute_values(cur, """
+            INSERT INTO "FetchJob" (id, symbol, exchange, interval, "fromTime", "toTime", priority)
+            VALUES %s
+            ON CONFLICT DO NOTHING
+            RETURNING id
+        """, jobs, page_size=1000, fetch=True)
+    conn.commit()
+    return len(rows)
+
+
+def claim(conn, worker_id, credential, max_per_credential=3, lease=LEASE):
+    """
+    Claim the next runnable job for `credential`; returns a dict or None.
+
+    Returns None both when the queue is drained and when the credential is
+    already at its concurrency cap - check has_work() to tell them apart.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"FetchJob:{credential}",))
+
+        # Jobs whose worker vanished: give them back (or give up on them)
+        cur.execute("""
+            UPDATE "FetchJob"
+            SET status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END,
+                "lastError" = COALESCE("lastError", 'lease expired'),
+                "workerId" = NULL, "leaseExpiresAt" = NULL, "updatedAt" = NOW()
+            WHERE status = 'running' AND "leaseExpiresAt" < NOW()
+        """, (MAX_ATTEMPTS,))
+
+        cur.execute("""
+            SELECT COUNT(*) FROM "FetchJob"
+            WHERE credential = %s AND status = 'running'
+        """, (credential,))
+        if cur.fetchone()[0] >= max_per_credential:
+            conn.commit()
+            return None
+
+        cur.execute("""
+            UPDATE "FetchJob" SET
+                status = 'running',
+                attempts = attempts + 1,
+                "workerId" = %s,
+                credential = %s,
+                "leaseExpiresAt" = NOW() + %s,
+                "updatedAt" = NOW()
+            WHERE id = (
+                SELECT id FROM "FetchJob"
+                WHERE status = 'pending' AND "availableAt" <= NOW()
+                ORDER BY priority DESC, "fromTime" DESC
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING id, symbol, exchange, interval, "fromTime", "toTime", attempts
+        """, (worker_id, credential, lease))
+        row = cur.fetchone()
+    conn.commit()
+    if row is None:
+        return None
+    return dict(zip(("id", "symbol", "exchange", "interval", "fromTime", "toTime", "attempts"), row))
+
+
+def heartbeat(conn, job, worker_id, lease=LEASE):
+    """Extend the lease; returns False if the job was taken away from this worker"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE "FetchJob" SET "leaseExpiresAt" = NOW() + %s, "updatedAt" = NOW()
+            WHERE id = %s AND "workerId" = %s AND status = 'running'
+        """, (lease, job["id"], worker_id))
+        alive = cur.rowcount == 1
+    conn.commit()
+    return alive
+
+
+def complete(conn, job, worker_id, rows_inserted):
+    """Mark a job done; call in the same transaction as the price insert"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE "FetchJob" SET
+                status = 'done', "rowsInserted" = %s, "lastError" = NULL,
+                "leaseExpiresAt" = NULL, "updatedAt" = NOW()
+            WHERE id = %s AND "workerId" = %s
+        """, (rows_inserted, job["id"], worker_id))
+
+
+def fail(conn, job, worker_id, error, retry_delay=RETRY_DELAY):
+    """Release a job after an error, retrying with exponential backoff"""
+    conn.rollback()
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE "FetchJob" SET
+                status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END,
+                "availableAt" = NOW() + %s * power(2, attempts - 1),
+                "lastError" = %s,
+                "workerId" = NULL, "leaseExpiresAt" = NULL, "updatedAt" = NOW()
+            WHERE id = %s AND "workerId" = %s
+        """, (MAX_ATTEMPTS, retry_delay, str(error)[:1000], job["id"], worker_id))
+    conn.commit()
+
+
+def has_work(conn):
+    """True while jobs are pending or running (including ones waiting for a retry)"""
+    with conn.cursor() as cur:
+        cur.execute("""SELECT EXISTS (SELECT 1 FROM "FetchJob" WHERE status IN ('pending', 'running'))""")
+        return cur.fetchone()[0]
+
+
+def retry_failed(conn, symbols=None):
+    """Put failed jobs back in the queue with a fresh attempt budget"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE "FetchJob" SET status = 'pending', attempts = 0, "availableAt" = NOW(), "updatedAt" = NOW()
+            WHERE status = 'failed' AND (%s::text[] IS NULL OR symbol = ANY(%s::text[]))
+        """, (symbols, symbols))
+        count = cur.rowcount
+    conn.commit()
+    return count
+
+
+def queue_status(conn):
+    """[(status, credential, jobs, rows inserted)] for a summary table"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT status, COALESCE(credential, '-'), COUNT(*), COALESCE(SUM("rowsInserted"), 0)
+            FROM "FetchJob"
+            GROUP BY 1, 2
+            ORDER BY 1, 2
+        """)
+        return cur.fetchall()
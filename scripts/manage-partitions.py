@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Manage monthly partitions of the "StockPrice" table
+
+Usage:
+  python3 scripts/manage-partitions.py status
+  python3 scripts/manage-partitions.py migrate [--hash-buckets 8] [--months-ahead 3] [--drop-legacy]
+  python3 scripts/manage-partitions.py extend [--months-ahead 3]
+
+Run `extend` from cron (e.g. daily) so that upcoming months always have a
+partition before the first candle for them arrives.
+"""
+
+import argparse
+
+from logzero import logger
+
+from istocks.config import connect
+from istocks.partitions import (
+    ensure_future_partitions,
+    is_partitioned,
+    list_partitions,
+    migrate,
+)
+
+
+def show_status(conn):
+    if not is_partitioned(conn):
+        logger.info('"StockPrice" is a plain table - run `migrate` to partition it')
+        return
+
+    partitions = list_partitions(conn)
+    logger.info(f"📦 {len(partitions)} partitions")
+    for name, bounds, rows, size in partitions:
+        logger.info(f"  {name:<28} {rows:>12,} rows  {size / 1024 / 1024:>9.1f} MB  {bounds}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("status", help="List partitions with row estimates and sizes")
+
+    migrate_parser = sub.add_parser("migrate", help="Convert StockPrice into monthly partitions")
+    migrate_parser.add_argument("--hash-buckets", type=int, default=0,
+                                help="Sub-partition each month by hash(stockId) into N buckets")
+    migrate_parser.add_argument("--months-ahead", type=int, default=3)
+    migrate_parser.add_argument("--drop-legacy", action="store_true",
+                                help="Drop the old heap table after the swap")
+
+    extend_parser = sub.add_parser("extend", help="Create partitions for upcoming months")
+    extend_parser.add_argument("--months-ahead", type=int, default=3)
+
+    args = parser.parse_args()
+
+    conn = connect()
+    try:
+        if args.command == "status":
+            show_status(conn)
+        elif args.command == "migrate":
+            migrate(conn, buckets=args.hash_buckets, months_ahead=args.months_ahead,
+                    drop_legacy=args.drop_legacy)
+        elif args.command == "extend":
+            if not is_partitioned(conn):
+                logger.error('❌ "StockPrice" is not partitioned yet - run `migrate` first')
+                return
+            created = ensure_future_partitions(conn, args.months_ahead)
+            logger.info(f"✅ {created} new partitions created")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Replay stored candles through the live ingest path at accelerated speed
+
+Usage:
+  python3 scripts/replay-market.py WIPRO VEDL --speed 1000
+  python3 scripts/replay-market.py --count 50 --days 5 --speed 100 --alerts
+  python3 scripts/replay-market.py WIPRO --from 2024-03-01 --to 2024-03-02 --speed 1   # wall clock
+
+Candles of the given symbols (or the first --count stocks) are served by a
+simulated Angel One client and ingested minute by minute like
+auto-fetch-stock-data.py does - validation, change-aware writes, streaming
+indicators and optionally the alert rules - into REPLAY_<SYMBOL> shadow
+stocks, which are deleted afterwards unless --keep is given. Latency
+percentiles from candle close to committed indicator row are printed at the
+end. Point DATABASE_URL at a local Postgres for load tests.
+"""
+
+import argparse
+from datetime import datetime, timedelta
+
+from logzero import logger
+
+from istocks.config import ThreadConnections, connect
+from istocks.live import ensure_tables
+from istocks.replay import SHADOW_PREFIX, delete_shadows, load_history, replay, reset_shadows, seed_shadows
+
+
+def pick_stocks(conn, symbols, count):
+    with conn.cursor() as cur:
+        if symbols:
+            cur.execute('SELECT symbol, id FROM "Stock" WHERE symbol = ANY(%s) ORDER BY symbol', (symbols,))
+        else:
+            cur.execute("""
+                SELECT s.symbol, s.id FROM "Stock" s
+                WHERE s.symbol NOT LIKE %s
+                  AND EXISTS (SELECT 1 FROM "StockPrice" p WHERE p."stockId" = s.id)
+                ORDER BY s.symbol
+                LIMIT %s
+            """, (SHADOW_PREFIX + "%", count))
+        return dict(cur.fetchall())
+
+
+def replay_range(conn, stock_ids, args):
+    if args.start:
+        start = datetime.fromisoformat(args.start)
+        end = datetime.fromisoformat(args.to) if args.to else start + timedelta(days=args.days)
+        return start, end
+    with conn.cursor() as cur:
+        cur.execute('SELECT MAX(timestamp) FROM "StockPrice" WHERE "stockId" = ANY(%s)', (list(stock_ids.values()),))
+        latest = cur.fetchone()[0]
+    if latest is None:
+        raise SystemExit("No candles for these symbols")
+    end = datetime.combine(latest.date(), datetime.min.time()) + timedelta(days=1)
+    return end - timedelta(days=args.days), end
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("symbols", nargs="*")
+    parser.add_argument("--count", type=int, default=10, help="Stocks to replay when no symbols are given")
+    parser.add_argument("--from", dest="start", help="Replay start (default: --days before the latest candle)")
+    parser.add_argument("--to", help="Replay end")
+    parser.add_argument("--days", type=int, default=1)
+    parser.add_argument("--speed", type=float, default=1000.0, help="Simulated seconds per real second")
+    parser.add_argument("--warmup-days", type=int, default=5, help="History copied to the shadows first")
+    parser.add_argument("--workers", type=int, default=4, help="Symbols ingested in parallel per minute")
+    parser.add_argument("--alerts", action="store_true", help="Evaluate the alert rules after every minute")
+    parser.add_argument("--keep", action="store_true", help="Keep the shadow stocks for inspection")
+    args = parser.parse_args()
+
+    shadow_ids = {}
+    try:
+        conn = connect()
+        try:
+            ensure_tables(conn)
+            stock_ids = pick_stocks(conn, [s.upper() for s in args.symbols], args.count)
+            if not stock_ids:
+                raise SystemExit("No stocks to replay")
+            start, end = replay_range(conn, stock_ids, args)
+            history = load_history(conn, stock_ids, start - timedelta(days=args.warmup_days), end)
+            shadow_ids = reset_shadows(conn, list(stock_ids))
+            seed_shadows(conn, shadow_ids, history, start)
+        finally:
+            conn.close()
+
+        rules = None
+        if args.alerts:
+            from istocks.alerts import load_rules
+
+            rules = load_rules()
+        logger.info(f"▶️  Replaying {len(stock_ids)} symbols {start:%Y-%m-%d %H:%M} → {end:%Y-%m-%d %H:%M} "
+                    f"at {args.speed:g}x")
+        connections = ThreadConnections()
+        try:
+            stats = replay(history, shadow_ids, start, end, args.speed, connections, args.workers, rules)
+        finally:
+            connections.close()
+        stats.log()
+    finally:
+        # Shadows must not linger where jobs over every stock would pick them up
+        if shadow_ids and not args.keep:
+            conn = connect()
+            try:
+                delete_shadows(conn, shadow_ids)
+            finally:
+                conn.close()
+            logger.info("🧹 Shadow stocks deleted")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Fetch, validate, compute indicators and refresh rollups per symbol, pipelined
+
+Usage:
+  python3 scripts/run-pipeline.py                       # every stock (except replay shadows)
+  python3 scripts/run-pipeline.py WIPRO VEDL --days 90  # range for symbols without candles
+  python3 scripts/run-pipeline.py --workers 8 --accounts P60613196 P12345678
+
+Each symbol goes through four stages:
+
+  fetch       candles since its last stored one from Angel One (one thread
+              per account, each at its own request rate)
+  validate    data-quality checks and change-aware write (live.upsert_tail);
+              rejects go to StockPriceQuarantine
+  indicators  indicators of the written candles from the streaming state
+  insights    StockInsight, chart series and StockLatest
+
+A symbol moves on to its next stage as soon as the previous one is done, so
+indicators and insights of early symbols are computed while later ones are
+still being fetched. Failed stages are retried; per-stage timings are
+logged at the end.
+"""
+
+import argparse
+import queue
+import time
+from datetime import datetime, timedelta
+
+from logzero import logger
+
+from istocks.config import ThreadConnections, connect
+from istocks.pipeline import Pipeline, Stage
+
+RATE_LIMIT_PENALTY = 10.0   # seconds an account rests after an access-rate error
+ACCOUNT_POLL = 1.0          # seconds between checks that a usable account is left
+
+
+def last_candles(conn, stock_ids):
+    """{stockId: latest stored timestamp}"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT s.id, (SELECT MAX(timestamp) FROM "StockPrice" p WHERE p."stockId" = s.id)
+            FROM "Stock" s WHERE s.id = ANY(%s)
+        """, (list(stock_ids),))
+        return dict(cur.fetchall())
+
+
+def build_pipeline(args, db, stock_ids, tokens, pool, starts):
+    from istocks.candle_cache import chunk_windows
+    from istocks.chart_series import refresh_chart_series
+    from istocks.insights import generate_insights
+    from istocks.latest import refresh_latest
+    from istocks.live import clear_dirty, dirty_marks, upsert_tail
+    from istocks.prices import candle_rows
+    from istocks.streaming import catch_up
+
+    # Each fetch thread checks out one account, so an account's requests stay sequential
+    accounts = queue.Queue()
+    for account in pool.accounts:
+        accounts.put(account)
+
+    def checkout():
+        # Accounts disabled while checked out never come back, so keep
+        # re-checking instead of waiting for one forever
+        while True:
+            if not len(pool):
+                raise RuntimeError("No usable Angel One account")
+            try:
+                account = accounts.get(timeout=ACCOUNT_POLL)
+            except queue.Empty:
+                continue
+            if not account.disabled:
+                return account
+
+    def fetch(symbol, upstream):
+        token = tokens.get(symbol)
+        if token is None:
+            raise ValueError(f"{symbol} not in the {args.exchange} scrip master")
+        account = checkout()
+        try:
+            candles = []
+            for start, end in chunk_windows(starts[symbol], datetime.now()):
+                account.wait()
+                started = None
+                try:
+                    client = account.client
+                    started = time.monotonic()
+                    response = client.getCandleData({
+                        "exchange": args.exchange,
+                        "symboltoken": token,
+                        "interval": "ONE_MINUTE",
+                        "fromdate": start.strftime("%Y-%m-%d %H:%M"),
+                        "todate": end.strftime("%Y-%m-%d %H:%M"),
+                    })
+                    if not response.get("status"):
+                        raise RuntimeError(f"{response.get('errorcode')} {response.get('message')}")
+                except Exception as e:
+                    if started is not None:
+                        throttled = "access rate" in str(e).lower()
+                        account.record(started, error=True, penalty=RATE_LIMIT_PENALTY if throttled else 0.0)
+                    raise
+                data = response.get("data") or []
+                account.record(started, len(data), free=getattr(client, "last_hit", False))
+                candles.extend(data)
+            return candle_rows(stock_ids[symbol], candles)
+        finally:
+            # Accounts that failed to log in stay out of the rotation
+            if not account.disabled:
+                accounts.put(account)
+
+    def validate(symbol, upstream):
+        conn = db.get()
+        try:
+            written = upsert_tail(conn, stock_ids[symbol], upstream["fetch"], source="pipeline", indicators=False)
+            conn.commit()
+            return written
+        except Exception:
+            conn.rollback()
+            raise
+
+    def indicators(symbol, upstream):
+        conn = db.get()
+        stock_id = stock_ids[symbol]
+        try:
+            mark = dirty_marks(conn, [stock_id]).get(stock_id)
+            if mark is None:
+                return 0
+            updated = catch_up(conn, stock_id, mark[0])
+            clear_dirty(conn, stock_id, mark[1])
+            conn.commit()
+            return updated
+        except Exception:
+            conn.rollback()
+            raise
+
+    def insights(symbol, upstream):
+        conn = db.get()
+        try:
+            refresh_latest(conn, [stock_ids[symbol]])
+            if any(upstream["validate"]):
+                generate_insights(conn, [symbol])
+                refresh_chart_series(conn, [symbol])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    return Pipeline([
+        Stage("fetch", fetch, pool="fetch", retries=args.retries),
+        Stage("validate", validate, after=("fetch",), retries=args.retries),
+        Stage("indicators", indicators, after=("validate",), retries=args.retries),
+        Stage("insights", insights, after=("indicators",), retries=args.retries),
+    ], workers={"fetch": len(pool), "default": args.workers})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("symbols", nargs="*", help="Symbols to run (default: every stock)")
+    parser.add_argument("--days", type=int, default=30, help="Days to fetch for symbols without candles")
+    parser.add_argument("--exchange", default="NSE")
+    parser.add_argument("--workers", type=int, default=4, help="Threads for the database stages")
+    parser.add_argument("--retries", type=int, default=2, help="Retries per failed stage")
+    parser.add_argument("--min-interval", type=float, default=1.0,
+                        help="Minimum seconds between API requests per account")
+    parser.add_argument("--accounts", nargs="+", metavar="CLIENT_ID",
+                        help="Only use these Angel One accounts (default: every configured account)")
+    args = parser.parse_args()
+
+    from istocks.angel import AccountPool, load_credential_pool, symbol_tokens
+    from istocks.candle_cache import CachedCandleClient
+    from istocks.importer import ensure_stock
+    from istocks.live import TRAILING_MINUTES, ensure_tables
+    from istocks.replay import SHADOW_PREFIX
+
+    conn = connect()
+    try:
+        ensure_tables(conn)
+        if args.symbols:
+            symbols = [s.upper() for s in args.symbols]
+        else:
+            with conn.cursor() as cur:
+                cur.execute('SELECT symbol FROM "Stock" WHERE symbol NOT LIKE %s ORDER BY symbol',
+                            (SHADOW_PREFIX + "%",))
+                symbols = [row[0] for row in cur.fetchall()]
+        stock_ids = {symbol: ensure_stock(conn, symbol, exchange=args.exchange) for symbol in symbols}
+        last = last_candles(conn, stock_ids.values())
+    finally:
+        conn.close()
+
+    # Re-fetch a short trailing window so forming candles get corrected
+    default_start = datetime.now() - timedelta(days=args.days)
+    trailing = timedelta(minutes=TRAILING_MINUTES - 1)
+    starts = {symbol: last[stock_id] - trailing if last.get(stock_id) else default_start
+              for symbol, stock_id in stock_ids.items()}
+
+    pool = AccountPool(load_credential_pool(args.accounts), args.min_interval, wrap=CachedCandleClient)
+    tokens = symbol_tokens(args.exchange)
+
+    db = ThreadConnections()
+    logger.info(f"🚀 Running {len(symbols)} symbols through fetch → validate → indicators → insights")
+    try:
+        report = build_pipeline(args, db, stock_ids, tokens, pool, starts).run(symbols)
+    finally:
+        db.close()
+        pool.log_stats()
+        pool.close()
+    report.log()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Screen all stocks on their latest candle, indicators and rolling stats
+
+Usage:
+  python3 scripts/screen-stocks.py "adx > 25 and rsi < 40"
+  python3 scripts/screen-stocks.py "close > 0.95 * high52w and sessionVolume > 1.5 * avgVolume" --sort dayChangePercent --desc
+  python3 scripts/screen-stocks.py --refresh "rsi < 30" --csv oversold.csv
+
+Conditions use the alert rule syntax over StockLatest columns: candle and
+indicator columns plus prevClose, dayChange, dayChangePercent, sessionHigh,
+sessionLow, sessionVolume, high52w, low52w and avgVolume (daily). StockLatest
+is kept current by the fetchers and the indicator job; --refresh rebuilds it
+(including 52-week stats) for every stock first.
+"""
+
+import argparse
+
+from istocks.config import connect
+from istocks.latest import load_latest, refresh_latest, screen
+
+DEFAULT_COLUMNS = ["symbol", "timestamp", "close", "dayChangePercent", "rsi", "adx", "high52w", "low52w"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("condition")
+    parser.add_argument("--sort", help="Column to sort matches by")
+    parser.add_argument("--desc", action="store_true", help="Sort descending")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--columns", help="Comma-separated columns to print")
+    parser.add_argument("--csv", help="Write all columns of the matches to a CSV file")
+    parser.add_argument("--refresh", action="store_true", help="Rebuild StockLatest for all stocks first")
+    args = parser.parse_args()
+
+    conn = connect()
+    try:
+        if args.refresh:
+            print(f"✅ Refreshed {refresh_latest(conn)} stocks")
+        latest = load_latest(conn)
+    finally:
+        conn.close()
+
+    matches = screen(None, args.condition, args.sort, args.desc, args.limit, latest=latest)
+    if args.csv:
+        matches.to_csv(args.csv, index=False)
+        print(f"✅ {len(matches)} of {len(latest)} stocks → {args.csv}")
+        return
+    columns = args.columns.split(",") if args.columns else DEFAULT_COLUMNS
+    print(matches[columns].to_string(index=False) if len(matches) else "No matches")
+    print(f"\n{len(matches)} of {len(latest)} stocks")
+
+
+if __name__ == "__main__":
+    main()
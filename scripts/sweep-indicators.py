@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Compute indicator families over many windows from one read of the data
+
+Usage:
+  python3 scripts/sweep-indicators.py WIPRO --sma 5:200 --ema 5:100:5 --rsi 7:28
+  python3 scripts/sweep-indicators.py WIPRO VEDL --bollinger 10,20,30 --from 2024-01-01
+  python3 scripts/sweep-indicators.py WIPRO --rsi 7:28 --timeframe 15m
+
+Window lists are "14", "12,26", "5:200" (inclusive) or "5:200:5". Each symbol
+is written to <output-dir>/<SYMBOL>.npz with `timestamp`, `<family>_windows`
+and one float32 (bars x windows) array per family (bollinger gives bbMiddle,
+bbUpper and bbLower). Load with numpy.load().
+"""
+
+import argparse
+import os
+from datetime import datetime
+
+import numpy as np
+from logzero import logger
+
+from istocks.candles import TIMEFRAMES, get_candles
+from istocks.config import PROJECT_ROOT, connect
+from istocks.sweeps import FAMILIES, parse_windows, sweep
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("symbols", nargs="+")
+    for family in FAMILIES:
+        parser.add_argument(f"--{family}", type=parse_windows, metavar="WINDOWS")
+    parser.add_argument("--from", dest="start", type=datetime.fromisoformat)
+    parser.add_argument("--to", dest="end", type=datetime.fromisoformat)
+    parser.add_argument("--timeframe", choices=TIMEFRAMES, default="1m")
+    parser.add_argument("--output-dir", default=os.path.join(PROJECT_ROOT, "exports", "sweeps"))
+    args = parser.parse_args()
+
+    families = {family: getattr(args, family) for family in FAMILIES if getattr(args, family)}
+    if not families:
+        parser.error("give at least one of " + ", ".join(f"--{f}" for f in FAMILIES))
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    conn = connect()
+    try:
+        for symbol in (s.upper() for s in args.symbols):
+            try:
+                data = get_candles(symbol, args.start, args.end, args.timeframe, ("close",), conn=conn)
+            except KeyError:
+                logger.warning(f"⚠️  {symbol}: unknown symbol")
+                continue
+
+            results = sweep(data["close"], families)
+            arrays = {name: values.astype(np.float32) for name, values in results.items()}
+            arrays.update({f"{family}_windows": np.asarray(windows) for family, windows in families.items()})
+
+            path = os.path.join(args.output_dir, f"{symbol}.npz")
+            np.savez(path, timestamp=data["timestamp"], **arrays)
+            columns = sum(len(w) * (3 if f == "bollinger" else 1) for f, w in families.items())
+            logger.info(f"✅ {symbol}: {len(data['close'])} bars x {columns} series → {path}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,8 @@ Run this first before fetching full historical data
 from SmartApi.smartConnect import SmartConnect
 import pyotp
 from logzero import logger
-from datetime import datetime, timedelta
+
+from istocks.history import probe_earliest
 
 # Angel One credentials
 API_KEY = "6F7z02R6"
@@ -35,40 +36,15 @@ def test_date_range():
     
     logger.info("✅ Authenticated successfully")
     
-    # Test different date ranges
-    test_dates = [
-        ("1 year ago", datetime.now() - timedelta(days=365)),
-        ("2 years ago", datetime.now() - timedelta(days=730)),
-        ("3 years ago", datetime.now() - timedelta(days=1095)),
-        ("5 years ago", datetime.now() - timedelta(days=1825)),
-        ("10 years ago", datetime.now() - timedelta(days=3650)),
-    ]
-    
-    for label, from_date in test_dates:
-        to_date = from_date + timedelta(days=1)
-        
-        params = {
-            "exchange": "NSE",
-            "symboltoken": STOCK_TOKEN,
-            "interval": "ONE_MINUTE",
-            "fromdate": from_date.strftime("%Y-%m-%d 09:15"),
-            "todate": to_date.strftime("%Y-%m-%d 15:30")
-        }
-        
-        logger.info(f"\n📅 Testing {label} ({from_date.strftime('%Y-%m-%d')})...")
-        
+    # Binary-search the first day with data instead of sampling fixed dates
+    for interval in ("ONE_MINUTE", "ONE_DAY"):
+        logger.info(f"\n📅 Searching earliest {interval} candle...")
         try:
-            hist_data = smart_api.getCandleData(params)
-            
-            if hist_data and 'data' in hist_data and hist_data['data']:
-                candles = hist_data['data']
-                logger.info(f"✅ SUCCESS: Got {len(candles)} candles")
-                logger.info(f"   First candle: {candles[0][0]}")
-                logger.info(f"   Last candle: {candles[-1][0]}")
+            earliest, probes = probe_earliest(smart_api, STOCK_TOKEN, "NSE", interval)
+            if earliest:
+                logger.info(f"✅ Data available from {earliest:%Y-%m-%d %H:%M} ({probes} requests)")
             else:
-                logger.warning(f"⚠️  NO DATA available for this range")
-                logger.info(f"   Response: {hist_data}")
-                
+                logger.warning(f"⚠️  NO DATA available ({probes} requests)")
         except Exception as e:
             logger.error(f"❌ ERROR: {e}")
     
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Keep recent minute bars hot in "StockPrice", roll up and archive older ones
+
+Usage:
+  python3 scripts/tier-prices.py status
+  python3 scripts/tier-prices.py run [--hot-months 12] [--workers 4] [--dry-run]
+  python3 scripts/tier-prices.py restore WIPRO --from 2016-01-01 --to 2016-07-01
+
+`run` rolls every month before the hot horizon up into "StockPrice5m" and
+"StockPriceDaily", archives its minute bars as Parquet under exports/archive
+and removes them from "StockPrice" (whole partitions once the table is
+partitioned, see manage-partitions.py). Run it from cron after month end.
+`restore` copies archived months of a symbol back into "StockPrice".
+"""
+
+import argparse
+from datetime import datetime
+
+from logzero import logger
+
+from istocks.config import connect
+from istocks.tiering import (
+    DEFAULT_ROOT,
+    HOT_MONTHS,
+    ROLLUPS,
+    hot_start,
+    load_manifest,
+    restore,
+    tier,
+)
+
+
+def show_status(conn, root):
+    logger.info(f"🔥 Hot from {hot_start():%Y-%m} ({HOT_MONTHS} whole months before the current one)")
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT COUNT(*), MIN(timestamp), pg_total_relation_size('"StockPrice"')
+            FROM "StockPrice"
+        """)
+        rows, first, size = cur.fetchone()
+        logger.info(f"  StockPrice       {rows:>14,} rows  {size / 1024 / 1024:>9.1f} MB  "
+                    f"from {first:%Y-%m-%d}" if first else "  StockPrice is empty")
+        for table in ROLLUPS:
+            cur.execute("SELECT to_regclass(%s)", (f'"{table}"',))
+            if cur.fetchone()[0] is None:
+                logger.info(f"  {table:<16} not created yet")
+                continue
+            cur.execute(f'SELECT COUNT(*), pg_total_relation_size(\'"{table}"\') FROM "{table}"')
+            rows, size = cur.fetchone()
+            logger.info(f"  {table:<16} {rows:>14,} rows  {size / 1024 / 1024:>9.1f} MB")
+
+    manifest = load_manifest(root)
+    files = manifest["files"].values()
+    logger.info(f"🧊 {len(manifest['months'])} months archived in {root}: {len(files)} files, "
+                f"{sum(f['rows'] for f in files):,} rows, {sum(f['bytes'] for f in files) / 1024 / 1024:.1f} MB")
+    for month, entry in sorted(manifest["months"].items()):
+        logger.info(f"  {month}  {entry['rows']:>12,} rows  {entry['stocks']:>5} stocks  {entry['archivedAt']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default=DEFAULT_ROOT, help="Archive directory (default: exports/archive)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("status", help="Sizes of the hot and rollup tables and archived months")
+
+    run_parser = sub.add_parser("run", help="Roll up, archive and remove months before the hot horizon")
+    run_parser.add_argument("--hot-months", type=int, default=HOT_MONTHS,
+                            help="Whole months before the current one kept as minute bars")
+    run_parser.add_argument("--workers", type=int, default=4, help="Parallel archive writers")
+    run_parser.add_argument("--dry-run", action="store_true", help="Only list the months that would move")
+
+    restore_parser = sub.add_parser("restore", help="Copy archived months of a symbol back into StockPrice")
+    restore_parser.add_argument("symbol")
+    restore_parser.add_argument("--from", dest="start", required=True, type=datetime.fromisoformat)
+    restore_parser.add_argument("--to", dest="end", required=True, type=datetime.fromisoformat)
+
+    args = parser.parse_args()
+
+    conn = connect()
+    try:
+        if args.command == "status":
+            show_status(conn, args.root)
+        elif args.command == "run":
+            tier(conn, args.hot_months, args.root, workers=args.workers, dry_run=args.dry_run)
+        elif args.command == "restore":
+            inserted = restore(conn, args.symbol.upper(), args.start, args.end, args.root)
+            logger.info(f"✅ Restored {inserted:,} rows of {args.symbol.upper()}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
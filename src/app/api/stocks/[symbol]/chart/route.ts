@@ -0,0 +1,90 @@
+import { NextRequest, NextResponse } from 'next/server'
+import { prisma } from '@/lib/prisma'
+
+const POINT_BUDGETS = [500, 1000, 2000]
+
+interface SeriesData {
+  t: string[]
+  c: number[]
+  o?: number[]
+  h?: number[]
+  l?: number[]
+  v?: number[]
+}
+
+// Serves precomputed, downsampled series from ChartSeries
+// (built by scripts/build-chart-series.py), so the response size is
+// bounded by the point budget instead of the amount of stored history.
+export async function GET(
+  request: NextRequest,
+  { params }: { params: { symbol: string } }
+) {
+  try {
+    const { symbol } = params
+    const searchParams = request.nextUrl.searchParams
+    const timeframe = searchParams.get('timeframe') || '1m'
+    const method = searchParams.get('method') === 'ohlc' ? 'ohlc' : 'lttb'
+    const requested = parseInt(searchParams.get('points') || '1000', 10)
+    const points = POINT_BUDGETS.find(budget => budget >= requested) ?? POINT_BUDGETS[POINT_BUDGETS.length - 1]
+
+    const stock = await prisma.stock.findUnique({
+      where: { symbol: symbol.toUpperCase() },
+    })
+
+    if (!stock) {
+      return NextResponse.json(
+        { success: false, error: 'Stock not found' },
+        { status: 404 }
+      )
+    }
+
+    const series = await prisma.chartSeries.findUnique({
+      where: {
+        stockId_timeframe_points_method: {
+          stockId: stock.id,
+          timeframe,
+          points,
+          method,
+        },
+      },
+    })
+
+    if (!series) {
+      return NextResponse.json(
+        { success: false, error: 'No cached chart series for this timeframe' },
+        { status: 404 }
+      )
+    }
+
+    const data = series.data as unknown as SeriesData
+    const priceData = data.t.map((timestamp, i) => ({
+      timestamp,
+      close: data.c[i],
+      ...(data.o && {
+        open: data.o[i],
+        high: data.h?.[i],
+        low: data.l?.[i],
+        volume: data.v?.[i],
+      }),
+    }))
+
+    return NextResponse.json({
+      success: true,
+      data: {
+        stock,
+        priceData,
+        timeframe,
+        points,
+        method,
+        bucketMinutes: series.bucketMinutes,
+        generatedAt: series.generatedAt,
+      },
+    })
+  } catch (error: any) {
+    console.error('Error fetching chart series:', error)
+    return NextResponse.json(
+      { success: false, error: 'Failed to fetch chart series', details: error.message },
+      { status: 500 }
+    )
+  }
+}
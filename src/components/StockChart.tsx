@@ -19,7 +19,11 @@ export default function StockChart({ symbol }: StockChartProps) {
   const fetchChartData = async () => {
     setLoading(true)
     try {
-      const response = await fetch(`/api/stocks/${symbol}/data?timeframe=${timeframe}`)
+      // Prefer the precomputed downsampled series; fall back to raw candles
+      let response = await fetch(`/api/stocks/${symbol}/chart?timeframe=${timeframe}&points=1000`)
+      if (!response.ok) {
+        response = await fetch(`/api/stocks/${symbol}/data?timeframe=${timeframe}`)
+      }
       const result = await response.json()
       
       if (result.success && result.data.priceData) {